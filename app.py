@@ -1,14 +1,37 @@
 import os
+import re
+import sys
 import json
 import csv
 import io
+import time
+import random
+import sqlite3
+import threading
+import itertools
+import tempfile
+import hashlib
+import select
+import bisect
+import atexit
+import multiprocessing
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from fpdf import FPDF
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from flask import Flask, request, jsonify, render_template, redirect, url_for, Response, send_file
+import psycopg2.pool
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor, execute_values, register_default_json, register_default_jsonb
+from flask import Flask, request, jsonify, render_template, redirect, url_for, Response, send_file, g
 from flask_basicauth import BasicAuth
-from datetime import datetime
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
 import pytz
+import orjson
 from dotenv import load_dotenv
 
 # Load .env for local development
@@ -16,15 +39,58 @@ load_dotenv(override=True)
 
 app = Flask(__name__)
 IST = pytz.timezone('Asia/Kolkata')
+
+# json/jsonb columns (order products, customer counters) come back as Python objects, decoded by orjson
+register_default_json(globally=True, loads=orjson.loads)
+register_default_jsonb(globally=True, loads=orjson.loads)
 _db_initialized = False
 
+# --- Logging ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")    # "json" (one object per line) or "text" for local development
+
+class StructuredFormatter(logging.Formatter):
+    """Formats a record as its message plus every field passed in `extra`.
+
+    JSON mode writes one object per line with ts, level, logger and msg keys,
+    so the log stream can be filtered by field; text mode appends the fields
+    as key=value pairs.
+    """
+    _standard = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+    def __init__(self, as_json):
+        super().__init__()
+        self.as_json = as_json
+
+    def format(self, record):
+        fields = {k: v for k, v in vars(record).items() if k not in self._standard}
+        if record.exc_info:
+            fields['exc'] = self.formatException(record.exc_info)
+        ts = datetime.fromtimestamp(record.created, IST).isoformat(timespec='milliseconds')
+        if self.as_json:
+            entry = dict(ts=ts, level=record.levelname, logger=record.name, msg=record.getMessage(), **fields)
+            return orjson.dumps(entry, default=str).decode()
+        pairs = ' '.join(f"{k}={v}" for k, v in fields.items())
+        return f"{ts} {record.levelname:<7} {record.getMessage()} {pairs}".rstrip()
+
+def configure_logging():
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(StructuredFormatter(as_json=LOG_FORMAT == 'json'))
+    logger = logging.getLogger('ovt')
+    logger.handlers[:] = [handler]
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+    return logger
+
+log = configure_logging()
+
 # --- Configuration ---
 DATABASE_URL = os.getenv("DATABASE_URL")
 if DATABASE_URL:
     DATABASE_URL = DATABASE_URL.strip()
-    print(f"DEBUG: Connecting to DB... Ending with: {DATABASE_URL[-20:]}")
+    log.debug("DATABASE_URL configured", extra={'db_url_tail': DATABASE_URL[-20:]})
 else:
-    print("WARNING: DATABASE_URL not found. App will crash if database is accessed.")
+    log.warning("DATABASE_URL not found. App will crash if database is accessed.")
 
 app.config['BASIC_AUTH_USERNAME'] = os.getenv("BASIC_AUTH_USERNAME", "admin")
 app.config['BASIC_AUTH_PASSWORD'] = os.getenv("BASIC_AUTH_PASSWORD", "admin123")
@@ -39,257 +105,890 @@ basic_auth = BasicAuth(app)
 def check_viewer_auth(username, password):
     return username == VIEWER_USERNAME and password == VIEWER_PASSWORD
 
+# --- Metrics ---
+# Per-process request and query latency, exported in the Prometheus text format at /metrics
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))     # queries at least this slow are logged
+SLOW_QUERY_TEXT = 500                                         # characters of statement text in the slow log
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+def metric_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Histogram:
+    """Prometheus histogram kept in process memory, one series per label combination"""
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}   # label values -> [count per bucket..., count above the last bucket, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            labels = ','.join(f'{k}="{metric_label(v)}"' for k, v in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {values[-1]}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return '\n'.join(lines)
+
+class Counter:
+    """Prometheus counter kept in process memory, one series per label combination"""
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = dict(self._series)
+        for label_values, value in sorted(series.items()):
+            labels = ','.join(f'{k}="{metric_label(v)}"' for k, v in zip(self.labels, label_values))
+            lines.append(f"{self.name}{{{labels}}} {value}")
+        return '\n'.join(lines)
+
+request_duration = Histogram('http_request_duration_seconds', 'Time to build a response, by route',
+                             ('method', 'route', 'status'), LATENCY_BUCKETS)
+query_duration = Histogram('db_query_duration_seconds', 'Time to execute a statement, by calling function',
+                           ('site',), LATENCY_BUCKETS)
+query_rows = Histogram('db_query_rows', 'Rows returned or affected by a statement, by calling function',
+                       ('site',), ROW_BUCKETS)
+slow_queries = Counter('db_slow_queries_total', 'Statements slower than SLOW_QUERY_MS, by calling function',
+                       ('site',))
+METRICS = (request_duration, query_duration, query_rows, slow_queries)
+
+def render_metrics():
+    return '\n'.join(metric.render() for metric in METRICS) + '\n'
+
+def query_call_site():
+    """(function, line) of the innermost app.py frame outside the cursor, else of the direct caller"""
+    caller = frame = sys._getframe(3)   # query_call_site <- _record <- execute <- caller
+    while frame is not None and frame.f_code.co_filename != query_call_site.__code__.co_filename:
+        frame = frame.f_back
+    frame = frame or caller
+    # co_qualname (3.11+) tells nested helpers apart, e.g. get_orders.<locals>.compute
+    return getattr(frame.f_code, 'co_qualname', frame.f_code.co_name), frame.f_lineno
+
+class TimedCursor(RealDictCursor):
+    """RealDictCursor that records each statement's duration, row count and call site.
+
+    Durations and row counts go to the db_query_* histograms; statements
+    slower than SLOW_QUERY_MS are also logged with their text.
+    """
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._record(query, time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._record(query, time.perf_counter() - started)
+
+    def _record(self, query, seconds):
+        site, line = query_call_site()
+        rows = max(self.rowcount, 0)
+        query_duration.observe(seconds, site)
+        query_rows.observe(rows, site)
+        if seconds * 1000 >= SLOW_QUERY_MS:
+            slow_queries.inc(site)
+            if isinstance(query, bytes):
+                query = query.decode(errors='replace')
+            elif not isinstance(query, str):
+                query = query.as_string(self)
+            log.warning("Slow query", extra={
+                'site': site, 'line': line, 'duration_ms': round(seconds * 1000, 1), 'rows': rows,
+                'statement': ' '.join(query.split())[:SLOW_QUERY_TEXT],
+            })
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+def observe_request(started, method, route, status):
+    seconds = time.perf_counter() - started
+    request_duration.observe(seconds, method, route, str(status))
+    log.debug("Request", extra={'method': method, 'route': route, 'status': status,
+                                'duration_ms': round(seconds * 1000, 1)})
+
+def request_route():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.after_request
+def record_request_timing(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Recorded when the server closes the response, so streamed export bodies are included
+        method, route, status = request.method, request_route(), response.status_code
+        response.call_on_close(lambda: observe_request(started, method, route, status))
+    return response
+
+@app.teardown_request
+def record_failed_request_timing(exc):
+    # after_request is skipped when a view's exception propagates; count those requests as 500s
+    started = g.pop('request_started', None)
+    if started is not None:
+        observe_request(started, request.method, request_route(), 500)
+
 # --- Database Setup ---
-def get_db_connection():
-    import time
-    max_retries = 3
-    retry_delay = 5
-    
-    # Mask password for logging
-    masked_url = DATABASE_URL
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_MAX_AGE = int(os.getenv("DB_POOL_MAX_AGE", "1800"))       # seconds before a connection is recycled
+DB_POOL_CHECK_IDLE = int(os.getenv("DB_POOL_CHECK_IDLE", "30"))    # ping connections idle longer than this
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))        # seconds to wait for a free connection
+
+def mask_db_url(url):
+    """Mask the password in a postgres URL for logging"""
+    masked_url = url or ''
     if '@' in masked_url:
         parts = masked_url.split('@')
         left = parts[0].split(':')
         if len(left) > 2:
             masked_url = left[0] + ":" + left[1] + ":****@" + parts[1]
-    
-    print(f"DEBUG: Connecting to DB... URL: {masked_url}")
-    
-    for attempt in range(max_retries):
+    return masked_url
+
+DB_CONNECT_RETRIES = int(os.getenv("DB_CONNECT_RETRIES", "3"))
+DB_ENDPOINT_COOLDOWN = float(os.getenv("DB_ENDPOINT_COOLDOWN", "60"))  # seconds a failed endpoint is skipped
+DB_BACKOFF_BASE = float(os.getenv("DB_BACKOFF_BASE", "0.5"))
+DB_BACKOFF_MAX = float(os.getenv("DB_BACKOFF_MAX", "5"))
+
+def db_endpoint_urls(url):
+    """Endpoints to try, in order of preference: the Supabase pooler (6543) first, then direct Postgres (5432)"""
+    if ":6543" in url:
+        return [url, url.replace(":6543", ":5432")]
+    return [url]
+
+class EndpointSelector:
+    """Remembers which database endpoint is healthy for the lifetime of the process.
+
+    A failing endpoint has its circuit opened for DB_ENDPOINT_COOLDOWN seconds
+    and is skipped by every caller meanwhile. When the cool-down expires a
+    background thread probes it and closes the circuit again if it answers, so
+    a sick endpoint costs one timeout per cool-down window instead of one per
+    request.
+    """
+
+    def __init__(self, cooldown):
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._endpoints = []
+        self._source_url = None
+
+    def _configure(self, url):
+        # Built lazily so DATABASE_URL can be set after import
+        if self._source_url != url:
+            self._source_url = url
+            self._endpoints = [{
+                'url': u, 'open_until': 0.0, 'failures': 0, 'probing': False,
+                'last_error': None, 'successes': 0,
+            } for u in db_endpoint_urls(url)]
+
+    def candidates(self, url):
+        """Endpoints worth trying right now, healthy ones first"""
+        now = time.monotonic()
+        with self._lock:
+            self._configure(url)
+            healthy = [ep for ep in self._endpoints if ep['open_until'] <= now and not ep['probing']]
+            if healthy:
+                return [ep['url'] for ep in healthy]
+            # Everything is tripped: try the one that will recover soonest rather than nothing
+            return [min(self._endpoints, key=lambda ep: ep['open_until'])['url']]
+
+    def _find(self, url):
+        for ep in self._endpoints:
+            if ep['url'] == url:
+                return ep
+        return None
+
+    def record_success(self, url):
+        with self._lock:
+            ep = self._find(url)
+            if ep:
+                ep['open_until'] = 0.0
+                ep['failures'] = 0
+                ep['successes'] += 1
+
+    def record_failure(self, url, error):
+        with self._lock:
+            ep = self._find(url)
+            if not ep:
+                return
+            ep['failures'] += 1
+            ep['last_error'] = str(error).strip()
+            ep['open_until'] = time.monotonic() + self.cooldown
+            if len(self._endpoints) < 2 or ep['probing']:
+                # Nothing to fail over to, or a probe is already scheduled
+                return
+            ep['probing'] = True
+        timer = threading.Timer(self.cooldown, self._probe, args=(url,))
+        timer.daemon = True
+        timer.start()
+
+    def _probe(self, url):
         try:
-            # Use a shorter timeout for the first attempt on port 6543 to fail fast
-            timeout = 10 if (attempt == 0 and ":6543" in DATABASE_URL) else 30
-            conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor, connect_timeout=timeout)
-            
-            # Lazy initialize database on first successful connection
-            global _db_initialized
-            if not _db_initialized:
-                # We don't want to block the first request too much, 
-                # but we need the table to exist.
-                try:
-                    init_db(conn)
-                    _db_initialized = True
-                except Exception as ie:
-                    print(f"DEBUG: Lazy DB init failed (might be another worker): {ie}")
-            
-            return conn
+            conn = psycopg2.connect(url, connect_timeout=10)
+            conn.close()
         except Exception as e:
-            print(f"DEBUG: Connection attempt {attempt + 1} failed: {e}")
-            
-            # If it's a timeout on port 6543, try 5432 immediately on retries
-            if "port 6543" in str(e):
-                fallback_url = DATABASE_URL.replace(":6543", ":5432")
-                print(f"DEBUG: Attempting immediate fallback to port 5432...")
-                try:
-                    conn = psycopg2.connect(fallback_url, cursor_factory=RealDictCursor, connect_timeout=20)
-                    print(f"DEBUG: Fallback to 5432 succeeded!")
+            log.info("Endpoint probe still failing", extra={'endpoint': mask_db_url(url), 'error': str(e)})
+            with self._lock:
+                ep = self._find(url)
+                if ep:
+                    ep['failures'] += 1
+                    ep['last_error'] = str(e).strip()
+                    ep['open_until'] = time.monotonic() + self.cooldown
+            timer = threading.Timer(self.cooldown, self._probe, args=(url,))
+            timer.daemon = True
+            timer.start()
+            return
+        log.info("Endpoint is healthy again", extra={'endpoint': mask_db_url(url)})
+        with self._lock:
+            ep = self._find(url)
+            if ep:
+                ep['probing'] = False
+                ep['open_until'] = 0.0
+                ep['failures'] = 0
+
+    def reset_after_fork(self):
+        # Probe timers do not survive fork(); let the child re-probe inline
+        with self._lock:
+            for ep in self._endpoints:
+                ep['probing'] = False
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                'url': mask_db_url(ep['url']),
+                'state': 'probing' if ep['probing'] else ('open' if ep['open_until'] > now else 'closed'),
+                'retry_in': max(0, round(ep['open_until'] - now, 1)),
+                'failures': ep['failures'],
+                'successes': ep['successes'],
+                'last_error': ep['last_error'],
+            } for ep in self._endpoints]
+
+db_endpoints = EndpointSelector(DB_ENDPOINT_COOLDOWN)
+
+def open_db_connection():
+    """Open a brand-new connection to Postgres (used by the pool, not by request code)"""
+    last_error = None
+    for attempt in range(DB_CONNECT_RETRIES):
+        for url in db_endpoints.candidates(DATABASE_URL):
+            # The pooler should answer fast; don't let it eat the whole budget
+            timeout = 10 if ":6543" in url else 20
+            try:
+                conn = psycopg2.connect(url, cursor_factory=TimedCursor, connect_timeout=timeout)
+                db_endpoints.record_success(url)
+                return conn
+            except Exception as e:
+                log.warning("Connection attempt failed",
+                            extra={'attempt': attempt + 1, 'endpoint': mask_db_url(url), 'error': str(e)})
+                db_endpoints.record_failure(url, e)
+                last_error = e
+
+        if attempt < DB_CONNECT_RETRIES - 1:
+            # Full jitter so concurrent workers don't retry in lock-step
+            time.sleep(random.uniform(0, min(DB_BACKOFF_MAX, DB_BACKOFF_BASE * (2 ** attempt))))
+    raise last_error
+
+class ConnectionPool:
+    """Thread-safe pool of Postgres connections.
+
+    Connections are health-checked on checkout (closed/broken connections and
+    ones idle longer than DB_POOL_CHECK_IDLE get a `SELECT 1`), recycled once
+    they are older than DB_POOL_MAX_AGE, and rolled back before being reused.
+    Each process opens `minconn` connections in the background on its first
+    checkout; idle connections are closed at exit.
+    """
+
+    def __init__(self, minconn, maxconn, max_age, check_idle, timeout):
+        self.minconn = minconn
+        self.maxconn = max(maxconn, 1)
+        self.max_age = max_age
+        self.check_idle = check_idle
+        self.timeout = timeout
+        self._lock = threading.Condition()
+        self._idle = []        # [(conn, created_at, last_used)]
+        self._in_use = {}      # id(conn) -> (conn, created_at)
+        self._connecting = 0   # slots reserved by threads that are opening a connection
+        self._pid = os.getpid()
+        self._warmed_pid = None  # process that has started its warm_up() to `minconn`
+        self._stats = {
+            'created': 0, 'recycled': 0, 'failed_checks': 0,
+            'checkouts': 0, 'waits': 0, 'timeouts': 0,
+        }
+
+    def _reset_after_fork(self):
+        # gunicorn forks workers after import; never share sockets with the parent
+        if self._pid != os.getpid():
+            db_endpoints.reset_after_fork()
+            self._idle = []
+            self._in_use = {}
+            self._connecting = 0
+            self._pid = os.getpid()
+
+    def _create(self):
+        global _db_initialized
+        conn = open_db_connection()
+        # Lazy initialize database on the first successful connection
+        if not _db_initialized:
+            try:
+                init_db(conn)
+                _db_initialized = True
+            except Exception as ie:
+                log.warning("Lazy DB init failed (might be another worker)", extra={'error': str(ie)})
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _check(self, conn, created_at, last_used):
+        """None if `conn` can be handed out, else why not ('recycled' or 'failed_checks').
+
+        May ping the server, so it is called without holding the lock.
+        """
+        now = time.monotonic()
+        if conn.closed:
+            return 'failed_checks'
+        if self.max_age and now - created_at > self.max_age:
+            return 'recycled'
+        if now - last_used > self.check_idle:
+            try:
+                c = conn.cursor()
+                c.execute('SELECT 1')
+                c.close()
+                conn.rollback()
+            except Exception:
+                return 'failed_checks'
+        return None
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            candidate = None
+            with self._lock:
+                self._reset_after_fork()
+                warm_up = self._warmed_pid != self._pid
+                self._warmed_pid = self._pid
+                while True:
+                    if self._idle:
+                        # Reserve it as in use, then check it outside the lock
+                        candidate = self._idle.pop()
+                        self._in_use[id(candidate[0])] = candidate[:2]
+                        break
+                    if len(self._in_use) + self._connecting < self.maxconn:
+                        # Reserve the slot, then connect outside the lock
+                        self._connecting += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise psycopg2.pool.PoolError("connection pool exhausted")
+                    self._stats['waits'] += 1
+                    self._lock.wait(remaining)
+            if warm_up and self.minconn > 1:
+                threading.Thread(target=self.warm_up, name='db-pool-warm-up', daemon=True).start()
+
+            if candidate is None:
+                break
+            # A ping can stall on a half-dead socket; don't hold up other checkouts meanwhile
+            conn = candidate[0]
+            problem = self._check(*candidate)
+            with self._lock:
+                if problem is None:
+                    self._stats['checkouts'] += 1
                     return conn
-                except Exception as fe:
-                    print(f"DEBUG: Fallback to 5432 also failed: {fe}")
+                self._in_use.pop(id(conn), None)
+                self._stats[problem] += 1
+                self._lock.notify()
+            self._discard(conn)
+
+        # Connecting can take seconds; other threads may use the pool meanwhile
+        try:
+            conn = self._create()
+        except Exception:
+            with self._lock:
+                self._connecting -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._connecting -= 1
+            self._stats['created'] += 1
+            self._in_use[id(conn)] = (conn, time.monotonic())
+            self._stats['checkouts'] += 1
+        return conn
 
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
+    def putconn(self, conn, discard=False):
+        with self._lock:
+            entry = self._in_use.pop(id(conn), None)
+            created_at = entry[1] if entry else time.monotonic()
+            if not discard and not conn.closed:
+                try:
+                    # Never hand out a connection with an open transaction
+                    if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                except Exception:
+                    discard = True
+            if discard or conn.closed or len(self._idle) >= self.maxconn:
+                self._discard(conn)
             else:
-                raise e
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._lock.notify()
+
+    def warm_up(self):
+        """Open connections until the pool holds at least `minconn`"""
+        while True:
+            with self._lock:
+                self._reset_after_fork()
+                if len(self._idle) + len(self._in_use) + self._connecting >= self.minconn:
+                    return
+                self._connecting += 1
+            try:
+                conn = self._create()
+            except Exception:
+                with self._lock:
+                    self._connecting -= 1
+                    self._lock.notify()
+                log.warning("db pool warm-up failed", exc_info=True)
+                return
+            with self._lock:
+                self._connecting -= 1
+                self._stats['created'] += 1
+                now = time.monotonic()
+                self._idle.append((conn, now, now))
+                self._lock.notify()
+
+    def closeall(self):
+        with self._lock:
+            for conn, _, _ in self._idle:
+                self._discard(conn)
+            self._idle = []
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats,
+                        idle=len(self._idle),
+                        in_use=len(self._in_use),
+                        min=self.minconn,
+                        max=self.maxconn,
+                        max_age=self.max_age)
+
+db_pool = ConnectionPool(DB_POOL_MIN, DB_POOL_MAX, DB_POOL_MAX_AGE, DB_POOL_CHECK_IDLE, DB_POOL_TIMEOUT)
+atexit.register(db_pool.closeall)
+
+@contextmanager
+def get_db_connection():
+    """Borrow a connection from the pool; it is returned when the block exits.
+
+    Usage:
+        with get_db_connection() as conn:
+            ...
+    Uncommitted work is rolled back on return. Connections that raised a
+    connection-level error are discarded instead of going back to the pool.
+    """
+    conn = db_pool.getconn()
+    discard = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        discard = True
+        raise
+    finally:
+        db_pool.putconn(conn, discard=discard)
 
 # --- Customer Management Functions ---
-def create_or_update_customer(order):
-    """Create or update customer profile from order data"""
+# Customer aggregates are maintained by deltas: every write path that changes an
+# order reports the order's stat fields before and after the change, and only the
+# difference is applied to the customer row. rebuild_customer_stats() recomputes
+# everything from the orders table for repair.
+
+# Order fields that feed customer statistics
+CUSTOMER_STAT_FIELDS = ('phone', 'status', 'amount', 'rto_risk', 'payment_method', 'delivery_type', 'address', 'state')
+CUSTOMER_STAT_COLUMNS = ', '.join(CUSTOMER_STAT_FIELDS)
+
+# Order fields every write path reports before and after a change: what the
+# customer stats, status counts and daily rollup need
+ORDER_DELTA_FIELDS = CUSTOMER_STAT_FIELDS + ('source', 'created_at')
+ORDER_DELTA_COLUMNS = ', '.join(ORDER_DELTA_FIELDS)
+
+def parse_amount(total):
+    """Parse an order total like '₹1,299.00' into a Decimal rounded to paise (0 if unparseable)"""
+    cleaned = re.sub(r'[^0-9.]', '', str(total or ''))
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
+        return Decimal(cleaned).quantize(Decimal('0.01')) if cleaned else Decimal(0)
+    except InvalidOperation:
+        return Decimal(0)
+
+def _empty_customer_delta():
+    return {'total': 0, 'confirmed': 0, 'cancelled': 0, 'spent': Decimal(0), 'rto': 0,
+            'payment': {}, 'delivery': {}, 'addresses': set(), 'states': set()}
+
+def _add_contribution(delta, row, sign):
+    status = row.get('status')
+    delta['total'] += sign
+    delta['confirmed'] += sign if status == 'Confirmed' else 0
+    delta['cancelled'] += sign if status == 'Cancelled' else 0
+    if status == 'Confirmed':
+        delta['spent'] += sign * parse_amount(row.get('amount'))
+    delta['rto'] += sign if row.get('rto_risk') == 'High' else 0
+    for key, counts in (('payment_method', delta['payment']), ('delivery_type', delta['delivery'])):
+        value = row.get(key)
+        if value is not None:
+            counts[value] = counts.get(value, 0) + sign
+    if sign > 0:
+        # Address/state history only grows; a rebuild drops entries of deleted orders
+        if row.get('address'):
+            delta['addresses'].add(row['address'])
+        if row.get('state'):
+            delta['states'].add(row['state'])
+
+def customer_deltas(changes):
+    """Per-phone stat deltas for a list of (old_row, new_row) order changes (None = absent)"""
+    deltas = {}
+    for old, new in changes:
+        for row, sign in ((old, -1), (new, 1)):
+            if row and row.get('phone'):
+                _add_contribution(deltas.setdefault(row['phone'], _empty_customer_delta()), row, sign)
+    return deltas
+
+# Merge a jsonb {value: count} map with a delta map, dropping values whose count reaches 0
+MERGE_COUNTS_SQL = '''(
+    SELECT COALESCE(jsonb_object_agg(key, n), '{{}}'::jsonb)
+    FROM (SELECT key, SUM(value::int) AS n
+          FROM (SELECT * FROM jsonb_each_text(COALESCE(c.{column}, '{{}}'::jsonb))
+                UNION ALL SELECT * FROM jsonb_each_text(d.{delta})) e
+          GROUP BY key) s
+    WHERE n > 0
+)'''
+
+# Merge a JSON-array TEXT column with new entries, keeping it a sorted distinct list
+MERGE_LIST_SQL = '''(
+    SELECT COALESCE(jsonb_agg(DISTINCT x), '[]'::jsonb)::text
+    FROM jsonb_array_elements_text(COALESCE(NULLIF(c.{column}, ''), '[]')::jsonb || d.{delta}) x
+)'''
+
+APPLY_CUSTOMER_DELTAS_SQL = f'''
+    UPDATE customers c SET
+        total_orders = COALESCE(c.total_orders, 0) + d.total,
+        confirmed_orders = COALESCE(c.confirmed_orders, 0) + d.confirmed,
+        cancelled_orders = COALESCE(c.cancelled_orders, 0) + d.cancelled,
+        total_spent = COALESCE(c.total_spent, 0) + d.spent,
+        rto_count = COALESCE(c.rto_count, 0) + d.rto,
+        payment_counts = {MERGE_COUNTS_SQL.format(column='payment_counts', delta='payment')},
+        delivery_counts = {MERGE_COUNTS_SQL.format(column='delivery_counts', delta='delivery')},
+        addresses = {MERGE_LIST_SQL.format(column='addresses', delta='addresses')},
+        states = {MERGE_LIST_SQL.format(column='states', delta='states')},
+        updated_at = CURRENT_TIMESTAMP
+    FROM (VALUES %s) AS d(phone, total, confirmed, cancelled, spent, rto, payment, delivery, addresses, states)
+    WHERE c.phone = d.phone
+'''
+
+# Auto-tag rules and preferred fields, evaluated from the maintained counters
+REFRESH_CUSTOMER_DERIVED_SQL = '''
+    UPDATE customers SET
+        preferred_payment = (SELECT key FROM jsonb_each_text(payment_counts) ORDER BY value::int DESC, key LIMIT 1),
+        preferred_delivery = (SELECT key FROM jsonb_each_text(delivery_counts) ORDER BY value::int DESC, key LIMIT 1),
+        tags = (
+            SELECT COALESCE(json_agg(tag ORDER BY ord), '[]')::text
+            FROM (VALUES
+                (1, 'VIP', total_spent > 10000),
+                (2, 'High Value', total_spent > 10000),
+                (3, 'Frequent Buyer', total_orders >= 5),
+                (4, 'High Risk', cancelled_orders > 2),
+                (5, 'New Customer', total_orders = 1),
+                (6, 'Loyal', confirmed_orders >= 3)
+            ) AS rules(ord, tag, applies)
+            WHERE applies
+        )
+    WHERE phone = ANY(%s)
+'''
+
+# Dirty phones wait here for the background refresher; one row per phone however often it is marked
+MARK_CUSTOMERS_DIRTY_SQL = '''
+    INSERT INTO customer_refresh_queue (phone)
+    SELECT unnest(%s::text[])
+    ON CONFLICT (phone) DO NOTHING
+'''
+
+# Lock order for customer data, shared by writers and the refresher so they can't deadlock:
+# customers rows first, in phone order, then their customer_refresh_queue rows
+LOCK_CUSTOMERS_SQL = 'SELECT phone FROM customers WHERE phone = ANY(%s) ORDER BY phone FOR UPDATE'
+
+def apply_customer_deltas(conn, changes):
+    """Apply customer stat deltas for (old_row, new_row) order changes. Does not commit."""
+    deltas = customer_deltas(changes)
+    rows = [(
+        phone, d['total'], d['confirmed'], d['cancelled'], d['spent'], d['rto'],
+        orjson.dumps(d['payment']).decode(), orjson.dumps(d['delivery']).decode(),
+        orjson.dumps(sorted(d['addresses'])).decode(), orjson.dumps(sorted(d['states'])).decode(),
+    ) for phone, d in sorted(deltas.items())
+      if d['total'] or d['confirmed'] or d['cancelled'] or d['spent'] or d['rto']
+      or any(d['payment'].values()) or any(d['delivery'].values()) or d['addresses'] or d['states']]
+    if not rows:
+        return
+    phones = [row[0] for row in rows]
+    c = conn.cursor()
+    c.execute(LOCK_CUSTOMERS_SQL, (phones,))
+    execute_values(c, APPLY_CUSTOMER_DELTAS_SQL, rows,
+                   template='(%s, %s, %s, %s, %s::numeric, %s, %s::jsonb, %s::jsonb, %s::jsonb, %s::jsonb)',
+                   page_size=len(rows))
+    c.execute(REFRESH_CUSTOMER_DERIVED_SQL + ';' + MARK_CUSTOMERS_DIRTY_SQL, (phones, phones))
+
+def upsert_customers(conn, orders):
+    """Create customer profiles for new phones and refresh name/email/last order date. Does not commit."""
+    by_phone = {}
+    for order in orders:
         phone = order.get('phone')
         if not phone:
-            return
-        
-        # Check if customer exists
-        c.execute('SELECT * FROM customers WHERE phone = %s', (phone,))
-        existing = c.fetchone()
-        
-        if existing:
-            # Update existing customer
-            c.execute('''
-                UPDATE customers SET
-                    name = COALESCE(%s, name),
-                    email = COALESCE(%s, email),
-                    last_order_date = %s,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE phone = %s
-            ''', (order.get('customer_name'), order.get('email'), order.get('timestamp'), phone))
-        else:
-            # Create new customer
-            c.execute('''
-                INSERT INTO customers (phone, name, email, first_order_date, last_order_date, tags)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            ''', (phone, order.get('customer_name'), order.get('email'), 
-                  order.get('timestamp'), order.get('timestamp'), '["New Customer"]'))
-        
-        conn.commit()
-        conn.close()
-        
-        # Update customer stats
-        update_customer_stats(phone)
-    except Exception as e:
-        print(f"Error creating/updating customer: {e}")
+            continue
+        previous = by_phone.get(phone, {})
+        by_phone[phone] = {
+            'name': order.get('customer_name') or previous.get('name'),
+            'email': order.get('email') or previous.get('email'),
+            'first_order_date': previous.get('first_order_date') or order.get('timestamp'),
+            'last_order_date': order.get('timestamp'),
+        }
+    if not by_phone:
+        return
+    # Phone order, so concurrent writers take the customers row locks in the same order
+    rows = [(phone, p['name'], p['email'], p['first_order_date'], p['last_order_date'], '["New Customer"]')
+            for phone, p in sorted(by_phone.items())]
+    c = conn.cursor()
+    execute_values(c, '''
+        INSERT INTO customers (phone, name, email, first_order_date, last_order_date, tags)
+        VALUES %s
+        ON CONFLICT (phone) DO UPDATE SET
+            name = COALESCE(EXCLUDED.name, customers.name),
+            email = COALESCE(EXCLUDED.email, customers.email),
+            last_order_date = GREATEST(customers.last_order_date, EXCLUDED.last_order_date),
+            updated_at = CURRENT_TIMESTAMP
+    ''', rows, page_size=len(rows))
 
-def update_customer_stats(phone):
-    """Recalculate customer statistics"""
-    try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        
-        # Get order statistics
-        c.execute('''
-            SELECT 
+def rebuild_customer_stats(phones=None, conn=None):
+    """Recompute customer statistics from scratch (all customers, or just `phones`)"""
+    if conn is None:
+        with get_db_connection() as conn:
+            rebuilt = rebuild_customer_stats(phones, conn)
+            conn.commit()
+        return rebuilt
+    c = conn.cursor()
+    phone_filter = 'WHERE phone = ANY(%(phones)s)' if phones is not None else ''
+    c.execute(f'''
+        WITH stats AS (
+            SELECT
+                phone,
                 COUNT(*) as total_orders,
                 COUNT(*) FILTER (WHERE status = 'Confirmed') as confirmed_orders,
                 COUNT(*) FILTER (WHERE status = 'Cancelled') as cancelled_orders,
-                COALESCE(SUM(CASE 
-                    WHEN status = 'Confirmed' AND total IS NOT NULL AND total != '' 
-                    THEN CAST(NULLIF(REGEXP_REPLACE(total, '[^0-9.]', '', 'g'), '') AS DECIMAL(10,2))
-                    ELSE 0 
-                END), 0) as total_spent,
+                COALESCE(SUM(amount) FILTER (WHERE status = 'Confirmed'), 0) as total_spent,
                 COUNT(*) FILTER (WHERE rto_risk = 'High') as rto_count,
                 json_agg(DISTINCT address) FILTER (WHERE address IS NOT NULL AND address != '') as addresses,
                 json_agg(DISTINCT state) FILTER (WHERE state IS NOT NULL AND state != '') as states
             FROM orders
-            WHERE phone = %s
-        ''', (phone,))
-        
-        stats = c.fetchone()
-        
-        # Get preferred payment method
-        c.execute('''
-            SELECT payment_method
-            FROM orders
-            WHERE phone = %s AND payment_method IS NOT NULL
-            GROUP BY payment_method
-            ORDER BY COUNT(*) DESC
-            LIMIT 1
-        ''', (phone,))
-        preferred_payment = c.fetchone()
-        
-        # Get preferred delivery type
-        c.execute('''
-            SELECT delivery_type
-            FROM orders
-            WHERE phone = %s AND delivery_type IS NOT NULL
-            GROUP BY delivery_type
-            ORDER BY COUNT(*) DESC
-            LIMIT 1
-        ''', (phone,))
-        preferred_delivery = c.fetchone()
-        
-        # Auto-tag based on stats
-        tags = []
-        if stats['total_spent'] > 10000:
-            tags.extend(['VIP', 'High Value'])
-        if stats['total_orders'] >= 5:
-            tags.append('Frequent Buyer')
-        if stats['cancelled_orders'] > 2:
-            tags.append('High Risk')
-        if stats['total_orders'] == 1:
-            tags.append('New Customer')
-        if stats['confirmed_orders'] >= 3:
-            tags.append('Loyal')
-        
-        # Update customer
-        c.execute('''
-            UPDATE customers SET
-                total_orders = %s,
-                confirmed_orders = %s,
-                cancelled_orders = %s,
-                total_spent = %s,
-                rto_count = %s,
-                addresses = %s,
-                states = %s,
-                preferred_payment = %s,
-                preferred_delivery = %s,
-                tags = %s,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE phone = %s
-        ''', (
-            stats['total_orders'],
-            stats['confirmed_orders'],
-            stats['cancelled_orders'],
-            stats['total_spent'],
-            stats['rto_count'],
-            json.dumps(stats['addresses']) if stats['addresses'] else '[]',
-            json.dumps(stats['states']) if stats['states'] else '[]',
-            preferred_payment['payment_method'] if preferred_payment else None,
-            preferred_delivery['delivery_type'] if preferred_delivery else None,
-            json.dumps(tags),
-            phone
-        ))
-        
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Error updating customer stats: {e}")
+            {phone_filter}
+            GROUP BY phone
+        ),
+        payments AS (
+            SELECT phone, jsonb_object_agg(payment_method, n) AS counts
+            FROM (SELECT phone, payment_method, COUNT(*) AS n FROM orders
+                  {phone_filter} {'AND' if phones is not None else 'WHERE'} payment_method IS NOT NULL
+                  GROUP BY phone, payment_method) p
+            GROUP BY phone
+        ),
+        deliveries AS (
+            SELECT phone, jsonb_object_agg(delivery_type, n) AS counts
+            FROM (SELECT phone, delivery_type, COUNT(*) AS n FROM orders
+                  {phone_filter} {'AND' if phones is not None else 'WHERE'} delivery_type IS NOT NULL
+                  GROUP BY phone, delivery_type) d
+            GROUP BY phone
+        )
+        UPDATE customers c SET
+            total_orders = COALESCE(s.total_orders, 0),
+            confirmed_orders = COALESCE(s.confirmed_orders, 0),
+            cancelled_orders = COALESCE(s.cancelled_orders, 0),
+            total_spent = COALESCE(s.total_spent, 0),
+            rto_count = COALESCE(s.rto_count, 0),
+            addresses = COALESCE(s.addresses::text, '[]'),
+            states = COALESCE(s.states::text, '[]'),
+            payment_counts = COALESCE(p.counts, '{{}}'::jsonb),
+            delivery_counts = COALESCE(d.counts, '{{}}'::jsonb),
+            updated_at = CURRENT_TIMESTAMP
+        FROM customers t
+        LEFT JOIN stats s ON s.phone = t.phone
+        LEFT JOIN payments p ON p.phone = t.phone
+        LEFT JOIN deliveries d ON d.phone = t.phone
+        WHERE c.phone = t.phone {'AND t.phone = ANY(%(phones)s)' if phones is not None else ''}
+        RETURNING c.phone
+    ''', {'phones': list(phones) if phones is not None else None})
+    rebuilt = [row['phone'] for row in c.fetchall()]
+    c.execute(REFRESH_CUSTOMER_DERIVED_SQL, (rebuilt,))
+    if rebuilt:
+        # Cached views show customer stats too
+        bump_data_version(conn)
+    return len(rebuilt)
 
 def get_customer_by_phone(phone):
     """Get customer profile by phone number"""
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        c.execute('SELECT * FROM customers WHERE phone = %s', (phone,))
-        customer = c.fetchone()
-        conn.close()
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('SELECT * FROM customers WHERE phone = %s', (phone,))
+            customer = c.fetchone()
         return customer
-    except Exception as e:
-        print(f"Error getting customer: {e}")
+    except Exception:
+        log.exception("Error getting customer")
         return None
 
+# What customers.html renders; address history and notes stay in the detail views
+CUSTOMER_LIST_COLUMNS = ('phone, name, email, total_orders, confirmed_orders, cancelled_orders, total_spent, '
+                         'last_order_date, tags')
+
 def get_all_customers(search=None, filter_type=None, sort_by='last_order_date', sort_order='DESC'):
     """Get all customers with optional filtering and sorting"""
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
+        with get_db_connection() as conn:
+            c = conn.cursor()
         
-        query = 'SELECT * FROM customers WHERE 1=1'
-        params = []
+            query = f'SELECT {CUSTOMER_LIST_COLUMNS} FROM customers WHERE 1=1'
+            params = []
         
-        # Search filter
-        if search:
-            query += ' AND (name ILIKE %s OR phone ILIKE %s OR email ILIKE %s)'
-            search_pattern = f'%{search}%'
-            params.extend([search_pattern, search_pattern, search_pattern])
+            # Search filter
+            if search:
+                query += f' AND {CUSTOMER_SEARCH_SQL} ILIKE %s'
+                params.append(search_pattern(search))
         
-        # Type filters
-        if filter_type == 'repeat':
-            query += ' AND total_orders > 1'
-        elif filter_type == 'vip':
-            query += ' AND total_spent > 10000'
-        elif filter_type == 'high_risk':
-            query += ' AND cancelled_orders > 2'
-        elif filter_type == 'new':
-            query += ' AND total_orders = 1'
+            # Type filters
+            if filter_type == 'repeat':
+                query += ' AND total_orders > 1'
+            elif filter_type == 'vip':
+                query += ' AND total_spent > 10000'
+            elif filter_type == 'high_risk':
+                query += ' AND cancelled_orders > 2'
+            elif filter_type == 'new':
+                query += ' AND total_orders = 1'
         
-        # Sorting
-        valid_sorts = ['total_orders', 'total_spent', 'last_order_date', 'name']
-        if sort_by in valid_sorts:
-            query += f' ORDER BY {sort_by} {sort_order}'
+            # Sorting
+            valid_sorts = ['total_orders', 'total_spent', 'last_order_date', 'name']
+            if sort_by in valid_sorts:
+                query += f' ORDER BY {sort_by} {sort_order}'
         
-        c.execute(query, params)
-        customers = c.fetchall()
-        conn.close()
+            c.execute(query, params)
+            customers = c.fetchall()
         return customers
-    except Exception as e:
-        print(f"Error getting customers: {e}")
+    except Exception:
+        log.exception("Error getting customers")
         return []
 
+AMOUNT_DIGITS_SQL = "REGEXP_REPLACE(COALESCE(total, ''), '[^0-9.]', '', 'g')"
+
+# Last 10 digits of the stored phone, whatever the formatting ('+91 98765-43210' -> '9876543210');
+# the WhatsApp reply lookup matches on it through idx_orders_phone_key
+PHONE_KEY_SQL = "RIGHT(REGEXP_REPLACE(COALESCE(phone, ''), '[^0-9]', '', 'g'), 10)"
+
+BACKFILL_CHUNK = int(os.getenv("BACKFILL_CHUNK", "5000"))
+
+def backfill_orders(conn, assignment, pending_condition, chunk_size=BACKFILL_CHUNK):
+    """Run `UPDATE orders SET <assignment>` in committed chunks over rows matching `pending_condition`.
+
+    The assignment must make the condition false for every row it touches,
+    otherwise this never finishes.
+    """
+    c = conn.cursor()
+    total = 0
+    while True:
+        c.execute(f'''
+            UPDATE orders SET {assignment}
+            WHERE id IN (SELECT id FROM orders WHERE {pending_condition} LIMIT %s)
+        ''', (chunk_size,))
+        conn.commit()
+        total += c.rowcount
+        if c.rowcount < chunk_size:
+            break
+    log.info("Backfilled orders", extra={'rows': total, 'assignment': assignment})
+    return total
+
+# Turns legacy products TEXT into a JSONB array: JSON arrays are kept, other JSON
+# values are wrapped in an array, and text that isn't JSON becomes a one-item array
+PRODUCTS_JSONB_FUNCTION_SQL = '''
+    CREATE OR REPLACE FUNCTION pg_temp.products_jsonb(value TEXT) RETURNS JSONB AS $$
+    BEGIN
+        IF value IS NULL OR btrim(value) = '' THEN
+            RETURN '[]'::jsonb;
+        END IF;
+        IF jsonb_typeof(value::jsonb) = 'array' THEN
+            RETURN value::jsonb;
+        END IF;
+        RETURN jsonb_build_array(value::jsonb);
+    EXCEPTION WHEN invalid_text_representation THEN
+        RETURN jsonb_build_array(value);
+    END
+    $$ LANGUAGE plpgsql IMMUTABLE
+'''
+
+def migrate_products_to_jsonb(conn):
+    """Move orders.products from TEXT to JSONB without a long table lock.
+
+    The JSONB copy is backfilled in committed chunks next to the old column.
+    Then, under a brief exclusive lock, rows written meanwhile are caught up
+    and the copy replaces the original. Safe to re-run if interrupted.
+    """
+    c = conn.cursor()
+    c.execute(PRODUCTS_JSONB_FUNCTION_SQL)
+    c.execute("ALTER TABLE orders ADD COLUMN IF NOT EXISTS products_jsonb JSONB")
+    conn.commit()
+    backfill_orders(conn, "products_jsonb = pg_temp.products_jsonb(products)", "products_jsonb IS NULL")
+    c.execute("LOCK TABLE orders IN ACCESS EXCLUSIVE MODE")
+    c.execute("UPDATE orders SET products_jsonb = pg_temp.products_jsonb(products) WHERE products_jsonb IS NULL")
+    c.execute("ALTER TABLE orders DROP COLUMN products")
+    c.execute("ALTER TABLE orders RENAME COLUMN products_jsonb TO products")
+    c.execute("ALTER TABLE orders ALTER COLUMN products SET DEFAULT '[]'::jsonb")
+    conn.commit()
+    log.info("Migrated orders.products to JSONB")
+
 def init_db(conn=None):
     if not DATABASE_URL:
         return
     
-    should_close = False
     if conn is None:
         try:
-            conn = get_db_connection()
-            should_close = True
+            with get_db_connection() as conn:
+                init_db(conn)
         except:
-            return
+            pass
+        return
 
     try:
         c = conn.cursor()
@@ -301,7 +1000,7 @@ def init_db(conn=None):
                 phone TEXT,
                 address TEXT,
                 source TEXT,
-                products TEXT,  -- JSON string
+                products JSONB DEFAULT '[]'::jsonb,
                 total TEXT,
                 status TEXT,
                 timestamp TEXT,
@@ -314,7 +1013,7 @@ def init_db(conn=None):
         
         # Migrations
         c.execute("SELECT column_name FROM information_schema.columns WHERE table_name='orders'")
-        existing_columns = [row[0] for row in c.fetchall()]
+        existing_columns = [row['column_name'] for row in c.fetchall()]
         
         # Ensure all columns are present, adding if missing
         if 'address' not in existing_columns:
@@ -329,17 +1028,456 @@ def init_db(conn=None):
             c.execute("ALTER TABLE orders ADD COLUMN payment_method TEXT DEFAULT 'Prepaid'")
         if 'email' not in existing_columns:
             c.execute("ALTER TABLE orders ADD COLUMN email TEXT")
+        if 'rto_risk' not in existing_columns:
+            c.execute("ALTER TABLE orders ADD COLUMN rto_risk TEXT DEFAULT 'LOW'")
+        if 'is_packed' not in existing_columns:
+            c.execute("ALTER TABLE orders ADD COLUMN is_packed BOOLEAN DEFAULT FALSE")
+        if 'order_seq' not in existing_columns:
+            # Numeric order number parsed from the id ('#1001' -> 1001). A stored generated column is
+            # filled in for existing rows by the ALTER and kept current on every insert/update.
+            c.execute('''
+                ALTER TABLE orders ADD COLUMN order_seq BIGINT
+                GENERATED ALWAYS AS (COALESCE(substring(id from '[0-9]{1,18}')::bigint, 0)) STORED
+            ''')
+        c.execute("CREATE INDEX IF NOT EXISTS idx_orders_status_seq ON orders (status, order_seq DESC, id DESC)")
+        # Packing viewer lists (VIEWER_LISTS): each keyset page is an index range scan of its own list
+        c.execute("CREATE INDEX IF NOT EXISTS idx_orders_to_pack_seq ON orders (order_seq DESC, id DESC) "
+                  "WHERE status = 'Confirmed' AND is_packed IS NOT TRUE")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_orders_packed_seq ON orders (order_seq DESC, id DESC) "
+                  "WHERE status = 'Confirmed' AND is_packed = TRUE")
+        # WhatsApp replies: a customer's latest order by phone, an index range scan
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_orders_phone_key ON orders (({PHONE_KEY_SQL}), order_seq DESC, id DESC)")
+        if 'created_at' not in existing_columns:
+            c.execute("ALTER TABLE orders ADD COLUMN created_at TIMESTAMPTZ")
+            conn.commit()
+            # `timestamp` holds IST wall-clock text like '2024-05-01 14:03:22'
+            backfill_orders(conn, "created_at = (timestamp::timestamp AT TIME ZONE 'Asia/Kolkata')",
+                            "created_at IS NULL AND timestamp ~ '^\\d{4}-\\d{2}-\\d{2}( \\d{2}:\\d{2}:\\d{2})?$'")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders (status, created_at)")
+        if 'amount' not in existing_columns:
+            c.execute("ALTER TABLE orders ADD COLUMN amount NUMERIC(12,2)")
+            conn.commit()
+            # Same rule as parse_amount(): keep digits and '.', anything unparseable counts as 0
+            backfill_orders(conn, f"amount = COALESCE(CASE WHEN {AMOUNT_DIGITS_SQL} ~ '^([0-9]+[.]?[0-9]*|[.][0-9]+)$' "
+                                  f"THEN CAST({AMOUNT_DIGITS_SQL} AS NUMERIC(12,2)) END, 0)",
+                            "amount IS NULL")
+        c.execute("SELECT data_type FROM information_schema.columns WHERE table_name='orders' AND column_name='products'")
+        if c.fetchone()['data_type'] == 'text':
+            migrate_products_to_jsonb(conn)
+
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS customers (
+                phone TEXT PRIMARY KEY,
+                name TEXT,
+                email TEXT,
+                first_order_date TIMESTAMP,
+                last_order_date TIMESTAMP,
+                total_orders INTEGER DEFAULT 0,
+                confirmed_orders INTEGER DEFAULT 0,
+                cancelled_orders INTEGER DEFAULT 0,
+                total_spent DECIMAL(10,2) DEFAULT 0,
+                rto_count INTEGER DEFAULT 0,
+                addresses TEXT DEFAULT '[]',  -- JSON string
+                states TEXT DEFAULT '[]',  -- JSON string
+                preferred_payment TEXT,
+                preferred_delivery TEXT,
+                tags TEXT DEFAULT '[]',  -- JSON string
+                notes TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS customer_refresh_queue (
+                phone TEXT PRIMARY KEY,
+                marked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        c.execute("SELECT to_regclass('order_status_counts') IS NOT NULL AS present")
+        if not c.fetchone()['present']:
+            c.execute('''
+                CREATE TABLE order_status_counts (
+                    status TEXT PRIMARY KEY,
+                    order_count BIGINT NOT NULL DEFAULT 0
+                )
+            ''')
+            rebuild_status_counts(conn)
+
+        c.execute("SELECT to_regclass('daily_order_stats') IS NOT NULL AS present")
+        if not c.fetchone()['present']:
+            c.execute('''
+                CREATE TABLE daily_order_stats (
+                    day DATE NOT NULL,
+                    source TEXT NOT NULL,
+                    payment_method TEXT NOT NULL,
+                    delivery_type TEXT NOT NULL,
+                    total_orders INTEGER NOT NULL DEFAULT 0,
+                    pending INTEGER NOT NULL DEFAULT 0,
+                    confirmed INTEGER NOT NULL DEFAULT 0,
+                    cancelled INTEGER NOT NULL DEFAULT 0,
+                    call_again INTEGER NOT NULL DEFAULT 0,
+                    confirmed_amount NUMERIC(14,2) NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, source, payment_method, delivery_type)
+                )
+            ''')
+            rebuild_daily_stats(conn)
+
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS data_version (
+                name TEXT PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0
+            )
+        ''')
+        c.execute("INSERT INTO data_version (name) VALUES ('orders') ON CONFLICT DO NOTHING")
+
+        ensure_search_indexes(conn)
+
+        c.execute("SELECT column_name FROM information_schema.columns WHERE table_name='customers'")
+        customer_columns = [row['column_name'] for row in c.fetchall()]
+
+        # Per-customer {value: order count} maps behind preferred_payment / preferred_delivery
+        if 'payment_counts' not in customer_columns:
+            c.execute("ALTER TABLE customers ADD COLUMN payment_counts JSONB DEFAULT '{}'::jsonb")
+            c.execute("ALTER TABLE customers ADD COLUMN IF NOT EXISTS delivery_counts JSONB DEFAULT '{}'::jsonb")
+            # Seed the new counters once; from here on they are maintained by deltas
+            rebuild_customer_stats(conn=conn)
 
         conn.commit()
-        if should_close:
-            conn.close()
-        print("Database initialized successfully.")
-    except Exception as e:
-        print(f"Error initializing database: {e}")
+        log.info("Database initialized successfully")
+    except Exception:
+        log.exception("Error initializing database")
 
 # Removed global init_db() call to prevent blocking Render startup
 # init_db()
 
+# --- Search ---
+# Order and customer search match against one concatenated text expression per
+# table. When the pg_trgm extension is available that expression carries a GIN
+# trigram index, so substring (ILIKE) and fuzzy matches become index scans and
+# type-ahead results are ranked by word similarity. Without the extension the
+# same ILIKE filters still work, as sequential scans.
+
+ORDER_SEARCH_SQL = ("(COALESCE(customer_name, '') || ' ' || COALESCE(phone, '') || ' ' || "
+                    "COALESCE(email, '') || ' ' || COALESCE(address, ''))")
+CUSTOMER_SEARCH_SQL = "(COALESCE(name, '') || ' ' || COALESCE(phone, '') || ' ' || COALESCE(email, ''))"
+
+SEARCH_SUGGEST_LIMIT = int(os.getenv("SEARCH_SUGGEST_LIMIT", "10"))
+SEARCH_SUGGEST_MAX = 50
+
+# What the type-ahead API returns per kind; `fields` are checked for prefix matches when ranking
+SEARCH_TARGETS = {
+    'orders': {
+        'table': 'orders', 'expr': ORDER_SEARCH_SQL, 'fields': ('customer_name', 'phone', 'email'),
+        'columns': 'id, customer_name, phone, email, status, total, created_at',
+        'tiebreak': 'order_seq DESC, id DESC',
+    },
+    'customers': {
+        'table': 'customers', 'expr': CUSTOMER_SEARCH_SQL, 'fields': ('name', 'phone', 'email'),
+        'columns': 'phone, name, email, total_orders, total_spent, last_order_date',
+        'tiebreak': 'last_order_date DESC NULLS LAST, phone',
+    },
+}
+
+_trigram_available = None
+
+def ensure_search_indexes(conn):
+    """Install pg_trgm if we are allowed to and index the search expressions.
+
+    Returns whether trigram search is enabled. Failing to create the extension
+    is not an error: search falls back to plain ILIKE.
+    """
+    global _trigram_available
+    c = conn.cursor()
+    c.execute("SAVEPOINT search_setup")
+    try:
+        c.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except psycopg2.Error as e:
+        c.execute("ROLLBACK TO SAVEPOINT search_setup")
+        log.warning("pg_trgm unavailable, search falls back to unindexed ILIKE",
+                    extra={'error': str(e).splitlines()[0]})
+        _trigram_available = False
+        return False
+    c.execute(f"CREATE INDEX IF NOT EXISTS idx_orders_search_trgm ON orders USING gin ({ORDER_SEARCH_SQL} gin_trgm_ops)")
+    c.execute(f"CREATE INDEX IF NOT EXISTS idx_customers_search_trgm ON customers USING gin ({CUSTOMER_SEARCH_SQL} gin_trgm_ops)")
+    _trigram_available = True
+    return True
+
+def trigram_search_available(conn):
+    """Whether pg_trgm is installed (checked once per process)"""
+    global _trigram_available
+    if _trigram_available is None:
+        c = conn.cursor()
+        c.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') AS installed")
+        _trigram_available = c.fetchone()['installed']
+    return _trigram_available
+
+def search_pattern(term, prefix=False):
+    """ILIKE pattern for `term` (anywhere, or at the start), with LIKE wildcards escaped"""
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"{escaped}%" if prefix else f"%{escaped}%"
+
+def search_suggestions(kind, term, limit=SEARCH_SUGGEST_LIMIT):
+    """Top `limit` orders or customers matching `term`, best match first.
+
+    A row matches if the term occurs anywhere in its search expression or, with
+    pg_trgm, if a word in it is similar to the term (typos). Prefix matches on a
+    field rank above substring matches, which rank above fuzzy ones.
+    """
+    target = SEARCH_TARGETS[kind]
+    expr = target['expr']
+    prefix_match = ' OR '.join(f"{field} ILIKE %(prefix)s" for field in target['fields'])
+    score = f"(CASE WHEN {prefix_match} THEN 1 ELSE 0 END + CASE WHEN {expr} ILIKE %(pattern)s THEN 0.5 ELSE 0 END)"
+    with get_db_connection() as conn:
+        if trigram_search_available(conn):
+            match = f"({expr} ILIKE %(pattern)s OR %(term)s <%% {expr})"
+            score += f" + word_similarity(%(term)s, {expr})"
+        else:
+            match = f"{expr} ILIKE %(pattern)s"
+        c = conn.cursor()
+        c.execute(f'''
+            SELECT {target['columns']}, ({score})::float AS score
+            FROM {target['table']}
+            WHERE {match}
+            ORDER BY score DESC, {target['tiebreak']}
+            LIMIT %(limit)s
+        ''', {'term': term, 'pattern': search_pattern(term), 'prefix': search_pattern(term, prefix=True),
+              'limit': limit})
+        return c.fetchall()
+
+# --- Order Counts ---
+# Per-status order totals live in order_status_counts and are moved by deltas in
+# the same transaction as every write that adds, removes or re-statuses orders,
+# so unfiltered pagination reads one row instead of counting the table. Counts
+# for filtered views and the filter dropdown facets are computed on demand and
+# cached briefly per process.
+
+COUNT_CACHE_TTL = int(os.getenv("COUNT_CACHE_TTL", "30"))
+FACET_CACHE_TTL = int(os.getenv("FACET_CACHE_TTL", "60"))
+
+class TTLCache:
+    """Small thread-safe cache whose entries expire `ttl` seconds after being computed"""
+
+    def __init__(self, ttl, max_entries=1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (now + self.ttl, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'ttl': self.ttl, 'hits': self.hits, 'misses': self.misses}
+
+filtered_count_cache = TTLCache(COUNT_CACHE_TTL)
+facet_cache = TTLCache(FACET_CACHE_TTL)
+
+APPLY_STATUS_COUNT_DELTAS_SQL = '''
+    INSERT INTO order_status_counts (status, order_count) VALUES %s
+    ON CONFLICT (status) DO UPDATE SET order_count = order_status_counts.order_count + EXCLUDED.order_count
+'''
+
+def apply_status_count_deltas(conn, changes):
+    """Move per-status totals for (old_row, new_row) order changes. Does not commit."""
+    deltas = {}
+    for old, new in changes:
+        if old and old.get('status') is not None:
+            deltas[old['status']] = deltas.get(old['status'], 0) - 1
+        if new and new.get('status') is not None:
+            deltas[new['status']] = deltas.get(new['status'], 0) + 1
+    # Sorted so concurrent writers lock the count rows in the same order
+    rows = sorted((status, n) for status, n in deltas.items() if n)
+    if rows:
+        execute_values(conn.cursor(), APPLY_STATUS_COUNT_DELTAS_SQL, rows, page_size=len(rows))
+
+def rebuild_status_counts(conn):
+    """Recount per-status totals from the orders table. Does not commit."""
+    c = conn.cursor()
+    c.execute('DELETE FROM order_status_counts')
+    c.execute('''
+        INSERT INTO order_status_counts (status, order_count)
+        SELECT status, COUNT(*) FROM orders WHERE status IS NOT NULL GROUP BY status
+    ''')
+
+def get_status_counts(conn=None):
+    """{status: order count} from the maintained totals"""
+    if conn is None:
+        with get_db_connection() as conn:
+            return get_status_counts(conn)
+    c = conn.cursor()
+    c.execute('SELECT status, order_count FROM order_status_counts')
+    return {row['status']: row['order_count'] for row in c.fetchall()}
+
+def count_orders(conn, status, where_clause, params, filtered):
+    """Number of orders matching a get_orders() filter.
+
+    The unfiltered per-status count comes from order_status_counts; anything
+    narrower is counted and cached for COUNT_CACHE_TTL seconds.
+    """
+    if not filtered:
+        return get_status_counts(conn).get(status, 0)
+
+    def count():
+        c = conn.cursor()
+        c.execute(f'SELECT COUNT(*) FROM orders WHERE {where_clause}', params)
+        return c.fetchone()['count']
+    return filtered_count_cache.get_or_compute((where_clause, tuple(params)), count)
+
+def get_facet_counts(status):
+    """Order counts per payment method, delivery type and state within a status, cached briefly"""
+    def compute():
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('''
+                SELECT GROUPING(payment_method) = 0 AS by_payment, GROUPING(delivery_type) = 0 AS by_delivery,
+                       payment_method, delivery_type, state, COUNT(*) AS n
+                FROM orders
+                WHERE status = %s
+                GROUP BY GROUPING SETS ((payment_method), (delivery_type), (state))
+            ''', (status,))
+            facets = {'payment': {}, 'delivery': {}, 'state': {}}
+            for row in c.fetchall():
+                if row['by_payment']:
+                    facets['payment'][row['payment_method']] = row['n']
+                elif row['by_delivery']:
+                    facets['delivery'][row['delivery_type']] = row['n']
+                else:
+                    facets['state'][row['state']] = row['n']
+            return facets
+    return facet_cache.get_or_compute(status, compute)
+
+# --- Daily Rollup ---
+# daily_order_stats holds order counts and confirmed revenue per IST calendar day
+# and (source, payment method, delivery type). Like the customer and status
+# counters it is moved by deltas inside each write transaction;
+# rebuild_daily_stats() recomputes it from the orders table for repair.
+# /reports reads only this table, so its cost follows the number of days shown.
+
+REPORT_DEFAULT_DAYS = int(os.getenv("REPORT_DEFAULT_DAYS", "90"))
+REPORT_GRANULARITIES = ('day', 'week', 'month')
+
+# Rollup dimensions and the order fields they come from; NULLs are stored as ''
+DAILY_STAT_DIMENSIONS = ('source', 'payment_method', 'delivery_type')
+
+APPLY_DAILY_STAT_DELTAS_SQL = '''
+    INSERT INTO daily_order_stats AS s (day, source, payment_method, delivery_type, total_orders,
+                                        pending, confirmed, cancelled, call_again, confirmed_amount)
+    SELECT (d.created_at AT TIME ZONE 'Asia/Kolkata')::date AS day, d.source, d.payment_method, d.delivery_type,
+           SUM(d.sign),
+           COALESCE(SUM(d.sign) FILTER (WHERE d.status = 'Pending'), 0),
+           COALESCE(SUM(d.sign) FILTER (WHERE d.status = 'Confirmed'), 0),
+           COALESCE(SUM(d.sign) FILTER (WHERE d.status = 'Cancelled'), 0),
+           COALESCE(SUM(d.sign) FILTER (WHERE d.status = 'Call Again'), 0),
+           COALESCE(SUM(d.sign * d.amount) FILTER (WHERE d.status = 'Confirmed'), 0)
+    FROM (VALUES %s) AS d(created_at, source, payment_method, delivery_type, status, sign, amount)
+    GROUP BY 1, 2, 3, 4
+    -- Sorted so concurrent writers lock rollup rows in the same order
+    ORDER BY 1, 2, 3, 4
+    ON CONFLICT (day, source, payment_method, delivery_type) DO UPDATE SET
+        total_orders = s.total_orders + EXCLUDED.total_orders,
+        pending = s.pending + EXCLUDED.pending,
+        confirmed = s.confirmed + EXCLUDED.confirmed,
+        cancelled = s.cancelled + EXCLUDED.cancelled,
+        call_again = s.call_again + EXCLUDED.call_again,
+        confirmed_amount = s.confirmed_amount + EXCLUDED.confirmed_amount
+'''
+
+def _daily_stat_key(row):
+    return (str(row['created_at']), *(row.get(dim) or '' for dim in DAILY_STAT_DIMENSIONS),
+            row.get('status'), parse_amount(row.get('amount')) if row.get('status') == 'Confirmed' else 0)
+
+def apply_daily_stat_deltas(conn, changes):
+    """Move the daily rollup for (old_row, new_row) order changes. Does not commit."""
+    rows = []
+    for old, new in changes:
+        old_key = _daily_stat_key(old) if old and old.get('created_at') else None
+        new_key = _daily_stat_key(new) if new and new.get('created_at') else None
+        if old_key == new_key:
+            continue
+        if old_key:
+            rows.append(old_key[:-1] + (-1, old_key[-1]))
+        if new_key:
+            rows.append(new_key[:-1] + (1, new_key[-1]))
+    if rows:
+        execute_values(conn.cursor(), APPLY_DAILY_STAT_DELTAS_SQL, rows,
+                       template='(%s::timestamptz, %s, %s, %s, %s, %s, %s::numeric)', page_size=len(rows))
+
+def rebuild_daily_stats(conn):
+    """Recompute the daily rollup from the orders table. Does not commit."""
+    c = conn.cursor()
+    c.execute('DELETE FROM daily_order_stats')
+    c.execute('''
+        INSERT INTO daily_order_stats (day, source, payment_method, delivery_type, total_orders,
+                                       pending, confirmed, cancelled, call_again, confirmed_amount)
+        SELECT (created_at AT TIME ZONE 'Asia/Kolkata')::date, COALESCE(source, ''),
+               COALESCE(payment_method, ''), COALESCE(delivery_type, ''),
+               COUNT(*),
+               COUNT(*) FILTER (WHERE status = 'Pending'),
+               COUNT(*) FILTER (WHERE status = 'Confirmed'),
+               COUNT(*) FILTER (WHERE status = 'Cancelled'),
+               COUNT(*) FILTER (WHERE status = 'Call Again'),
+               COALESCE(SUM(amount) FILTER (WHERE status = 'Confirmed'), 0)
+        FROM orders
+        WHERE created_at IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+    ''')
+    return c.rowcount
+
+def get_report(start_date=None, end_date=None, granularity='day'):
+    """Order counts per day, week or month (newest first) from the daily rollup.
+
+    Dates are inclusive 'YYYY-MM-DD' strings; without a start the report covers
+    the last REPORT_DEFAULT_DAYS days. Each row carries the period's first and
+    last day so callers can link to exports for it.
+    """
+    if granularity not in REPORT_GRANULARITIES:
+        granularity = 'day'
+    start, end = ist_day_range(start_date, end_date)
+    end_day = (end - timedelta(days=1)).date() if end else datetime.now(IST).date()
+    start_day = start.date() if start else end_day - timedelta(days=REPORT_DEFAULT_DAYS - 1)
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute('''
+            SELECT to_char(p.period, 'YYYY-MM-DD') AS day,
+                   to_char(GREATEST(p.period, %(start)s), 'YYYY-MM-DD') AS period_start,
+                   to_char(LEAST(p.period + (1 || ' ' || %(unit)s)::interval - interval '1 day', %(end)s), 'YYYY-MM-DD') AS period_end,
+                   p.total, p.pending, p.confirmed, p.cancelled, p.call_again, p.confirmed_amount
+            FROM (
+                SELECT date_trunc(%(unit)s, day)::date AS period,
+                       SUM(total_orders) AS total, SUM(pending) AS pending, SUM(confirmed) AS confirmed,
+                       SUM(cancelled) AS cancelled, SUM(call_again) AS call_again,
+                       SUM(confirmed_amount) AS confirmed_amount
+                FROM daily_order_stats
+                WHERE day BETWEEN %(start)s AND %(end)s
+                GROUP BY 1
+                HAVING SUM(total_orders) > 0
+            ) p
+            ORDER BY p.period DESC
+        ''', {'unit': granularity, 'start': start_day, 'end': end_day})
+        rows = c.fetchall()
+    return rows
+
 # --- Helper Functions ---
 
 def calculate_rto_risk(payment_method, state):
@@ -377,6 +1515,7 @@ def normalize_shopify_order(data):
         
         state = shipping.get("province", "")
         rto_risk = calculate_rto_risk(payment_method, state)
+        received_at = datetime.now(IST)
             
         return {
             "id": str(data.get("name", "N/A")),
@@ -388,15 +1527,17 @@ def normalize_shopify_order(data):
             "payment_method": payment_method,
             "rto_risk": rto_risk,
             "source": "Shopify",
-            "products": json.dumps(products),
+            "products": products,
             "total": data.get("total_price", "0.00"),
+            "amount": str(parse_amount(data.get("total_price", "0.00"))),
             "status": "Pending",
-            "timestamp": datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S"),
+            "timestamp": received_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "created_at": received_at.isoformat(),
             "notes": "",
             "delivery_type": delivery_type
         }
-    except Exception as e:
-        print(f"Error parsing Shopify data: {e}")
+    except Exception:
+        log.exception("Error parsing Shopify data")
         return None
 
 def normalize_shiprocket_order(data):
@@ -436,6 +1577,7 @@ def normalize_shiprocket_order(data):
             rto_risk = "HIGH"
         elif "MEDIUM RISK" in tags_str.upper() or "MEDIUM_RISK" in tags_str.upper():
             rto_risk = "MEDIUM"
+        received_at = datetime.now(IST)
 
         return {
             "id": str(data.get("channel_order_id") or data.get("order_id", "N/A")),
@@ -447,177 +1589,570 @@ def normalize_shiprocket_order(data):
             "payment_method": payment_method,
             "rto_risk": rto_risk,
             "source": "Shiprocket",
-            "products": json.dumps(products),
+            "products": products,
             "total": data.get("net_total", "0.00"),
+            "amount": str(parse_amount(data.get("net_total", "0.00"))),
             "status": "Pending",
-            "timestamp": datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S"),
+            "timestamp": received_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "created_at": received_at.isoformat(),
             "notes": "",
             "delivery_type": delivery_type
         }
-    except Exception as e:
-        print(f"Error parsing Shiprocket data: {e}")
+    except Exception:
+        log.exception("Error parsing Shiprocket data")
         return None
 
-def save_order(order):
-    conn = get_db_connection()
-    c = conn.cursor(cursor_factory=RealDictCursor)
-    
-    # Check for existing data to preserve
-    c.execute('SELECT notes, delivery_type, state, payment_method, email, rto_risk FROM orders WHERE id = %s', (order['id'],))
-    existing = c.fetchone()
-    notes = existing['notes'] if existing and existing.get('notes') else order.get('notes', '')
-    delivery_type = existing['delivery_type'] if existing and existing.get('delivery_type') else order.get('delivery_type', 'Standard')
-    state = order.get('state') or (existing['state'] if existing else '')
-    payment_method = order.get('payment_method') or (existing['payment_method'] if existing else 'Prepaid')
-    email = order.get('email') or (existing['email'] if existing else '')
-    rto_risk = order.get('rto_risk') or (existing['rto_risk'] if existing else 'LOW')
-
-    # Postgres UPSERT
-    query = '''
-        INSERT INTO orders (id, customer_name, email, phone, address, source, products, total, status, timestamp, notes, delivery_type, state, payment_method, rto_risk)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (id) DO UPDATE SET
-            customer_name = EXCLUDED.customer_name,
-            email = EXCLUDED.email,
-            phone = EXCLUDED.phone,
-            address = EXCLUDED.address,
-            source = EXCLUDED.source,
-            products = EXCLUDED.products,
-            total = EXCLUDED.total,
-            status = EXCLUDED.status,
-            timestamp = EXCLUDED.timestamp,
-            notes = %s,
-            delivery_type = %s,
-            state = %s,
-            payment_method = %s,
-            rto_risk = %s
-    '''
-    c.execute(query, (
-        order['id'], order['customer_name'], email, order['phone'], order.get('address', ''), order['source'], 
-        order['products'], order['total'], order['status'], order['timestamp'], notes, delivery_type, state, payment_method, rto_risk,
-        notes, delivery_type, state, payment_method, rto_risk
-    ))
-    conn.commit()
-    conn.close()
-    
-    # Auto-create/update customer profile
-    create_or_update_customer(order)
+def order_products(value):
+    """Products as a list. Lists pass through; JSON text (orders queued before products became
+    JSONB, seed data) is decoded; text that isn't JSON becomes a single item."""
+    if isinstance(value, list):
+        return value
+    if not value:
+        return []
+    try:
+        products = orjson.loads(value)
+    except orjson.JSONDecodeError:
+        return [str(value)]
+    return products if isinstance(products, list) else [products]
 
-def get_orders(status_filter='Pending', start_date=None, end_date=None, search_query=None, payment_filter=None, delivery_filter=None, state_filter=None, page=1, per_page=50):
-    conn = get_db_connection()
+def products_json(value):
+    """JSON text of order_products(value), for a %s::jsonb parameter"""
+    return orjson.dumps(order_products(value)).decode()
+
+ORDER_COLUMNS = ('id', 'customer_name', 'email', 'phone', 'address', 'source', 'products', 'total',
+                 'status', 'timestamp', 'notes', 'delivery_type', 'state', 'payment_method', 'rto_risk',
+                 'created_at', 'amount')
+
+# One statement for N orders. The ON CONFLICT branch applies the preservation rules
+# itself instead of a prior SELECT:
+#   notes, delivery_type           -> keep the stored value if it is non-empty
+#   state, email                   -> take the incoming value unless it is empty
+#   payment_method, rto_risk       -> same, but their insert defaults hide an empty incoming
+#                                     value, so those ids are passed in {keep_payment}/{keep_rto}
+UPSERT_ORDERS_SQL = '''
+    WITH old AS (
+        SELECT id, {stat_columns} FROM orders WHERE id = ANY({ids})
+    ),
+    upserted AS (
+    INSERT INTO orders (id, customer_name, email, phone, address, source, products, total, status, timestamp,
+                        notes, delivery_type, state, payment_method, rto_risk, created_at, amount)
+    VALUES %s
+    ON CONFLICT (id) DO UPDATE SET
+        customer_name = EXCLUDED.customer_name,
+        email = COALESCE(NULLIF(EXCLUDED.email, ''), orders.email),
+        phone = EXCLUDED.phone,
+        address = EXCLUDED.address,
+        source = EXCLUDED.source,
+        products = EXCLUDED.products,
+        total = EXCLUDED.total,
+        amount = EXCLUDED.amount,
+        status = EXCLUDED.status,
+        timestamp = EXCLUDED.timestamp,
+        created_at = EXCLUDED.created_at,
+        notes = COALESCE(NULLIF(orders.notes, ''), EXCLUDED.notes),
+        delivery_type = COALESCE(NULLIF(orders.delivery_type, ''), EXCLUDED.delivery_type),
+        state = COALESCE(NULLIF(EXCLUDED.state, ''), orders.state),
+        payment_method = CASE WHEN EXCLUDED.id = ANY({keep_payment}) THEN orders.payment_method
+                              ELSE EXCLUDED.payment_method END,
+        rto_risk = CASE WHEN EXCLUDED.id = ANY({keep_rto}) THEN orders.rto_risk ELSE EXCLUDED.rto_risk END
+    RETURNING id, {stat_columns}
+    )
+    -- Sub-statements share one snapshot, so `old` holds the rows as they were before the upsert
+    SELECT row_to_json(old) AS old, row_to_json(upserted) AS new
+    FROM upserted LEFT JOIN old USING (id)
+'''
+UPSERT_ORDERS_TEMPLATE = '''(%s, %s, COALESCE(%s, ''), %s, COALESCE(%s, ''), %s, %s::jsonb, %s, %s, %s,
+    COALESCE(%s, ''), COALESCE(%s, 'Standard'), COALESCE(%s, ''),
+    COALESCE(NULLIF(%s, ''), 'Prepaid'), COALESCE(NULLIF(%s, ''), 'LOW'), %s::timestamptz, %s::numeric)'''
+
+def order_created_at(order):
+    """created_at for an order: the normalizer's value, else its IST `timestamp` text"""
+    if order.get('created_at'):
+        return order['created_at']
+    try:
+        return IST.localize(datetime.strptime(order.get('timestamp') or '', "%Y-%m-%d %H:%M:%S"))
+    except ValueError:
+        return datetime.now(IST)
+
+def order_row(order):
+    """Values for UPSERT_ORDERS_TEMPLATE, in ORDER_COLUMNS order"""
+    values = dict(order, products=products_json(order.get('products')), created_at=order_created_at(order),
+                  amount=order.get('amount') or parse_amount(order.get('total')))
+    return tuple(values.get(col) for col in ORDER_COLUMNS)
+
+def merge_order_update(existing, order):
+    """Apply save_orders' preservation rules to two versions of the same order (existing first)"""
+    merged = dict(order)
+    merged['notes'] = existing.get('notes') or order.get('notes', '')
+    merged['delivery_type'] = existing.get('delivery_type') or order.get('delivery_type', 'Standard')
+    for field in ('state', 'payment_method', 'email', 'rto_risk'):
+        merged[field] = order.get(field) or existing.get(field)
+    return merged
+
+def upsert_orders(conn, orders):
+    """Upsert normalized orders in a single round trip. Does not commit.
+
+    Returns [(old_row, new_row)] with the customer stat fields of each order
+    before (None for new orders) and after the upsert.
+    """
+    # ON CONFLICT can't touch the same row twice in one statement; fold duplicates first
+    by_id = {}
+    for order in orders:
+        if order['id'] in by_id:
+            order = merge_order_update(by_id[order['id']], order)
+        by_id[order['id']] = order
+    if not by_id:
+        return []
+    rows = [order_row(order) for order in by_id.values()]
+    keep_payment = [order_id for order_id, order in by_id.items() if not order.get('payment_method')]
+    keep_rto = [order_id for order_id, order in by_id.items() if not order.get('rto_risk')]
+    c = conn.cursor()
+    # Lock the existing rows first, in id order like /update_status and /bulk_update_status, so a status
+    # change can't commit between the `old` read and the upsert and leave the deltas one transition behind
+    c.execute('SELECT id FROM orders WHERE id = ANY(%s) ORDER BY id FOR UPDATE', (list(by_id),))
+    # Inline the id arrays; '%' is escaped because execute_values formats the query again
+    def id_array(ids):
+        return c.mogrify('%s::text[]', (ids,)).decode().replace('%', '%%')
+    query = UPSERT_ORDERS_SQL.format(
+        stat_columns=ORDER_DELTA_COLUMNS,
+        ids=id_array(list(by_id)),
+        keep_payment=id_array(keep_payment),
+        keep_rto=id_array(keep_rto),
+    )
+    results = execute_values(c, query, rows, template=UPSERT_ORDERS_TEMPLATE, page_size=len(rows), fetch=True)
+    return [(row['old'], row['new']) for row in results]
+
+def apply_order_deltas(conn, changes):
+    """Apply (old_row, new_row) order changes to every maintained aggregate. Does not commit.
+
+    Returns the new data version, or None when there were no changes.
+    """
+    apply_customer_deltas(conn, changes)
+    apply_status_count_deltas(conn, changes)
+    apply_daily_stat_deltas(conn, changes)
+    if changes:
+        version = bump_data_version(conn)
+        publish_order_events(conn, order_change_events(changes))
+        return version
+    return None
+
+def bump_data_version(conn):
+    """Advance the orders data version, which keys cached export artifacts and view results. Does not commit.
+
+    Every transaction that changes orders calls this, so the new version
+    becomes visible together with the data it describes. The NOTIFY is
+    delivered to every process's DataVersionListener when the transaction
+    commits (and not at all if it rolls back). Returns the new version, which
+    the writer hands to data_version_listener.committed() after its commit.
+    """
+    c = conn.cursor()
+    c.execute(f'''
+        WITH bumped AS (UPDATE data_version SET version = version + 1 WHERE name = 'orders' RETURNING version)
+        SELECT version, pg_notify('{DATA_VERSION_CHANNEL}', version::text) FROM bumped
+    ''')
+    row = c.fetchone()
+    return row['version'] if row else None
+
+def get_data_version(conn=None):
+    """The current orders data version"""
+    if conn is None:
+        with get_db_connection() as conn:
+            return get_data_version(conn)
+    c = conn.cursor()
+    c.execute("SELECT version FROM data_version WHERE name = 'orders'")
+    row = c.fetchone()
+    return row['version'] if row else 0
+
+# --- Live Order Feed ---
+# Write paths publish compact order events ('created', 'status_changed',
+# 'deleted', 'packed' with the order id and status) as NOTIFYs on
+# ORDER_EVENTS_CHANNEL in the same transaction as the change, so they go out
+# only if it commits. whatsapp_server.js LISTENs and relays them to the
+# dashboard and viewer over its socket.io connection, which patch their lists
+# in place instead of reloading. (The Flask worker is a single sync process,
+# so it can't hold long-lived push connections itself.)
+
+ORDER_EVENTS_CHANNEL = 'order_events'
+ORDER_EVENT_PAYLOAD_BYTES = 7000   # NOTIFY payloads must stay under 8000 bytes
+
+def order_change_events(changes):
+    """Feed events for (old_row, new_row) order changes; edits that keep the status send none"""
+    events = []
+    for old, new in changes:
+        if old is None:
+            events.append({'type': 'created', 'id': new['id'], 'status': new['status']})
+        elif new is None:
+            events.append({'type': 'deleted', 'id': old['id'], 'status': old['status']})
+        elif old['status'] != new['status']:
+            events.append({'type': 'status_changed', 'id': old['id'], 'status': new['status'],
+                           'old_status': old['status']})
+    return events
+
+def publish_order_events(conn, events):
+    """NOTIFY `events` as JSON arrays on ORDER_EVENTS_CHANNEL, batched to fit a payload. Does not commit."""
+    c = conn.cursor()
+    def notify(batch):
+        c.execute('SELECT pg_notify(%s, %s)', (ORDER_EVENTS_CHANNEL, (b'[' + b','.join(batch) + b']').decode()))
+    batch, size = [], 2
+    for event in events:
+        encoded = orjson.dumps(event)
+        if batch and size + len(encoded) + 1 > ORDER_EVENT_PAYLOAD_BYTES:
+            notify(batch)
+            batch, size = [], 2
+        batch.append(encoded)
+        size += len(encoded) + 1
+    if batch:
+        notify(batch)
+
+def save_orders(orders):
+    """Upsert a batch of normalized orders and update their customers' profiles"""
+    orders = [order for order in orders if order]
+    if not orders:
+        return
+    with get_db_connection() as conn:
+        changes = upsert_orders(conn, orders)
+        upsert_customers(conn, orders)
+        version = apply_order_deltas(conn, changes)
+        conn.commit()
+    data_version_listener.committed(version)
+
+def save_order(order):
+    save_orders([order])
+
+def ist_day_range(start_date=None, end_date=None):
+    """Turn 'YYYY-MM-DD' filter values into a [start, end) created_at range in IST.
+
+    Either bound may be None; unparseable dates are ignored like missing ones.
+    """
+    def day_start(value):
+        try:
+            return IST.localize(datetime.strptime(value, "%Y-%m-%d"))
+        except (TypeError, ValueError):
+            return None
+    start = day_start(start_date)
+    end = day_start(end_date)
+    return start, (end + timedelta(days=1) if end else None)
+
+def created_at_conditions(start_date, end_date, column='created_at'):
+    """Sargable created_at range predicates and their params for a date filter"""
+    start, end = ist_day_range(start_date, end_date)
+    conditions, params = [], []
+    if start:
+        conditions.append(f'{column} >= %s')
+        params.append(start)
+    if end:
+        conditions.append(f'{column} < %s')
+        params.append(end)
+    return conditions, params
+
+def encode_order_cursor(order):
+    """Keyset cursor for an order row: '<order_seq>:<id>'"""
+    return f"{order['order_seq']}:{order['id']}"
+
+def decode_order_cursor(cursor):
+    seq, _, order_id = (cursor or '').partition(':')
+    if not seq.isdigit() or not order_id:
+        return None
+    return int(seq), order_id
+
+def order_page_cursors(orders):
+    """(prev_cursor, next_cursor) for a page of orders sorted newest first"""
+    if not orders:
+        return None, None
+    return encode_order_cursor(orders[0]), encode_order_cursor(orders[-1])
+
+# --- View Result Cache ---
+# The status views (dashboard, call again, confirmed, cancelled) cache what
+# get_orders() returns per process, keyed by (status, filters, page) and tagged
+# with the orders data version it was read at. bump_data_version() sends a
+# NOTIFY with the new version in the same transaction as every write, and each
+# process LISTENs on its own connection, so once a write commits the entries
+# read before it stop matching in every gunicorn worker (whatsapp_server.js
+# bumps it the same way after its own updates). The writing process also
+# takes up its new version as soon as it commits (DataVersionListener.committed),
+# so the page it redirects to can't be served from before the write while the
+# NOTIFY is still on its way. Entries also expire after
+# VIEW_CACHE_TTL, which bounds staleness from any other writer, and the least
+# recently used are evicted past VIEW_CACHE_MAX_ENTRIES. While the listener is
+# not connected the cache is bypassed.
+
+VIEW_CACHE_TTL = int(os.getenv("VIEW_CACHE_TTL", "60"))
+VIEW_CACHE_MAX_ENTRIES = int(os.getenv("VIEW_CACHE_MAX_ENTRIES", "500"))
+DATA_VERSION_CHANNEL = 'data_version'
+
+class VersionedCache:
+    """Thread-safe LRU cache whose entries hold while the data version they were computed at is current"""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, version, compute):
+        if version is None:
+            return compute()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == version and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._entries[key] = (version, now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate_before(self, version):
+        """Drop entries computed at a version older than `version`"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[0] < version]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self._entries), 'max_entries': self.max_entries, 'ttl': self.ttl,
+                    'hits': self.hits, 'misses': self.misses,
+                    'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+                    'invalidations': self.invalidations, 'evictions': self.evictions}
+
+class DataVersionListener:
+    """Background thread that follows the orders data version through LISTEN/NOTIFY.
+
+    `version` is None until the listener is connected (and again after it
+    loses its connection), which tells callers not to trust cached results.
+    """
+
+    def __init__(self, channel, on_advance):
+        self.channel = channel
+        self.on_advance = on_advance
+        self.version = None
+        self.notifications = 0
+        self.reconnects = 0
+        self.last_error = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        """The latest data version seen by this process, or None when not listening"""
+        self.ensure_started()
+        return self.version
+
+    def ensure_started(self):
+        # Threads don't survive gunicorn's fork, so (re)start per process
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.version = None
+            self._thread = threading.Thread(target=self._run, name='data-version-listener', daemon=True)
+            self._thread.start()
+
+    def _advance(self, version):
+        with self._lock:
+            if self.version is not None and version <= self.version:
+                return
+            self.version = version
+        self.on_advance(version)
+
+    def committed(self, version):
+        """Take up a version this process has just committed, ahead of its NOTIFY.
+
+        Call only after the commit: a version from a rolled-back transaction is
+        handed out again by the next write. Ignored while not listening, since
+        the cache is bypassed then anyway.
+        """
+        if version is None:
+            return
+        with self._lock:
+            if self.version is None or self._pid != os.getpid() or version <= self.version:
+                return
+            self.version = version
+        self.on_advance(version)
+
+    def _run(self):
+        failures = 0
+        while True:
+            conn = None
+            try:
+                conn = open_db_connection()
+                conn.autocommit = True
+                c = conn.cursor()
+                c.execute(f'LISTEN {self.channel}')
+                # Read the version only once listening, so no bump can fall in between
+                self._advance(get_data_version(conn))
+                failures = 0
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        c.execute('SELECT 1')   # keep idle connections from being dropped unnoticed
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self.notifications += 1
+                        self._advance(int(notify.payload))
+            except Exception as e:
+                self.version = None
+                self.last_error = str(e)
+                failures += 1
+                self.reconnects += 1
+                log.warning("Data version listener disconnected", extra={'error': str(e)})
+                time.sleep(random.uniform(0, min(DB_BACKOFF_MAX * 6, DB_BACKOFF_BASE * (2 ** failures))))
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def stats(self):
+        return {'listening': self.version is not None and self._pid == os.getpid(), 'version': self.version,
+                'notifications': self.notifications, 'reconnects': self.reconnects, 'last_error': self.last_error}
+
+view_cache = VersionedCache(VIEW_CACHE_TTL, VIEW_CACHE_MAX_ENTRIES)
+data_version_listener = DataVersionListener(DATA_VERSION_CHANNEL, view_cache.invalidate_before)
+
+# List views read only what dashboard.html and viewer.html render. Notes grow
+# with every WhatsApp message appended to them, so lists get the first
+# ORDER_NOTES_PREVIEW characters and a flag; the full row comes from
+# /api/order/<id> when one is opened.
+ORDER_NOTES_PREVIEW = int(os.getenv("ORDER_NOTES_PREVIEW", "200"))
+ORDER_LIST_COLUMNS = ('id, order_seq, customer_name, email, phone, address, source, products, total, status, timestamp, '
+                      'delivery_type, state, payment_method, rto_risk, '
+                      f'left(notes, {ORDER_NOTES_PREVIEW}) AS notes, length(notes) > {ORDER_NOTES_PREVIEW} AS notes_truncated')
+CUSTOMER_ORDER_COLUMNS = ('id, source, products, total, amount, status, timestamp, created_at, delivery_type, '
+                          f'payment_method, state, is_packed, left(notes, {ORDER_NOTES_PREVIEW}) AS notes, '
+                          f'length(notes) > {ORDER_NOTES_PREVIEW} AS notes_truncated')
+
+def get_orders(status_filter='Pending', start_date=None, end_date=None, search_query=None, payment_filter=None, delivery_filter=None, state_filter=None, page=1, per_page=50, after=None, before=None):
+    """query_orders(), served from view_cache while no order has changed since it was read"""
+    args = (status_filter, start_date, end_date, search_query, payment_filter, delivery_filter, state_filter,
+            page, per_page, after, before)
+    return view_cache.get_or_compute(args, data_version_listener.current(), lambda: query_orders(*args))
+
+def query_orders(status_filter='Pending', start_date=None, end_date=None, search_query=None, payment_filter=None, delivery_filter=None, state_filter=None, page=1, per_page=50, after=None, before=None):
+    """One page of orders, newest first, plus the total count.
+
+    Pages are addressed either by number (OFFSET) or, for next/prev navigation,
+    by a keyset cursor from order_page_cursors(): `after` returns the page
+    following that order, `before` the page preceding it. Cursor pages read
+    only `per_page` rows from the (status, order_seq, id) index however deep
+    they are. The count comes from count_orders(): maintained totals for an
+    unfiltered status, a briefly cached COUNT otherwise.
+    """
+    with get_db_connection() as conn:
     
-    # Base conditions
-    conditions = ['status = %s']
-    params = [status_filter]
-
-    if start_date:
-        conditions.append('timestamp >= %s')
-        params.append(start_date + " 00:00:00")
-    if end_date:
-        conditions.append('timestamp <= %s')
-        params.append(end_date + " 23:59:59")
+        # Base conditions
+        conditions = ['status = %s']
+        params = [status_filter]
+
+        date_conditions, date_params = created_at_conditions(start_date, end_date)
+        conditions += date_conditions
+        params += date_params
     
-    if search_query:
-        if search_query.isdigit() and len(search_query) <= 5:
-            conditions.append('id ILIKE %s')
-            params.append(f"%{search_query}%")
-        else:
-            conditions.append('(customer_name ILIKE %s OR phone ILIKE %s OR email ILIKE %s OR address ILIKE %s)')
-            wildcard = f"%{search_query}%"
-            params.extend([wildcard, wildcard, wildcard, wildcard])
+        if search_query:
+            if search_query.isdigit() and len(search_query) <= 5:
+                conditions.append('id ILIKE %s')
+                params.append(f"%{search_query}%")
+            else:
+                conditions.append(f'{ORDER_SEARCH_SQL} ILIKE %s')
+                params.append(search_pattern(search_query))
     
-    if payment_filter:
-        conditions.append('payment_method = %s')
-        params.append(payment_filter)
+        if payment_filter:
+            conditions.append('payment_method = %s')
+            params.append(payment_filter)
     
-    if delivery_filter:
-        conditions.append('delivery_type = %s')
-        params.append(delivery_filter)
+        if delivery_filter:
+            conditions.append('delivery_type = %s')
+            params.append(delivery_filter)
     
-    if state_filter:
-        conditions.append('state = %s')
-        params.append(state_filter)
+        if state_filter:
+            conditions.append('state = %s')
+            params.append(state_filter)
     
-    where_clause = ' AND '.join(conditions)
+        where_clause = ' AND '.join(conditions)
     
-    # Get total count
-    count_query = f'SELECT COUNT(*) FROM orders WHERE {where_clause}'
-    c = conn.cursor()
-    c.execute(count_query, params)
-    total_count = c.fetchone()['count']
+        # Get total count
+        c = conn.cursor()
+        total_count = count_orders(conn, status_filter, where_clause, params, filtered=len(conditions) > 1)
     
-    # Get paginated data
-    offset = (page - 1) * per_page
-    query = f'SELECT * FROM orders WHERE {where_clause} ORDER BY length(id) DESC, id DESC LIMIT %s OFFSET %s'
-    c.execute(query, params + [per_page, offset])
-    orders = c.fetchall()
+        # Get paginated data
+        after_key = decode_order_cursor(after)
+        before_key = decode_order_cursor(before)
+        if after_key:
+            query = f'SELECT {ORDER_LIST_COLUMNS} FROM orders WHERE {where_clause} AND (order_seq, id) < (%s, %s) ORDER BY order_seq DESC, id DESC LIMIT %s'
+            c.execute(query, params + [after_key[0], after_key[1], per_page])
+            orders = c.fetchall()
+        elif before_key:
+            query = f'SELECT {ORDER_LIST_COLUMNS} FROM orders WHERE {where_clause} AND (order_seq, id) > (%s, %s) ORDER BY order_seq ASC, id ASC LIMIT %s'
+            c.execute(query, params + [before_key[0], before_key[1], per_page])
+            orders = c.fetchall()[::-1]
+        else:
+            offset = (page - 1) * per_page
+            query = f'SELECT {ORDER_LIST_COLUMNS} FROM orders WHERE {where_clause} ORDER BY order_seq DESC, id DESC LIMIT %s OFFSET %s'
+            c.execute(query, params + [per_page, offset])
+            orders = c.fetchall()
     
-    orders_list = []
-    for row in orders:
-        order = dict(row)
-        try:
-            order['products'] = json.loads(order['products'])
-        except:
-            order['products'] = []
+        orders_list = []
+        for row in orders:
+            order = dict(row)
         
-        # Set default customer values
-        order['is_repeat_customer'] = False
-        order['customer_total_orders'] = 0
-        order['customer_total_spent'] = 0
-        order['customer_tags'] = '[]'
+            # Set default customer values
+            order['is_repeat_customer'] = False
+            order['customer_total_orders'] = 0
+            order['customer_total_spent'] = 0
+            order['customer_tags'] = '[]'
             
-        orders_list.append(order)
+            orders_list.append(order)
     
-    # Batch fetch customer data for all orders with phones
-    if orders_list:
-        phones = [o['phone'] for o in orders_list if o.get('phone')]
-        if phones:
-            try:
-                # Use a single query to get all customer data
-                placeholders = ','.join(['%s'] * len(phones))
-                c.execute(f'''
-                    SELECT phone, total_orders, total_spent, tags
-                    FROM customers
-                    WHERE phone IN ({placeholders})
-                ''', phones)
-                customers_dict = {row['phone']: row for row in c.fetchall()}
+        # Batch fetch customer data for all orders with phones
+        if orders_list:
+            phones = [o['phone'] for o in orders_list if o.get('phone')]
+            if phones:
+                try:
+                    # Use a single query to get all customer data
+                    placeholders = ','.join(['%s'] * len(phones))
+                    c.execute(f'''
+                        SELECT phone, total_orders, total_spent, tags
+                        FROM customers
+                        WHERE phone IN ({placeholders})
+                    ''', phones)
+                    customers_dict = {row['phone']: row for row in c.fetchall()}
                 
-                # Enrich orders with customer data
-                for order in orders_list:
-                    if order.get('phone') and order['phone'] in customers_dict:
-                        customer = customers_dict[order['phone']]
-                        order['customer_total_orders'] = customer['total_orders']
-                        order['customer_total_spent'] = customer['total_spent']
-                        order['is_repeat_customer'] = customer['total_orders'] > 1
-                        order['customer_tags'] = customer.get('tags', '[]')
-            except Exception as e:
-                # If customers table doesn't exist yet, just skip customer enrichment
-                print(f"Customer enrichment skipped: {e}")
+                    # Enrich orders with customer data
+                    for order in orders_list:
+                        if order.get('phone') and order['phone'] in customers_dict:
+                            customer = customers_dict[order['phone']]
+                            order['customer_total_orders'] = customer['total_orders']
+                            order['customer_total_spent'] = customer['total_spent']
+                            order['is_repeat_customer'] = customer['total_orders'] > 1
+                            order['customer_tags'] = customer.get('tags', '[]')
+                except Exception as e:
+                    # If customers table doesn't exist yet, just skip customer enrichment
+                    log.warning("Customer enrichment skipped", extra={'error': str(e)})
     
-    conn.close()
     return orders_list, total_count
 
-def get_daily_summary():
-    conn = get_db_connection()
-    # Postgres substring syntax: substring(string from start for length)
-    # timestamp is TEXT in our schema, so substring works.
-    query = '''
-        SELECT substring(timestamp, 1, 10) as day, 
-               COUNT(*) as total,
-               SUM(CASE WHEN status = 'Pending' THEN 1 ELSE 0 END) as pending,
-               SUM(CASE WHEN status = 'Confirmed' THEN 1 ELSE 0 END) as confirmed,
-               SUM(CASE WHEN status = 'Cancelled' THEN 1 ELSE 0 END) as cancelled,
-               SUM(CASE WHEN status = 'Call Again' THEN 1 ELSE 0 END) as call_again
-        FROM orders
-        GROUP BY day
-        ORDER BY day DESC
-    '''
-    c = conn.cursor()
-    c.execute(query)
-    rows = c.fetchall()
-    conn.close()
-    return rows
-
 # --- Routes (Protected) ---
 
 @app.route('/')
@@ -630,16 +2165,21 @@ def dashboard():
     delivery = request.args.get('delivery')
     state = request.args.get('state')
     page = request.args.get('page', 1, type=int)
+    after = request.args.get('after')
+    before = request.args.get('before')
     per_page = 50
     try:
-        orders, total_count = get_orders('Pending', start_date, end_date, search, payment, delivery, state, page, per_page)
+        orders, total_count = get_orders('Pending', start_date, end_date, search, payment, delivery, state, page, per_page, after, before)
     except Exception as e:
         return f"Database Error: {e}. Did you set DATABASE_URL in .env?", 500
     
     total_pages = (total_count + per_page - 1) // per_page
+    prev_cursor, next_cursor = order_page_cursors(orders)
     return render_template('dashboard.html', orders=orders, view='Pending', 
                          start_date=start_date, end_date=end_date, search=search,
-                         page=page, total_pages=total_pages, total_orders=total_count)
+                         page=page, total_pages=total_pages, total_orders=total_count,
+                         prev_cursor=prev_cursor, next_cursor=next_cursor,
+                         facets=get_facet_counts('Pending'), status_counts=get_status_counts())
 
 @app.route('/call-again')
 @basic_auth.required
@@ -651,41 +2191,144 @@ def call_again_page():
     delivery = request.args.get('delivery')
     state = request.args.get('state')
     page = request.args.get('page', 1, type=int)
+    after = request.args.get('after')
+    before = request.args.get('before')
     per_page = 50
-    orders, total_count = get_orders('Call Again', start_date, end_date, search, payment, delivery, state, page, per_page)
+    orders, total_count = get_orders('Call Again', start_date, end_date, search, payment, delivery, state, page, per_page, after, before)
     total_pages = (total_count + per_page - 1) // per_page
+    prev_cursor, next_cursor = order_page_cursors(orders)
     return render_template('dashboard.html', orders=orders, view='Call Again', 
                          start_date=start_date, end_date=end_date, search=search,
-                         page=page, total_pages=total_pages, total_orders=total_count)
+                         page=page, total_pages=total_pages, total_orders=total_count,
+                         prev_cursor=prev_cursor, next_cursor=next_cursor,
+                         facets=get_facet_counts('Call Again'), status_counts=get_status_counts())
 
 @app.route('/reports')
 @basic_auth.required
 def reports_page():
-    summary = get_daily_summary()
-    return render_template('dashboard.html', orders=[], view='Reports', summary=summary)
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    granularity = request.args.get('granularity', 'day')
+    summary = get_report(start_date, end_date, granularity)
+    return render_template('dashboard.html', orders=[], view='Reports', summary=summary,
+                           start_date=start_date, end_date=end_date, granularity=granularity)
 
 @app.route('/update_status', methods=['POST'])
 @basic_auth.required
 def update_status():
     order_id = request.form['order_id']
     new_status = request.form['status']
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    # Get order phone before update
-    c.execute('SELECT phone FROM orders WHERE id = %s', (order_id,))
-    order = c.fetchone()
-    
-    c.execute('UPDATE orders SET status = %s WHERE id = %s', (new_status, order_id))
-    conn.commit()
-    conn.close()
-    
-    # Update customer stats
-    if order and order['phone']:
-        update_customer_stats(order['phone'])
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        
+        # Update and read back the previous status in one statement
+        c.execute(f'''
+            UPDATE orders o SET status = %s
+            FROM (SELECT id, {ORDER_DELTA_COLUMNS} FROM orders WHERE id = %s FOR UPDATE) old
+            WHERE o.id = old.id
+            RETURNING row_to_json(old) AS old
+        ''', (new_status, order_id))
+        row = c.fetchone()
+        
+        # Move the customer's counters by the status transition
+        version = None
+        if row:
+            version = apply_order_deltas(conn, [(row['old'], dict(row['old'], status=new_status))])
+        conn.commit()
+    # The redirect's GET must not be served from a cache entry read before this write
+    data_version_listener.committed(version)
     
+    # The dashboard posts with fetch() and removes the card itself
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'success': bool(row), 'status': new_status})
     return redirect(request.referrer or '/')
 
+ORDER_STATUSES = ('Pending', 'Call Again', 'Confirmed', 'Cancelled')
+
+@app.route('/bulk_update_status', methods=['POST'])
+@basic_auth.required
+def bulk_update_status():
+    """Move many orders to one status in a single statement.
+
+    Takes JSON {"order_ids": [...], "status": "..."} and returns a result per
+    requested id: its previous status, or that it wasn't found. The affected
+    customers, status counts and daily rollup are moved in one set-based pass.
+    """
+    data = request.get_json(silent=True) or {}
+    order_ids = [str(order_id) for order_id in data.get('order_ids') or []]
+    new_status = data.get('status')
+    if new_status not in ORDER_STATUSES:
+        return jsonify({'success': False, 'error': f'Unknown status: {new_status}'}), 400
+    if not order_ids:
+        return jsonify({'success': False, 'error': 'No orders selected'}), 400
+
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        # ORDER BY in the locking subquery takes row locks in a fixed order, so concurrent batches can't deadlock
+        c.execute(f'''
+            UPDATE orders o SET status = %s
+            FROM (SELECT id, {ORDER_DELTA_COLUMNS} FROM orders WHERE id = ANY(%s) ORDER BY id FOR UPDATE) old
+            WHERE o.id = old.id
+            RETURNING row_to_json(old) AS old
+        ''', (new_status, order_ids))
+        previous = {row['old']['id']: row['old'] for row in c.fetchall()}
+        version = apply_order_deltas(conn, [(old, dict(old, status=new_status)) for old in previous.values()])
+        conn.commit()
+    data_version_listener.committed(version)
+
+    results = []
+    for order_id in dict.fromkeys(order_ids):
+        if order_id in previous:
+            results.append({'id': order_id, 'updated': True, 'old_status': previous[order_id]['status']})
+        else:
+            results.append({'id': order_id, 'updated': False, 'error': 'Order not found'})
+    return jsonify({'success': True, 'status': new_status, 'updated': len(previous), 'results': results})
+
+@app.route('/api/whatsapp/status_reply', methods=['POST'])
+@basic_auth.required
+def whatsapp_status_reply():
+    """Apply a customer's CONFIRM/REJECT WhatsApp reply to their latest order.
+
+    Called by whatsapp_server.js with JSON {"phone": "...", "status": "..."}, so
+    the change moves the customer, status counts and daily rollup like any
+    other status write. Returns the order id and its previous status, or 404
+    if the phone has no orders.
+    """
+    data = request.get_json(silent=True) or {}
+    # Same key as PHONE_KEY_SQL, so any formatting of the number finds the order
+    phone = re.sub(r'[^0-9]', '', str(data.get('phone') or ''))[-10:]
+    new_status = data.get('status')
+    if new_status not in ORDER_STATUSES:
+        return jsonify({'success': False, 'error': f'Unknown status: {new_status}'}), 400
+    if not phone:
+        return jsonify({'success': False, 'error': 'No phone given'}), 400
+
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f'''
+            UPDATE orders o SET status = %s
+            FROM (
+                SELECT id, {ORDER_DELTA_COLUMNS} FROM orders
+                WHERE {PHONE_KEY_SQL} = %s
+                ORDER BY order_seq DESC, id DESC
+                LIMIT 1
+                FOR UPDATE
+            ) old
+            WHERE o.id = old.id
+            RETURNING row_to_json(old) AS old
+        ''', (new_status, phone))
+        row = c.fetchone()
+        version = None
+        if row:
+            version = apply_order_deltas(conn, [(row['old'], dict(row['old'], status=new_status))])
+        conn.commit()
+    data_version_listener.committed(version)
+
+    if not row:
+        return jsonify({'success': False, 'error': 'No order for this phone'}), 404
+    return jsonify({'success': True, 'id': row['old']['id'], 'status': new_status,
+                    'old_status': row['old']['status']})
+
 @app.route('/bulk_delete', methods=['POST'])
 @basic_auth.required
 def bulk_delete():
@@ -697,21 +2340,23 @@ def bulk_delete():
         if not order_ids:
             return jsonify({'success': False, 'error': 'No orders selected'}), 400
         
-        conn = get_db_connection()
-        c = conn.cursor()
+        with get_db_connection() as conn:
+            c = conn.cursor()
         
-        # Delete orders with matching IDs
-        placeholders = ','.join(['%s'] * len(order_ids))
-        query = f'DELETE FROM orders WHERE id IN ({placeholders})'
-        c.execute(query, order_ids)
+            # Delete orders with matching IDs
+            c.execute(f'DELETE FROM orders WHERE id = ANY(%s) RETURNING id, {ORDER_DELTA_COLUMNS}', (order_ids,))
+            deleted = c.fetchall()
+            version = apply_order_deltas(conn, [(row, None) for row in deleted])
         
-        conn.commit()
-        deleted_count = c.rowcount
-        conn.close()
+            conn.commit()
+            deleted_count = len(deleted)
+        data_version_listener.committed(version)
+        # A redelivery of a deleted order must bring it back, not be taken for a duplicate
+        webhook_dedup.forget([row['id'] for row in deleted])
         
         return jsonify({'success': True, 'deleted': deleted_count})
     except Exception as e:
-        print(f"Error in bulk_delete: {e}")
+        log.exception("Error in bulk_delete")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/clear_all', methods=['POST'])
@@ -721,19 +2366,22 @@ def clear_all():
     try:
         view = request.args.get('view', 'Confirmed')
         
-        conn = get_db_connection()
-        c = conn.cursor()
+        with get_db_connection() as conn:
+            c = conn.cursor()
         
-        # Delete all orders with the specified status
-        c.execute('DELETE FROM orders WHERE status = %s', (view,))
+            # Delete all orders with the specified status
+            c.execute(f'DELETE FROM orders WHERE status = %s RETURNING id, {ORDER_DELTA_COLUMNS}', (view,))
+            deleted = c.fetchall()
+            version = apply_order_deltas(conn, [(row, None) for row in deleted])
         
-        conn.commit()
-        deleted_count = c.rowcount
-        conn.close()
+            conn.commit()
+            deleted_count = len(deleted)
+        data_version_listener.committed(version)
+        webhook_dedup.forget([row['id'] for row in deleted])
         
         return jsonify({'success': True, 'deleted': deleted_count})
     except Exception as e:
-        print(f"Error in clear_all: {e}")
+        log.exception("Error in clear_all")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/confirmed')
@@ -746,12 +2394,17 @@ def confirmed_page():
     delivery = request.args.get('delivery')
     state = request.args.get('state')
     page = request.args.get('page', 1, type=int)
+    after = request.args.get('after')
+    before = request.args.get('before')
     per_page = 50
-    orders, total_count = get_orders('Confirmed', start_date, end_date, search, payment, delivery, state, page, per_page)
+    orders, total_count = get_orders('Confirmed', start_date, end_date, search, payment, delivery, state, page, per_page, after, before)
     total_pages = (total_count + per_page - 1) // per_page
+    prev_cursor, next_cursor = order_page_cursors(orders)
     return render_template('dashboard.html', orders=orders, view='Confirmed', 
                          start_date=start_date, end_date=end_date, search=search,
-                         page=page, total_pages=total_pages, total_orders=total_count)
+                         page=page, total_pages=total_pages, total_orders=total_count,
+                         prev_cursor=prev_cursor, next_cursor=next_cursor,
+                         facets=get_facet_counts('Confirmed'), status_counts=get_status_counts())
 
 @app.route('/cancelled')
 @basic_auth.required
@@ -763,100 +2416,156 @@ def cancelled_page():
     delivery = request.args.get('delivery')
     state = request.args.get('state')
     page = request.args.get('page', 1, type=int)
+    after = request.args.get('after')
+    before = request.args.get('before')
     per_page = 50
-    orders, total_count = get_orders('Cancelled', start_date, end_date, search, payment, delivery, state, page, per_page)
+    orders, total_count = get_orders('Cancelled', start_date, end_date, search, payment, delivery, state, page, per_page, after, before)
     total_pages = (total_count + per_page - 1) // per_page
+    prev_cursor, next_cursor = order_page_cursors(orders)
     return render_template('dashboard.html', orders=orders, view='Cancelled', 
                          start_date=start_date, end_date=end_date, search=search,
-                         page=page, total_pages=total_pages, total_orders=total_count)
+                         page=page, total_pages=total_pages, total_orders=total_count,
+                         prev_cursor=prev_cursor, next_cursor=next_cursor,
+                         facets=get_facet_counts('Cancelled'), status_counts=get_status_counts())
+
+# Packing viewer: /viewer and /viewer/packed render the first VIEWER_PAGE_SIZE
+# orders of their list; viewer.html fetches the rest from /viewer/orders a page
+# at a time as the list is scrolled. Pages are keyset-paged on (order_seq, id)
+# like get_orders(), so the first row costs the same however long the packed
+# history grows.
+
+VIEWER_PAGE_SIZE = int(os.getenv("VIEWER_PAGE_SIZE", "60"))
+VIEWER_LISTS = {
+    'confirmed': "status = 'Confirmed' AND is_packed IS NOT TRUE",
+    'packed': "status = 'Confirmed' AND is_packed = TRUE",
+}
+VIEWER_FILTER_ARGS = ('start_date', 'end_date', 'search', 'payment', 'delivery', 'state')
+
+def viewer_filters(args):
+    """The viewer filters in a request's args, with empty values dropped"""
+    return {name: args[name] for name in VIEWER_FILTER_ARGS if args.get(name)}
+
+def viewer_where(view, filters):
+    """WHERE clause and params for a viewer list ('confirmed' or 'packed') and its filters"""
+    conditions = [VIEWER_LISTS[view]]
+    params = []
+
+    date_conditions, date_params = created_at_conditions(filters.get('start_date'), filters.get('end_date'))
+    conditions += date_conditions
+    params += date_params
+    if filters.get('search'):
+        conditions.append(f'{ORDER_SEARCH_SQL} ILIKE %s')
+        params.append(search_pattern(filters['search']))
+    if filters.get('payment'):
+        conditions.append('payment_method = %s')
+        params.append(filters['payment'])
+    if filters.get('delivery'):
+        conditions.append('delivery_type = %s')
+        params.append(filters['delivery'])
+    if filters.get('state'):
+        conditions.append('state = %s')
+        params.append(filters['state'])
+    return ' AND '.join(conditions), params
+
+def get_viewer_orders(view, filters, after=None, limit=VIEWER_PAGE_SIZE):
+    """One page of a viewer list, newest first, and the cursor of the next page (None on the last)"""
+    where, params = viewer_where(view, filters)
+    after_key = decode_order_cursor(after)
+    if after_key:
+        where += ' AND (order_seq, id) < (%s, %s)'
+        params += [after_key[0], after_key[1]]
+
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        # One extra row tells whether there is a next page
+        c.execute(f'SELECT {ORDER_LIST_COLUMNS} FROM orders WHERE {where} ORDER BY order_seq DESC, id DESC LIMIT %s',
+                  params + [limit + 1])
+        orders = c.fetchall()
+    next_cursor = encode_order_cursor(orders[limit - 1]) if len(orders) > limit else None
+    return orders[:limit], next_cursor
+
+def count_viewer_orders(view, filters):
+    where, params = viewer_where(view, filters)
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f'SELECT COUNT(*) AS n FROM orders WHERE {where}', params)
+        return c.fetchone()['n']
+
+def render_viewer(view):
+    filters = viewer_filters(request.args)
+    orders, next_cursor = get_viewer_orders(view, filters)
+    return render_template('viewer.html', orders=orders, next_cursor=next_cursor, view=view,
+                         to_pack_count=count_viewer_orders('confirmed', filters),
+                         start_date=filters.get('start_date'), end_date=filters.get('end_date'),
+                         search=filters.get('search'), payment=filters.get('payment'),
+                         delivery=filters.get('delivery'), state=filters.get('state'))
 
 @app.route('/viewer')
 def viewer_dashboard():
     """Read-only dashboard for viewing confirmed orders only"""
-    print("=" * 80)
-    print("VIEWER DASHBOARD ACCESS ATTEMPT")
-    print(f"Expected Username: {VIEWER_USERNAME}")
-    print(f"Expected Password: {VIEWER_PASSWORD}")
-    
     auth = request.authorization
-    if auth:
-        print(f"Received Username: {auth.username}")
-        print(f"Password Match: {auth.password == VIEWER_PASSWORD}")
-    else:
-        print("No authorization header received")
-    print("=" * 80)
-    
     if not auth or not check_viewer_auth(auth.username, auth.password):
+        log.info("Viewer login rejected", extra={'username': auth.username if auth else None})
         return Response(
             'Viewer login required', 401,
             {'WWW-Authenticate': 'Basic realm="Viewer Login"'}
         )
     
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    search = request.args.get('search')
-    payment = request.args.get('payment')
-    delivery = request.args.get('delivery')
-    state = request.args.get('state')
-    
-    # Get confirmed orders (not packed)
-    conn = get_db_connection()
-    c = conn.cursor()
-    query = '''
-        SELECT * FROM orders 
-        WHERE status = 'Confirmed' AND (is_packed = FALSE OR is_packed IS NULL)
-    '''
-    params = []
-    
-    if start_date:
-        query += ' AND date(timestamp) >= %s'
-        params.append(start_date)
-    if end_date:
-        query += ' AND date(timestamp) <= %s'
-        params.append(end_date)
-    if search:
-        query += ' AND (customer_name ILIKE %s OR phone ILIKE %s OR email ILIKE %s)'
-        params.extend([f'%{search}%', f'%{search}%', f'%{search}%'])
-    
-    query += ' ORDER BY length(id) DESC, id DESC'
-    c.execute(query, params)
-    orders = c.fetchall()
-    conn.close()
-    
-    orders_list = []
-    for row in orders:
-        order = dict(row)
-        try:
-            order['products'] = json.loads(order['products'])
-        except:
-            order['products'] = []
-        orders_list.append(order)
-    
-    
-    return render_template('viewer.html', orders=orders_list, view='confirmed', 
-                         start_date=start_date, end_date=end_date, search=search,
-                         payment=payment, delivery=delivery, state=state)
+    # Confirmed orders not packed yet
+    return render_viewer('confirmed')
+
+@app.route('/viewer/orders')
+def viewer_orders_api():
+    """A page of a viewer list as JSON: ?view=confirmed|packed&after=<cursor> plus the viewer filters"""
+    auth = request.authorization
+    if not auth or not check_viewer_auth(auth.username, auth.password):
+        return Response('Viewer login required', 401, {'WWW-Authenticate': 'Basic realm="Viewer Login"'})
+    view = request.args.get('view', 'confirmed')
+    if view not in VIEWER_LISTS:
+        return jsonify({'error': f'Unknown view: {view}'}), 400
+    limit = max(1, min(request.args.get('limit', VIEWER_PAGE_SIZE, type=int), 500))
+    orders, next_cursor = get_viewer_orders(view, viewer_filters(request.args), request.args.get('after'), limit)
+    return jsonify({'orders': orders, 'next_cursor': next_cursor})
 
 @app.route('/update_order_details/<order_id>', methods=['POST'])
 @basic_auth.required
 def update_order_details(order_id):
-    new_products_text = request.form.get('products_text')
+    new_products_text = request.form.get('products_text') or ''
     new_address = request.form.get('address')
-    new_phone = request.form.get('phone')
+    new_phone = (request.form.get('phone') or '').strip()
     new_notes = request.form.get('notes')
     new_delivery = request.form.get('delivery_type') or 'Standard'
     
     try:
-        products_list = json.loads(new_products_text)
-    except:
+        products_list = order_products(orjson.loads(new_products_text))
+    except orjson.JSONDecodeError:
         products_list = [p.strip() for p in new_products_text.split(',') if p.strip()]
 
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('UPDATE orders SET products = %s, address = %s, phone = %s, notes = %s, delivery_type = %s WHERE id = %s', 
-                 (json.dumps(products_list), new_address, new_phone, new_notes, new_delivery, order_id))
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f'''
+            UPDATE orders o SET products = %s::jsonb, address = %s, phone = %s, notes = %s, delivery_type = %s
+            FROM (SELECT id, {ORDER_DELTA_COLUMNS} FROM orders WHERE id = %s FOR UPDATE) old
+            WHERE o.id = old.id
+            RETURNING row_to_json(old) AS old, o.customer_name, o.email, o.timestamp
+        ''', (orjson.dumps(products_list).decode(), new_address, new_phone, new_notes, new_delivery, order_id))
+        row = c.fetchone()
+        
+        # Phone, address and delivery type feed the customer's stats and the daily rollup
+        version = None
+        if row:
+            new = dict(row['old'], phone=new_phone, address=new_address, delivery_type=new_delivery)
+            if new_phone != row['old']['phone']:
+                # The new phone's delta needs a customers row to land on; lock both phones in
+                # LOCK_CUSTOMERS_SQL order first, then create it if this is the phone's first order
+                c.execute(LOCK_CUSTOMERS_SQL, (sorted({row['old']['phone'], new_phone}),))
+                upsert_customers(conn, [dict(row, phone=new_phone)])
+            version = apply_order_deltas(conn, [(row['old'], new)])
+        conn.commit()
+    data_version_listener.committed(version)
+    if row:
+        # The stored order no longer matches the last delivery; let the next one repair or overwrite it
+        webhook_dedup.forget([order_id])
     return redirect(request.referrer or url_for('dashboard'))
 
 @app.route('/update_notes', methods=['POST'])
@@ -866,11 +2575,12 @@ def update_notes():
     order_id = request.form['order_id']
     notes = request.form['notes']
     
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('UPDATE orders SET notes = %s WHERE id = %s', (notes, order_id))
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute('UPDATE orders SET notes = %s WHERE id = %s', (notes, order_id))
+        version = bump_data_version(conn)
+        conn.commit()
+    data_version_listener.committed(version)
     
     return jsonify({'success': True})
 
@@ -879,11 +2589,15 @@ def mark_packed():
     """Mark order as packed (viewer only)"""
     order_id = request.form['order_id']
     
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('UPDATE orders SET is_packed = TRUE WHERE id = %s', (order_id,))
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute('UPDATE orders SET is_packed = TRUE WHERE id = %s AND is_packed IS NOT TRUE', (order_id,))
+        version = None
+        if c.rowcount:
+            version = bump_data_version(conn)
+            publish_order_events(conn, [{'type': 'packed', 'id': order_id}])
+        conn.commit()
+    data_version_listener.committed(version)
     
     return jsonify({'success': True})
 
@@ -894,333 +2608,1487 @@ def viewer_packed():
     if not auth or auth.username != VIEWER_USERNAME or auth.password != VIEWER_PASSWORD:
         return Response('Access denied', 401, {'WWW-Authenticate': 'Basic realm="Viewer Login Required"'})
     
-    # Get packed orders (confirmed + packed)
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('''
-        SELECT * FROM orders 
-        WHERE status = 'Confirmed' AND is_packed = TRUE 
-        ORDER BY length(id) DESC, id DESC
-    ''')
-    orders = c.fetchall()
-    conn.close()
-    
-    orders_list = []
-    for row in orders:
-        order = dict(row)
-        try:
-            order['products'] = json.loads(order['products'])
-        except:
-            order['products'] = []
-        orders_list.append(order)
-    
-    return render_template('viewer.html', orders=orders_list, view='packed')
+    # Packed orders (confirmed + packed)
+    return render_viewer('packed')
 
-@app.route('/export/packed')
-def export_packed():
-    """Export packed orders to Excel"""
-    import io
-    from datetime import datetime
-    
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('''
-        SELECT * FROM orders 
-        WHERE status = 'Confirmed' AND is_packed = TRUE 
-        ORDER BY length(id) DESC, id DESC
-    ''')
-    orders = c.fetchall()
-    conn.close()
-    
-    if not orders:
-        return "No packed orders to export", 404
-    
-    # Create CSV content
-    output = io.StringIO()
-    output.write("Order ID,Customer Name,Email,Phone,Address,State,Payment Method,Products,Total,Delivery Type,Timestamp\n")
-    
-    for order in orders:
-        products = str(order.get('products', '')).replace('"', '""')
-        address = str(order.get('address', '')).replace('"', '""')
-        
-        output.write(f'"{order.get("id","")}",')
-        output.write(f'"{order.get("customer_name","")}",')
-        output.write(f'"{order.get("email","")}",')
-        output.write(f'"{order.get("phone","")}",')
-        output.write(f'"{address}",')
-        output.write(f'"{order.get("state","")}",')
-        output.write(f'"{order.get("payment_method","")}",')
-        output.write(f'"{products}",')
-        output.write(f'"{order.get("total","")}",')
-        output.write(f'"{order.get("delivery_type","")}",')
-        output.write(f'"{order.get("timestamp","")}"\n')
-    
-    csv_data = output.getvalue()
-    output.close()
-    
-    response = Response(csv_data, mimetype='text/csv')
-    response.headers['Content-Disposition'] = f'attachment; filename=packed_orders_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-    return response
+# --- Export Pipeline ---
+# Every export goes through OrderExport. Filters are turned into one WHERE
+# clause by export_filter(). Rows are read from a server-side (named) cursor
+# EXPORT_FETCH_SIZE at a time, projected to the columns the chosen writer
+# needs. The writer comes from EXPORT_WRITERS:
+#   - CSV and NDJSON are streamed to the client in ~64 KB chunks.
+#   - Excel, Parquet and PDF are written to a temp file, then sent.
+# Memory stays flat however many orders match. The pooled connection is held
+# until the rows run out or the client goes away.
 
-def get_orders_for_export(start_date, end_date, status=None, delivery_type=None):
-    conn = get_db_connection()
-    c = conn.cursor()
-    query = "SELECT * FROM orders WHERE 1=1"
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "2000"))
+EXPORT_CHUNK_BYTES = 64 * 1024
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+ORDER_EXPORT_HEADER = ["ID", "Name", "Phone", "Address", "State", "Payment", "Source", "Products", "Total", "Status", "Timestamp", "Notes", "Delivery"]
+VIEWER_EXPORT_HEADER = ["Order ID", "Customer Name", "Email", "Phone", "Address", "State", "Payment Method", "Products", "Total", "Delivery Type", "Timestamp"]
+# Order fields each writer reads
+# (products are read as JSON text, which is what the spreadsheet layouts show)
+ORDER_EXPORT_COLUMNS = 'id, customer_name, phone, address, state, payment_method, source, products::text AS products, total, status, timestamp, notes, delivery_type'
+VIEWER_EXPORT_COLUMNS = 'id, customer_name, email, phone, address, state, payment_method, products::text AS products, total, delivery_type, timestamp'
+XLSX_EXPORT_COLUMNS = ORDER_EXPORT_COLUMNS + ', amount, created_at'
+ANALYTICS_EXPORT_COLUMNS = ('id, customer_name, email, phone, address, state, payment_method, source, products, '
+                            'amount, status, created_at, delivery_type, rto_risk, is_packed, notes')
+
+EXPORT_FILTER_FIELDS = ('start_date', 'end_date', 'status', 'delivery_type', 'packed', 'summary')
+
+def order_export_row(row):
+    return [row['id'], row['customer_name'], row['phone'], row['address'], row.get('state', ''), row.get('payment_method', 'Prepaid'), row['source'],
+            row['products'], row['total'], row['status'], row['timestamp'], row['notes'], row.get('delivery_type', 'Standard')]
+
+def viewer_export_row(row):
+    return [row['id'], row['customer_name'], row['email'], row['phone'], row['address'], row['state'], row['payment_method'],
+            row['products'], row['total'], row['delivery_type'], row['timestamp']]
+
+def order_created_at_ist(row):
+    """The order's creation time as a naive IST datetime (what Excel shows), else its timestamp text"""
+    if row.get('created_at'):
+        return row['created_at'].astimezone(IST).replace(tzinfo=None)
+    return row.get('timestamp')
+
+def analytics_record(row):
+    """An order as typed values for the NDJSON and Parquet exports"""
+    record = dict(row)
+    record['products'] = [str(product) for product in order_products(row['products'])]
+    return record
+
+def write_orders_xlsx(rows, fileobj):
+    """Write orders to an XLSX file with a write-only workbook (memory stays flat).
+
+    Totals are written as numbers and timestamps as real datetimes.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('Orders')
+    ws.append(ORDER_EXPORT_HEADER)
+
+    def typed(value, number_format):
+        cell = WriteOnlyCell(ws, value)
+        cell.number_format = number_format
+        return cell
+
+    for row in rows:
+        values = order_export_row(row)
+        values[8] = typed(row['amount'] if row.get('amount') is not None else parse_amount(row.get('total')), '#,##0.00')
+        values[10] = typed(order_created_at_ist(row), 'yyyy-mm-dd hh:mm:ss')
+        ws.append(values)
+    wb.save(fileobj)
+
+def iter_query(query, params=(), fetch_size=EXPORT_FETCH_SIZE, conn=None):
+    """Yield the rows of `query` from a server-side cursor, `fetch_size` at a time.
+
+    Runs inside `conn`'s current transaction when given, else on a pooled connection.
+    """
+    if conn is None:
+        with get_db_connection() as conn:
+            yield from iter_query(query, params, fetch_size, conn)
+        return
+    c = conn.cursor(name=f'export_{threading.get_ident()}_{time.monotonic_ns()}')
+    try:
+        c.itersize = fetch_size
+        c.execute(query, params)
+        yield from c
+    finally:
+        c.close()
+
+def csv_chunks(header, rows, **fmtparams):
+    """CSV text for `header` and `rows`, yielded in chunks of about EXPORT_CHUNK_BYTES"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, **fmtparams)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def export_filters(values):
+    """The export filters in a request's args or JSON body, with empty values dropped"""
+    return {field: str(values[field]) for field in EXPORT_FILTER_FIELDS if values.get(field)}
+
+def export_filter(filters):
+    """WHERE clause and params selecting the orders an export covers"""
+    query = "1=1"
     params = []
-    
-    if start_date:
-        query += " AND date(timestamp) >= %s"
-        params.append(start_date)
-    if end_date:
-        query += " AND date(timestamp) <= %s"
-        params.append(end_date)
-    if status:
+
+    date_conditions, date_params = created_at_conditions(filters.get('start_date'), filters.get('end_date'))
+    for condition in date_conditions:
+        query += f" AND {condition}"
+    params += date_params
+    if filters.get('status'):
         query += " AND status = %s"
-        params.append(status)
-    if delivery_type:
+        params.append(filters['status'])
+    if filters.get('delivery_type'):
         query += " AND delivery_type = %s"
-        params.append(delivery_type)
-        
-    query += " ORDER BY length(id) DESC, id DESC"
-    c.execute(query, tuple(params))
+        params.append(filters['delivery_type'])
+    if filters.get('packed') == '1':
+        query += " AND is_packed = TRUE"
+    elif filters.get('packed') == '0':
+        query += " AND is_packed IS NOT TRUE"
+    return query, tuple(params)
+
+def export_query(filters, columns='*'):
+    """SELECT and params for the orders an export covers, newest first"""
+    where, params = export_filter(filters)
+    return f"SELECT {columns} FROM orders WHERE {where} ORDER BY order_seq DESC, id DESC", params
+
+def export_filename(filters, extension):
+    status, delivery_type = filters.get('status'), filters.get('delivery_type')
+    label = f"{status}_{delivery_type}" if status or delivery_type else "all"
+    return f"orders_{label}_{filters.get('start_date') or 'all'}_to_{filters.get('end_date') or 'all'}.{extension}"
+
+class ExportWriter:
+    """One export format: the columns it reads and how it writes an OrderExport.
+
+    Streaming writers implement chunks() and are sent to the client as they
+    are produced; the others implement write() and are spooled to a file.
+    """
+    extension = None
+    mimetype = None
+    columns = '*'
+    streaming = False
+
+    def chunks(self, export):
+        raise NotImplementedError
+
+    def write(self, export, fileobj):
+        for chunk in self.chunks(export):
+            fileobj.write(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+
+class CSVExportWriter(ExportWriter):
+    extension = 'csv'
+    mimetype = 'text/csv'
+    streaming = True
+
+    def __init__(self, header, row, columns, **fmtparams):
+        self.header = header
+        self.row = row
+        self.columns = columns
+        self.fmtparams = fmtparams
+
+    def chunks(self, export):
+        return csv_chunks(self.header, map(self.row, export.rows()), **self.fmtparams)
+
+class NDJSONExportWriter(ExportWriter):
+    """One JSON object per line, with products as a list, amount as a number and created_at in ISO 8601"""
+    extension = 'ndjson'
+    mimetype = 'application/x-ndjson'
+    columns = ANALYTICS_EXPORT_COLUMNS
+    streaming = True
+
+    def chunks(self, export):
+        buffer = io.BytesIO()
+        for row in export.rows():
+            # orjson writes datetimes as ISO 8601; amounts (Decimal) go through float
+            buffer.write(orjson.dumps(analytics_record(row), default=float, option=orjson.OPT_APPEND_NEWLINE))
+            if buffer.tell() >= EXPORT_CHUNK_BYTES:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+class XLSXExportWriter(ExportWriter):
+    extension = 'xlsx'
+    mimetype = XLSX_MIMETYPE
+    columns = XLSX_EXPORT_COLUMNS
+
+    def write(self, export, fileobj):
+        write_orders_xlsx(export.rows(), fileobj)
+
+class ParquetExportWriter(ExportWriter):
+    """Typed columns (decimal amount, UTC timestamp, list of products), one row group per fetch"""
+    extension = 'parquet'
+    mimetype = 'application/vnd.apache.parquet'
+    columns = ANALYTICS_EXPORT_COLUMNS
+
+    def write(self, export, fileobj):
+        # pyarrow is slow to import and only needed here
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = pa.schema([
+            ('id', pa.string()), ('customer_name', pa.string()), ('email', pa.string()), ('phone', pa.string()),
+            ('address', pa.string()), ('state', pa.string()), ('payment_method', pa.string()),
+            ('source', pa.string()), ('products', pa.list_(pa.string())), ('amount', pa.decimal128(12, 2)),
+            ('status', pa.string()), ('created_at', pa.timestamp('us', tz='UTC')), ('delivery_type', pa.string()),
+            ('rto_risk', pa.string()), ('is_packed', pa.bool_()), ('notes', pa.string()),
+        ])
+        rows = map(analytics_record, export.rows())
+        with pq.ParquetWriter(fileobj, schema, compression='snappy') as writer:
+            for batch in iter(lambda: list(itertools.islice(rows, EXPORT_FETCH_SIZE)), []):
+                writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+
+class OrderExport:
+    """One export: a writer from EXPORT_WRITERS and the filters selecting its orders.
+
+    Rows are read on `conn` when one is given, else on a pooled connection.
+    """
+
+    def __init__(self, fmt, filters, track=iter, conn=None):
+        self.format = fmt
+        self.writer = EXPORT_WRITERS[fmt]
+        self.filters = filters
+        self.track = track
+        self.conn = conn
+        self._rows = None
+
+    def rows(self):
+        """The matching orders, newest first, with only the writer's columns"""
+        if self._rows is None:
+            return self.track(iter_query(*export_query(self.filters, self.writer.columns), conn=self.conn))
+        rows, self._rows = self._rows, None
+        return rows
+
+    def is_empty(self):
+        """Whether no order matches; a row read to find out is kept for the writer"""
+        rows = self.rows()
+        first = next(rows, None)
+        if first is None:
+            rows.close()
+            return True
+        self._rows = itertools.chain([first], rows)
+        return False
+
+    def filename(self):
+        return export_filename(self.filters, self.writer.extension)
+
+    def write(self, fileobj):
+        self.writer.write(self, fileobj)
+
+    def response(self, download_name=None):
+        download_name = download_name or self.filename()
+        if self.writer.streaming:
+            response = Response(self.writer.chunks(self), mimetype=self.writer.mimetype)
+            response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+            return response
+        # Spool to disk rather than memory; send_file closes (and so deletes) it when done
+        output = tempfile.TemporaryFile()
+        self.write(output)
+        output.seek(0)
+        return send_file(output, mimetype=self.writer.mimetype, as_attachment=True, download_name=download_name)
+
+# --- PDF Export ---
+# The PDF report is one summary page (counts and confirmed value by status,
+# delivery type and payment method) followed by the order table. Table pages are
+# rendered in chunks of PDF_CHUNK_PAGES pages, in a process pool when there is
+# more than one chunk and PDF_WORKERS > 1, and the page content streams are
+# concatenated into the final document. Exports over PDF_MAX_ROWS orders, or
+# with ?summary=1, stop after the summary page.
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_CHUNK_PAGES = int(os.getenv("PDF_CHUNK_PAGES", "50"))
+PDF_MAX_ROWS = int(os.getenv("PDF_MAX_ROWS", "100000"))
+
+PDF_COLUMNS = [
+    ("ID", 20), ("Name", 35), ("Phone", 25), ("State", 25), ("Pay", 15),
+    ("Status", 20), ("Del", 20), ("Total", 20), ("Products", 85)
+]
+PDF_WIDTHS = [width for _, width in PDF_COLUMNS]
+# Order fields behind PDF_COLUMNS, in the same order
+PDF_EXPORT_COLUMNS = 'id, customer_name, phone, state, payment_method, status, delivery_type, total, products::text'
+PDF_ROW_HEIGHT = 8
+PDF_HEADER_HEIGHT = 10
+PDF_PAGE_NUMBER_HEIGHT = 6
+# A4 landscape is 210 mm tall; 10 mm margins top and bottom
+PDF_ROWS_PER_PAGE = (210 - 20 - PDF_PAGE_NUMBER_HEIGHT - PDF_HEADER_HEIGHT) // PDF_ROW_HEIGHT
+
+# Characters stripped from the products JSON for display
+_PDF_PRODUCT_CHARS = str.maketrans('', '', '[]"')
+
+def pdf_text(value, limit=None):
+    """Latin-1 safe text for the core PDF fonts, truncated to `limit` characters with '...'"""
+    text = str(value or "").encode('latin-1', 'replace').decode('latin-1')
+    return text[:limit] + "..." if limit and len(text) > limit else text
+
+class _PDFBuffer:
+    """Append-only stand-in for FPDF's output string, which it grows with += (quadratic in document size)"""
+
+    def __init__(self):
+        self.parts = []
+        self.length = 0
+
+    def __iadd__(self, text):
+        self.parts.append(text)
+        self.length += len(text)
+        return self
+
+    def __len__(self):
+        return self.length
+
+    def __str__(self):
+        return ''.join(self.parts)
+
+class OrderReportPDF(FPDF):
+    """Landscape A4 order report whose table pages can be rendered in separate processes"""
+
+    def __init__(self):
+        super().__init__(orientation='L', unit='mm', format='A4')
+        self.buffer = _PDFBuffer()
+        self.set_auto_page_break(False)
+        # Register the fonts in a fixed order so /F1 and /F2 mean the same thing in every process
+        self.set_font("Arial", 'B', 10)
+        self.set_font("Arial", size=9)
+        self.alias_nb_pages()
+
+    def page_number(self, number):
+        self.set_font("Arial", size=8)
+        self.cell(0, PDF_PAGE_NUMBER_HEIGHT, f"Page {number} of {{nb}}", ln=True, align='R')
+
+    def start_table_page(self, number):
+        self.add_page()
+        self.page_number(number)
+        self.set_font("Arial", 'B', 10)
+        self.set_fill_color(240, 240, 240)
+        for header, width in PDF_COLUMNS:
+            self.cell(width, PDF_HEADER_HEIGHT, header, border=1, fill=True, align='C')
+        self.ln()
+        self.set_font("Arial", size=9)
+
+    def table_row(self, row):
+        order_id, name, phone, state, payment, status, delivery, total, products = row
+        w_id, w_name, w_phone, w_state, w_pay, w_status, w_del, w_total, w_products = PDF_WIDTHS
+        h = PDF_ROW_HEIGHT
+        self.cell(w_id, h, pdf_text(order_id), border=1)
+        self.cell(w_name, h, pdf_text(name, 18), border=1)
+        self.cell(w_phone, h, pdf_text(phone), border=1)
+        self.cell(w_state, h, pdf_text(state, 12), border=1)
+        self.cell(w_pay, h, pdf_text(payment or 'Prepaid'), border=1)
+        self.cell(w_status, h, pdf_text(status), border=1)
+        self.cell(w_del, h, pdf_text(delivery or 'Standard'), border=1)
+        self.cell(w_total, h, pdf_text(total), border=1)
+        self.cell(w_products, h, pdf_text(str(products or "").translate(_PDF_PRODUCT_CHARS), 45), border=1)
+        self.ln()
+
+    def summary_page(self, info, summary, note=None):
+        self.add_page()
+        self.page_number(1)
+        self.set_font("Arial", 'B', 16)
+        self.cell(0, 10, txt="Order Verification Report", ln=True, align='C')
+        self.set_font("Arial", size=10)
+        self.cell(0, 10, txt=pdf_text(info), ln=True, align='C')
+        self.ln(5)
+        self.set_fill_color(240, 240, 240)
+        for dimension, label in (('status', 'Status'), ('delivery_type', 'Delivery'), ('payment_method', 'Payment')):
+            self.set_font("Arial", 'B', 10)
+            for header, width in ((label, 60), ("Orders", 30), ("Confirmed Value", 40)):
+                self.cell(width, PDF_ROW_HEIGHT, header, border=1, fill=True, align='C')
+            self.ln()
+            self.set_font("Arial", size=9)
+            for row in summary:
+                if row['dimension'] == dimension:
+                    self.cell(60, PDF_ROW_HEIGHT, pdf_text(row['value'] or '-'), border=1)
+                    self.cell(30, PDF_ROW_HEIGHT, str(row['orders']), border=1, align='R')
+                    self.cell(40, PDF_ROW_HEIGHT, f"{row['amount']:,.2f}", border=1, align='R')
+                    self.ln()
+            self.ln(4)
+        if note:
+            self.set_font("Arial", 'I', 10)
+            self.multi_cell(0, 6, pdf_text(note))
+
+    def add_rendered_page(self, content):
+        """Append a page whose content stream came from render_pdf_pages()"""
+        self.add_page()
+        self.pages[self.page] = content
+
+    def to_bytes(self):
+        self.close()
+        return str(self.buffer).encode('latin-1')
+
+def render_pdf_pages(rows, first_page):
+    """Render order table pages for `rows`, numbered from `first_page`; returns each page's content stream.
+
+    Runs in the PDF process pool, so it takes plain tuples (PDF_EXPORT_COLUMNS order).
+    """
+    pdf = OrderReportPDF()
+    for start in range(0, len(rows), PDF_ROWS_PER_PAGE):
+        pdf.start_table_page(first_page + start // PDF_ROWS_PER_PAGE)
+        for row in rows[start:start + PDF_ROWS_PER_PAGE]:
+            pdf.table_row(row)
+    return [pdf.pages[n] for n in range(1, pdf.page + 1)]
+
+_pdf_pool = None
+_pdf_pool_pid = None
+_pdf_pool_lock = threading.Lock()
+
+def pdf_pool():
+    """The process pool for PDF rendering, created on first use in each worker process"""
+    global _pdf_pool, _pdf_pool_pid
+    with _pdf_pool_lock:
+        if _pdf_pool is None or _pdf_pool_pid != os.getpid():
+            # Forking a threaded web worker can copy held locks and pool sockets into
+            # the children; start them from a clean forkserver process instead
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS,
+                                            mp_context=multiprocessing.get_context('forkserver'))
+            _pdf_pool_pid = os.getpid()
+        return _pdf_pool
+
+def build_orders_pdf(info, summary, rows=None, note=None):
+    """PDF bytes: the summary page, then table pages for `rows` (an iterable of PDF_EXPORT_COLUMNS tuples)"""
+    pdf = OrderReportPDF()
+    pdf.summary_page(info, summary, note)
+    if rows is None:
+        return pdf.to_bytes()
+
+    rows = iter(rows)
+    chunk_size = PDF_CHUNK_PAGES * PDF_ROWS_PER_PAGE
+    chunks = iter(lambda: list(itertools.islice(rows, chunk_size)), [])
+    first_chunk = next(chunks, [])
+    second_chunk = next(chunks, [])
+    first_page = 2
+    if not second_chunk or PDF_WORKERS <= 1:
+        # Nothing to parallelise: render in this process
+        for chunk in itertools.chain([first_chunk, second_chunk], chunks):
+            for content in render_pdf_pages(chunk, first_page):
+                pdf.add_rendered_page(content)
+            first_page += (len(chunk) + PDF_ROWS_PER_PAGE - 1) // PDF_ROWS_PER_PAGE
+        return pdf.to_bytes()
+
+    pool = pdf_pool()
+    futures = []
+    for chunk in itertools.chain([first_chunk, second_chunk], chunks):
+        futures.append(pool.submit(render_pdf_pages, chunk, first_page))
+        first_page += (len(chunk) + PDF_ROWS_PER_PAGE - 1) // PDF_ROWS_PER_PAGE
+    for future in futures:
+        for content in future.result():
+            pdf.add_rendered_page(content)
+    return pdf.to_bytes()
+
+def export_summary(filters, conn=None):
+    """Order counts and confirmed value per status, delivery type and payment method for an export's filters"""
+    if conn is None:
+        with get_db_connection() as conn:
+            return export_summary(filters, conn)
+    where, params = export_filter(filters)
+    c = conn.cursor()
+    c.execute(f'''
+        SELECT CASE WHEN GROUPING(status) = 0 THEN 'status'
+                    WHEN GROUPING(delivery_type) = 0 THEN 'delivery_type'
+                    ELSE 'payment_method' END AS dimension,
+               COALESCE(status, delivery_type, payment_method) AS value,
+               COUNT(*) AS orders,
+               COALESCE(SUM(amount) FILTER (WHERE status = 'Confirmed'), 0) AS amount
+        FROM orders
+        WHERE {where}
+        GROUP BY GROUPING SETS ((status), (delivery_type), (payment_method))
+        ORDER BY dimension, orders DESC
+    ''', params)
     return c.fetchall()
 
+class PDFExportWriter(ExportWriter):
+    """The summary page, then the order table unless ?summary=1 or more than PDF_MAX_ROWS orders match"""
+    extension = 'pdf'
+    mimetype = 'application/pdf'
+    columns = PDF_EXPORT_COLUMNS
+
+    def write(self, export, fileobj):
+        filters = export.filters
+        info_txt = f"Date: {filters.get('start_date') or 'All'} to {filters.get('end_date') or 'All'}"
+        if filters.get('status'): info_txt += f" | Status: {filters['status']}"
+        if filters.get('delivery_type'): info_txt += f" | Delivery: {filters['delivery_type']}"
+
+        summary = export_summary(filters, export.conn)
+        total_orders = sum(row['orders'] for row in summary if row['dimension'] == 'status')
+        rows, note = None, None
+        if filters.get('summary') == '1':
+            pass
+        elif PDF_MAX_ROWS and total_orders > PDF_MAX_ROWS:
+            note = (f"{total_orders} orders match, more than the {PDF_MAX_ROWS} a PDF lists. "
+                    "Use the CSV or Excel export for the full list.")
+        else:
+            rows = (tuple(row.values()) for row in export.rows())
+        fileobj.write(build_orders_pdf(info_txt, summary, rows, note))
+
+# --- Export Routes ---
+EXPORT_WRITERS = {
+    'csv': CSVExportWriter(ORDER_EXPORT_HEADER, order_export_row, ORDER_EXPORT_COLUMNS),
+    'viewer_csv': CSVExportWriter(VIEWER_EXPORT_HEADER, viewer_export_row, VIEWER_EXPORT_COLUMNS, quoting=csv.QUOTE_ALL),
+    'excel': XLSXExportWriter(),
+    'pdf': PDFExportWriter(),
+    'ndjson': NDJSONExportWriter(),
+    'parquet': ParquetExportWriter(),
+}
+
+@app.route('/export/packed')
+def export_packed():
+    """Export packed orders to CSV"""
+    export = OrderExport('viewer_csv', {'status': 'Confirmed', 'packed': '1'})
+    if export.is_empty():
+        return "No packed orders to export", 404
+    return export.response(f'packed_orders_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv')
+
 @app.route('/export/confirmed')
 def export_confirmed():
-    """Export confirmed (unpacked) orders to Excel"""
-    import io
-    from datetime import datetime
-    
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('''
-        SELECT * FROM orders 
-        WHERE status = 'Confirmed' AND (is_packed = FALSE OR is_packed IS NULL)
-        ORDER BY length(id) DESC, id DESC
-    ''')
-    orders = c.fetchall()
-    conn.close()
-    
-    if not orders:
+    """Export confirmed (unpacked) orders to CSV"""
+    export = OrderExport('viewer_csv', {'status': 'Confirmed', 'packed': '0'})
+    if export.is_empty():
         return "No confirmed orders to export", 404
-    
-    # Create CSV content
-    output = io.StringIO()
-    output.write("Order ID,Customer Name,Email,Phone,Address,State,Payment Method,Products,Total,Delivery Type,Timestamp\n")
-    
-    for order in orders:
-        products = str(order.get('products', '')).replace('"', '""')
-        address = str(order.get('address', '')).replace('"', '""')
-        
-        output.write(f'"{order.get("id","")}",')
-        output.write(f'"{order.get("customer_name","")}",')
-        output.write(f'"{order.get("email","")}",')
-        output.write(f'"{order.get("phone","")}",')
-        output.write(f'"{address}",')
-        output.write(f'"{order.get("state","")}",')
-        output.write(f'"{order.get("payment_method","")}",')
-        output.write(f'"{products}",')
-        output.write(f'"{order.get("total","")}",')
-        output.write(f'"{order.get("delivery_type","")}",')
-        output.write(f'"{order.get("timestamp","")}"\n')
-    
-    csv_data = output.getvalue()
-    output.close()
-    
-    response = Response(csv_data, mimetype='text/csv')
-    response.headers['Content-Disposition'] = f'attachment; filename=confirmed_orders_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-    return response
+    return export.response(f'confirmed_orders_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv')
 
-
-@app.route('/export/csv')
+@app.route('/export/<fmt>')
 @basic_auth.required
+def export_orders(fmt):
+    """Download orders as csv, excel, pdf, ndjson or parquet, filtered by date, status and delivery type"""
+    if fmt not in EXPORT_WRITERS:
+        return f"Unknown export format '{fmt}'", 404
+    return OrderExport(fmt, export_filters(request.args)).response()
 
-def export_csv():
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    status = request.args.get('status')
-    delivery_type = request.args.get('delivery_type')
-    rows = get_orders_for_export(start_date, end_date, status, delivery_type)
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["ID", "Name", "Phone", "Address", "State", "Payment", "Source", "Products", "Total", "Status", "Timestamp", "Notes", "Delivery"])
-    for row in rows:
-        writer.writerow([row['id'], row['customer_name'], row['phone'], row['address'], row.get('state', ''), row.get('payment_method', 'Prepaid'), row['source'], 
-                         row['products'], row['total'], row['status'], row['timestamp'], row['notes'], row.get('delivery_type', 'Standard')])
-    
-    label = f"{status}_{delivery_type}" if status or delivery_type else "all"
-    filename = f"orders_{label}_{start_date or 'all'}_to_{end_date or 'all'}.csv"
-    return Response(output.getvalue(), mimetype='text/csv', 
-                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+# --- Export Jobs ---
+# POST /export/jobs runs any OrderExport format on a background thread pool
+# and returns a job id to poll. Finished files are kept in EXPORT_CACHE_DIR,
+# keyed by (format, filters, orders data version). An identical request made
+# before the data changes again gets the finished file back at once: the job id
+# is the cache key, so any gunicorn worker can serve a download. The cache is
+# trimmed least-recently-used first to EXPORT_CACHE_MAX_MB and
+# EXPORT_CACHE_MAX_FILES. Progress of running jobs is tracked per process.
+
+EXPORT_JOB_WORKERS = int(os.getenv("EXPORT_JOB_WORKERS", "2"))
+EXPORT_JOB_TTL = int(os.getenv("EXPORT_JOB_TTL", "3600"))          # seconds a finished job stays listed
+EXPORT_CACHE_DIR = os.getenv("EXPORT_CACHE_DIR", "export_cache")
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_MB", "500")) * 1024 * 1024
+EXPORT_CACHE_MAX_FILES = int(os.getenv("EXPORT_CACHE_MAX_FILES", "100"))
+
+def export_cache_key(fmt, filters, data_version):
+    payload = json.dumps([fmt, filters, data_version], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
 
-@app.route('/export/excel')
+class ExportCache:
+    """Finished export files on local disk, evicted least-recently-used first.
+
+    Each artifact is `<key>.<ext>` with a `<key>.json` sidecar holding its
+    download name and mimetype. Both are written to temp names and renamed
+    into place, so readers in other processes never see a partial file. Hits
+    touch the sidecar's mtime, which is what eviction orders by.
+    """
+
+    def __init__(self, directory, max_bytes, max_files):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def _meta_path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def lookup(self, key, count=True):
+        """Metadata (with 'path') of the artifact stored under `key`, or None"""
+        try:
+            with open(self._meta_path(key)) as f:
+                meta = json.load(f)
+            meta['path'] = os.path.join(self.directory, f"{key}.{meta['extension']}")
+            os.utime(self._meta_path(key))
+        except (OSError, ValueError):
+            meta = None
+        if meta and not os.path.exists(meta['path']):
+            meta = None
+        if count:
+            with self._lock:
+                if meta:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return meta
+
+    def store(self, key, extension, write, meta):
+        """Create the artifact for `key` by calling write(fileobj); returns its metadata"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{key}.{extension}")
+        suffix = f".tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            with open(path + suffix, 'wb') as f:
+                write(f)
+            meta = dict(meta, extension=extension, size=os.path.getsize(path + suffix))
+            with open(self._meta_path(key) + suffix, 'w') as f:
+                json.dump(meta, f)
+            os.replace(path + suffix, path)
+            os.replace(self._meta_path(key) + suffix, self._meta_path(key))
+        finally:
+            for leftover in (path + suffix, self._meta_path(key) + suffix):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        self.evict()
+        return dict(meta, path=path)
+
+    def _entries(self):
+        """[(last used, size, [paths])] for every complete artifact"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            meta_path = os.path.join(self.directory, name)
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                path = os.path.join(self.directory, f"{name[:-5]}.{meta['extension']}")
+                entries.append((os.path.getmtime(meta_path), os.path.getsize(path), [meta_path, path]))
+            except (OSError, ValueError, KeyError):
+                continue
+        return entries
+
+    def evict(self):
+        """Delete least recently used artifacts until the cache is within its limits"""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            while entries and (total > self.max_bytes or len(entries) > self.max_files):
+                _, size, paths = entries.pop(0)
+                for path in paths:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
+                self.evicted += 1
+
+    def clear(self):
+        with self._lock:
+            if os.path.isdir(self.directory):
+                for name in os.listdir(self.directory):
+                    os.remove(os.path.join(self.directory, name))
+
+    def stats(self):
+        entries = self._entries() if os.path.isdir(self.directory) else []
+        with self._lock:
+            return {'files': len(entries), 'bytes': sum(size for _, size, _ in entries),
+                    'max_bytes': self.max_bytes, 'max_files': self.max_files,
+                    'hits': self.hits, 'misses': self.misses, 'evicted': self.evicted}
+
+export_cache = ExportCache(EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_BYTES, EXPORT_CACHE_MAX_FILES)
+
+class ExportJob:
+    def __init__(self, key, fmt, filters, data_version):
+        self.id = key
+        self.format = fmt
+        self.filters = filters
+        self.data_version = data_version
+        self.state = 'queued'
+        self.cached = False
+        self.rows_done = 0
+        self.rows_total = None
+        self.size = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    def track(self, rows):
+        for row in rows:
+            self.rows_done += 1
+            yield row
+
+    def to_dict(self):
+        if self.state == 'done':
+            progress = 1.0
+        elif self.rows_total:
+            progress = round(min(self.rows_done / self.rows_total, 1.0), 3)
+        else:
+            progress = 0.0
+        return {
+            'job_id': self.id, 'format': self.format, 'filters': self.filters, 'state': self.state,
+            'cached': self.cached, 'progress': progress, 'rows_done': self.rows_done,
+            'rows_total': self.rows_total, 'size': self.size, 'error': self.error,
+            'seconds': round((self.finished_at or time.time()) - self.submitted_at, 3),
+            'download_url': url_for('download_export_job', job_id=self.id) if self.state == 'done' else None,
+        }
+
+class ExportJobRunner:
+    """Runs export jobs on a thread pool, sharing one job between identical requests"""
+
+    def __init__(self, cache, workers):
+        self.cache = cache
+        self.workers = workers
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+
+    def _executor(self):
+        # Thread pools don't survive gunicorn's fork, so create one per process
+        if self._pool is None or self._pid != os.getpid():
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='export-job')
+            self._pid = os.getpid()
+            self._jobs = {}
+        return self._pool
+
+    def submit(self, fmt, filters):
+        """The job for this export at the current data version, started if nothing has it yet"""
+        data_version = get_data_version()
+        key = export_cache_key(fmt, filters, data_version)
+        with self._lock:
+            pool = self._executor()
+            self._prune()
+            job = self._jobs.get(key)
+            if job and job.state != 'failed':
+                return job
+            job = ExportJob(key, fmt, filters, data_version)
+            meta = self.cache.lookup(key)
+            if meta:
+                job.state, job.cached, job.size = 'done', True, meta['size']
+                job.rows_done = job.rows_total = meta['rows']
+                job.finished_at = job.submitted_at
+            else:
+                pool.submit(self._run, job)
+            self._jobs[key] = job
+            return job
+
+    def get(self, job_id):
+        """A job of this process, or a finished one another process left in the cache"""
+        with self._lock:
+            job = self._jobs.get(job_id) if self._pid == os.getpid() else None
+        if job:
+            return job
+        meta = self.cache.lookup(job_id, count=False)
+        if not meta:
+            return None
+        job = ExportJob(job_id, meta['format'], meta['filters'], meta['data_version'])
+        job.state, job.cached, job.size = 'done', True, meta['size']
+        job.rows_done = job.rows_total = meta['rows']
+        job.finished_at = job.submitted_at
+        return job
+
+    def _prune(self):
+        cutoff = time.time() - EXPORT_JOB_TTL
+        for key in [key for key, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[key]
+
+    def _rekey(self, job, data_version):
+        """File `job` under the data version its snapshot actually shows"""
+        job.data_version = data_version
+        job.id = export_cache_key(job.format, job.filters, data_version)
+        with self._lock:
+            # Polls of the old id still find the job; identical requests at the new version share it
+            self._jobs.setdefault(job.id, job)
+
+    def _run(self, job):
+        job.state = 'running'
+        try:
+            filters = job.filters
+            where, params = export_filter(filters)
+            with get_db_connection() as conn:
+                c = conn.cursor()
+                # The data version, the count and the rows all come from one snapshot, so the
+                # artifact is cached under the version whose rows it holds
+                c.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+                data_version = get_data_version(conn)
+                if data_version != job.data_version:
+                    self._rekey(job, data_version)
+                c.execute(f'SELECT COUNT(*) AS n FROM orders WHERE {where}', params)
+                job.rows_total = c.fetchone()['n']
+                export = OrderExport(job.format, filters, track=job.track, conn=conn)
+                meta = {
+                    'format': job.format, 'filters': filters, 'data_version': job.data_version,
+                    'mimetype': export.writer.mimetype, 'created_at': datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S"),
+                    'download_name': export.filename(),
+                }
+
+                def write(fileobj):
+                    export.write(fileobj)
+                    meta['rows'] = job.rows_done
+                job.size = self.cache.store(job.id, export.writer.extension, write, meta)['size']
+            job.state = 'done'
+        except Exception as e:
+            job.error = str(e)
+            job.state = 'failed'
+            log.exception("Export job failed", extra={'job': job.id, 'format': job.format})
+        finally:
+            job.finished_at = time.time()
+
+    def stats(self):
+        with self._lock:
+            states = {}
+            if self._pid == os.getpid():
+                for job in self._jobs.values():
+                    states[job.state] = states.get(job.state, 0) + 1
+        return {'workers': self.workers, 'jobs': states}
+
+export_jobs = ExportJobRunner(export_cache, EXPORT_JOB_WORKERS)
+
+@app.route('/export/jobs', methods=['POST'])
 @basic_auth.required
-def export_excel():
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    status = request.args.get('status')
-    delivery_type = request.args.get('delivery_type')
-    rows = get_orders_for_export(start_date, end_date, status, delivery_type)
+def create_export_job():
+    """Start (or reuse) a background export; body or query args carry format and the export filters"""
+    values = dict(request.args.items())
+    values.update(request.get_json(silent=True) or request.form.to_dict())
+    fmt = values.get('format', 'csv')
+    if fmt not in EXPORT_WRITERS:
+        return jsonify({'success': False, 'error': f"Unknown format '{fmt}'"}), 400
+    job = export_jobs.submit(fmt, export_filters(values))
+    return jsonify(job.to_dict()), 200 if job.state == 'done' else 202
 
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.append(["ID", "Name", "Phone", "Address", "State", "Payment", "Source", "Products", "Total", "Status", "Timestamp", "Notes", "Delivery"])
-    for row in rows:
-        ws.append([row['id'], row['customer_name'], row['phone'], row['address'], row.get('state', ''), row.get('payment_method', 'Prepaid'), row['source'], 
-                   row['products'], row['total'], row['status'], row['timestamp'], row['notes'], row.get('delivery_type', 'Standard')])
-    
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-    label = f"{status}_{delivery_type}" if status or delivery_type else "all"
-    filename = f"orders_{label}_{start_date or 'all'}_to_{end_date or 'all'}.xlsx"
-    return send_file(output, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                     as_attachment=True, download_name=filename)
+@app.route('/export/jobs/<job_id>')
+@basic_auth.required
+def export_job_status(job_id):
+    job = export_jobs.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Unknown or expired export job'}), 404
+    return jsonify(job.to_dict())
 
-@app.route('/export/pdf')
+@app.route('/export/jobs/<job_id>/download')
 @basic_auth.required
-def export_pdf():
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    status = request.args.get('status')
-    delivery_type = request.args.get('delivery_type')
-    rows = get_orders_for_export(start_date, end_date, status, delivery_type)
-
-    pdf = FPDF(orientation='L', unit='mm', format='A4')
-    pdf.add_page()
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(0, 10, txt="Order Verification Report", ln=True, align='C')
-    
-    info_txt = f"Date: {start_date or 'All'} to {end_date or 'All'}"
-    if status: info_txt += f" | Status: {status}"
-    if delivery_type: info_txt += f" | Delivery: {delivery_type}"
-    
-    pdf.set_font("Arial", size=10)
-    pdf.cell(0, 10, txt=info_txt, ln=True, align='C')
-    pdf.ln(5)
+def download_export_job(job_id):
+    meta = export_cache.lookup(job_id, count=False)
+    if not meta:
+        job = export_jobs.get(job_id)
+        if job and job.state in ('queued', 'running'):
+            return jsonify(job.to_dict()), 409
+        return "Export not found or expired", 404
+    return send_file(meta['path'], mimetype=meta['mimetype'], as_attachment=True,
+                     download_name=meta['download_name'])
 
-    # Table Header
-    pdf.set_font("Arial", 'B', 10)
-    pdf.set_fill_color(240, 240, 240)
-    
-    # Columns: ID(20), Name(35), Phone(25), State(25), Pay(15), Status(20), Del(20), Total(20), Products(Rest)
-    cols = [
-        ("ID", 20), ("Name", 35), ("Phone", 25), ("State", 25), ("Pay", 15),
-        ("Status", 20), ("Del", 20), ("Total", 20), ("Products", 85)
-    ]
-    
-    for header, width in cols:
-        pdf.cell(width, 10, header, border=1, fill=True, align='C')
-    pdf.ln()
+# --- Ingest Queue ---
+INGEST_QUEUE_PATH = os.getenv("INGEST_QUEUE_PATH", "ingest_queue.db")
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "50"))
+INGEST_HIGH_WATER = int(os.getenv("INGEST_HIGH_WATER", "5000"))     # queue depth at which webhooks get 429
+INGEST_RETRY_AFTER = int(os.getenv("INGEST_RETRY_AFTER", "30"))     # seconds, sent with 429
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "10"))   # after this a message is parked as dead
+INGEST_LEASE = float(os.getenv("INGEST_LEASE", "120"))              # seconds a claimed batch is reserved
+INGEST_POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", "1"))
 
-    # Table Rows
-    pdf.set_font("Arial", size=9)
-    for row in rows:
+class IngestQueue:
+    """Durable local queue of normalized orders waiting to be written to Postgres.
+
+    Backed by a SQLite database in WAL mode so a webhook can be acknowledged
+    as soon as its order is on local disk. Consumers claim batches with a
+    lease, so several gunicorn workers can drain the same file safely and a
+    batch claimed by a crashed worker is picked up again once its lease ends.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {'enqueued': 0, 'processed': 0, 'failed': 0, 'dead': 0, 'rejected': 0}
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=FULL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS ingest_queue (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    source TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    received_at REAL NOT NULL,
+                    lease_until REAL DEFAULT 0,
+                    attempts INTEGER DEFAULT 0,
+                    dead INTEGER DEFAULT 0,
+                    last_error TEXT
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_ingest_ready ON ingest_queue(dead, lease_until, id)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _bump(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def depth(self):
+        row = self._conn().execute('SELECT COUNT(*) FROM ingest_queue WHERE dead = 0').fetchone()
+        return row[0]
+
+    def enqueue(self, source, order):
+        self._conn().execute(
+            'INSERT INTO ingest_queue (source, payload, received_at) VALUES (?, ?, ?)',
+            (source, orjson.dumps(order).decode(), time.time())
+        )
+        self._bump('enqueued')
+
+    def claim(self, limit):
+        """Reserve up to `limit` ready messages; returns [(id, order)]"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
         try:
-            # Safe Encode
-            def clean(text):
-                return str(text or "").encode('latin-1', 'replace').decode('latin-1')
+            rows = conn.execute('''
+                SELECT id, payload FROM ingest_queue
+                WHERE dead = 0 AND lease_until < ?
+                ORDER BY id LIMIT ?
+            ''', (now, limit)).fetchall()
+            if rows:
+                conn.execute(
+                    f"UPDATE ingest_queue SET lease_until = ?, attempts = attempts + 1 WHERE id IN ({','.join('?' * len(rows))})",
+                    [now + INGEST_LEASE] + [r[0] for r in rows]
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return [(row_id, orjson.loads(payload)) for row_id, payload in rows]
 
-            # Truncate logic
-            def trunc(text, length=25):
-                t = clean(text)
-                return t[:length] + "..." if len(t) > length else t
+    def ack(self, ids):
+        if not ids:
+            return
+        self._conn().execute(f"DELETE FROM ingest_queue WHERE id IN ({','.join('?' * len(ids))})", list(ids))
+        self._bump('processed', len(ids))
 
-            products_str = clean(row['products'])
-            products_str = products_str.replace('[', '').replace(']', '').replace('"', '')
+    def fail(self, ids, error, retry_in):
+        """Release messages for a later retry, parking the ones that ran out of attempts.
 
-            # Row Height 8
-            h = 8
-            
-            pdf.cell(cols[0][1], h, clean(row['id']), border=1)
-            pdf.cell(cols[1][1], h, trunc(row['customer_name'], 18), border=1)
-            pdf.cell(cols[2][1], h, clean(row['phone']), border=1)
-            pdf.cell(cols[3][1], h, trunc(row.get('state', ''), 12), border=1)
-            pdf.cell(cols[4][1], h, clean(row.get('payment_method', 'Prepaid')), border=1)
-            pdf.cell(cols[5][1], h, clean(row['status']), border=1)
-            pdf.cell(cols[6][1], h, clean(row.get('delivery_type', 'Standard')), border=1)
-            pdf.cell(cols[7][1], h, clean(row['total']), border=1)
-            pdf.cell(cols[8][1], h, trunc(products_str, 45), border=1)
-            
-            pdf.ln()
-            
+        Returns the ids that were parked as dead letters.
+        """
+        if not ids:
+            return []
+        conn = self._conn()
+        marks = ','.join('?' * len(ids))
+        conn.execute(
+            f"UPDATE ingest_queue SET lease_until = ?, last_error = ? WHERE id IN ({marks})",
+            [time.time() + retry_in, str(error)] + list(ids)
+        )
+        dead = [row[0] for row in conn.execute(
+            f"UPDATE ingest_queue SET dead = 1 WHERE attempts >= ? AND id IN ({marks}) RETURNING id",
+            [INGEST_MAX_ATTEMPTS] + list(ids)
+        ).fetchall()]
+        self._bump('failed', len(ids))
+        if dead:
+            self._bump('dead', len(dead))
+        return dead
+
+    def record_rejected(self):
+        self._bump('rejected')
+
+    def stats(self):
+        conn = self._conn()
+        depth, oldest = conn.execute(
+            'SELECT COUNT(*), MIN(received_at) FROM ingest_queue WHERE dead = 0'
+        ).fetchone()
+        dead = conn.execute('SELECT COUNT(*) FROM ingest_queue WHERE dead = 1').fetchone()[0]
+        with self._stats_lock:
+            counters = dict(self._stats)
+        return dict(counters,
+                    depth=depth,
+                    dead_letters=dead,
+                    lag_seconds=round(time.time() - oldest, 3) if oldest else 0,
+                    high_water=INGEST_HIGH_WATER)
+
+ingest_queue = IngestQueue(INGEST_QUEUE_PATH)
+
+class IngestWorker:
+    """Background thread that drains the ingest queue into Postgres in batches"""
+
+    def __init__(self, queue):
+        self.queue = queue
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.last_batch_size = 0
+        self.last_batch_seconds = 0.0
+        self.last_error = None
+
+    def ensure_started(self):
+        # Threads don't survive gunicorn's fork, so (re)start per process
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='ingest-worker', daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _run(self):
+        failures = 0
+        while True:
+            try:
+                drained = self.drain_once()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                self.last_error = str(e)
+                log.exception("Ingest worker error")
+                drained = 0
+                time.sleep(random.uniform(0, min(DB_BACKOFF_MAX * 6, DB_BACKOFF_BASE * (2 ** failures))))
+            if not drained:
+                self._wakeup.wait(INGEST_POLL_INTERVAL)
+                self._wakeup.clear()
+
+    def drain_once(self):
+        """Process one batch; returns the number of messages handled"""
+        batch = self.queue.claim(INGEST_BATCH_SIZE)
+        if not batch:
+            return 0
+        started = time.monotonic()
+        done, failed = [], []
+        try:
+            save_orders([order for _, order in batch])
+            done = [row_id for row_id, _ in batch]
         except Exception as e:
-            print(f"Error printing PDF row: {e}")
-            continue
+            # Fall back to one order at a time so a single bad order can't block the batch
+            log.warning("Ingest batch failed, retrying individually", extra={'batch_size': len(batch), 'error': str(e)})
+            for row_id, order in batch:
+                try:
+                    save_order(order)
+                    done.append(row_id)
+                except Exception as e:
+                    log.error("Ingest failed for order", extra={'order_id': order.get('id'), 'error': str(e)})
+                    self.last_error = str(e)
+                    failed.append(row_id)
+        self.queue.ack(done)
+        dead = set(self.queue.fail(failed, self.last_error, retry_in=INGEST_POLL_INTERVAL * 10))
+        if dead:
+            # Let the next delivery of a parked order through instead of treating it as a duplicate
+            webhook_dedup.forget([order.get('id') for row_id, order in batch if row_id in dead])
+        self.last_batch_size = len(batch)
+        self.last_batch_seconds = round(time.monotonic() - started, 3)
+        return len(batch)
 
-    output = io.BytesIO()
-    output.write(pdf.output(dest='S').encode('latin-1'))
-    output.seek(0)
-    label = f"{status}_{delivery_type}" if status or delivery_type else "all"
-    filename = f"orders_{label}_{start_date or 'all'}_to_{end_date or 'all'}.pdf"
-    return send_file(output, mimetype='application/pdf',
-                     as_attachment=True, download_name=filename)
+    def stats(self):
+        return {
+            'running': bool(self._thread and self._thread.is_alive() and self._pid == os.getpid()),
+            'last_batch_size': self.last_batch_size,
+            'last_batch_seconds': self.last_batch_seconds,
+            'last_error': self.last_error,
+        }
+
+ingest_worker = IngestWorker(ingest_queue)
+
+# --- Customer Refresher ---
+CUSTOMER_REFRESH_INTERVAL = float(os.getenv("CUSTOMER_REFRESH_INTERVAL", "60"))  # seconds between refresh runs
+CUSTOMER_REFRESH_BATCH = int(os.getenv("CUSTOMER_REFRESH_BATCH", "200"))         # phones per set-based rebuild
+
+class CustomerRefresher:
+    """Background thread that fully recomputes dirty customer profiles.
+
+    Write paths keep counters current with deltas and mark the phone dirty in
+    customer_refresh_queue. Every CUSTOMER_REFRESH_INTERVAL seconds this thread
+    takes the dirty phones in batches and rebuilds them with one set-based query
+    per batch, so a customer touched 200 times is recomputed once, off the
+    request path. A batch locks its customers rows before taking the phones
+    off the queue, the same order the write paths lock in, so several
+    workers can run it side by side with the writers without deadlocking.
+    """
+
+    def __init__(self, interval, batch_size):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.last_run_seconds = 0.0
+        self.last_run_refreshed = 0
+        self.last_run_at = None
+        self.last_error = None
+
+    def ensure_started(self):
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='customer-refresher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh_once()
+            except Exception as e:
+                self.last_error = str(e)
+                log.exception("Customer refresher error")
+
+    def refresh_once(self):
+        """Rebuild every phone that is dirty right now; returns how many were refreshed"""
+        started = time.monotonic()
+        refreshed = 0
+        while True:
+            with get_db_connection() as conn:
+                c = conn.cursor()
+                c.execute('SELECT phone FROM customer_refresh_queue ORDER BY marked_at LIMIT %s', (self.batch_size,))
+                candidates = sorted(row['phone'] for row in c.fetchall())
+                # Same lock order as the writers (see LOCK_CUSTOMERS_SQL): customers, then the queue.
+                # A writer still holding one of these customers makes us wait here instead of deadlocking.
+                c.execute(LOCK_CUSTOMERS_SQL, (candidates,))
+                c.execute('DELETE FROM customer_refresh_queue WHERE phone = ANY(%s) RETURNING phone', (candidates,))
+                # Another refresher may have taken some of them meanwhile
+                phones = [row['phone'] for row in c.fetchall()]
+                if phones:
+                    rebuild_customer_stats(phones, conn)
+                conn.commit()
+            refreshed += len(phones)
+            if len(candidates) < self.batch_size:
+                break
+        self.last_run_seconds = round(time.monotonic() - started, 3)
+        self.last_run_refreshed = refreshed
+        self.last_run_at = datetime.now(IST).strftime("%Y-%m-%d %H:%M:%S")
+        return refreshed
+
+    def backlog(self):
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('''
+                SELECT COUNT(*) AS n, EXTRACT(EPOCH FROM LOCALTIMESTAMP - MIN(marked_at)) AS oldest_age
+                FROM customer_refresh_queue
+            ''')
+            return c.fetchone()
+
+    def stats(self):
+        backlog = self.backlog()
+        return {
+            'running': bool(self._thread and self._thread.is_alive() and self._pid == os.getpid()),
+            'interval': self.interval,
+            'backlog': backlog['n'],
+            'oldest_dirty_seconds': round(float(backlog['oldest_age'] or 0), 1),
+            'last_run_at': self.last_run_at,
+            'last_run_seconds': self.last_run_seconds,
+            'last_run_refreshed': self.last_run_refreshed,
+            'last_error': self.last_error,
+        }
+
+customer_refresher = CustomerRefresher(CUSTOMER_REFRESH_INTERVAL, CUSTOMER_REFRESH_BATCH)
+
+@app.before_request
+def start_background_workers():
+    ingest_worker.ensure_started()
+    customer_refresher.ensure_started()
+
+# --- Webhook Dedup ---
+WEBHOOK_DEDUP_MAX_ENTRIES = int(os.getenv("WEBHOOK_DEDUP_MAX_ENTRIES", "10000"))  # in-memory LRU size
+WEBHOOK_DEDUP_RETENTION = float(os.getenv("WEBHOOK_DEDUP_RETENTION", "30"))      # days a key is kept on disk
+WEBHOOK_DEDUP_PRUNE_EVERY = 1000                                                 # writes between prunes
+
+# Shopify's id for one delivery; its retries repeat it. Shiprocket sends no
+# such header, so its redeliveries are caught by content hash only.
+SHOPIFY_DELIVERY_HEADER = 'X-Shopify-Webhook-Id'
+
+# Set by the normalizers at receive time, so they differ on every delivery
+WEBHOOK_VOLATILE_FIELDS = ('timestamp', 'created_at')
+
+def order_digest(order):
+    """Content hash of a normalized order, ignoring the fields stamped at receive time"""
+    content = {k: v for k, v in order.items() if k not in WEBHOOK_VOLATILE_FIELDS}
+    return hashlib.sha256(orjson.dumps(content, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+class WebhookDedup:
+    """Recognizes webhook deliveries that would not change anything we store.
+
+    Two kinds of key, both mapped to an order digest:
+      delivery:<source>:<id>  a delivery already accepted (a retry of it is dropped unread)
+      order:<order id>        the digest of the last content accepted for that order
+
+    Keys live in a small SQLite table next to the ingest queue, so they
+    survive restarts and are shared by the workers on one host, with a
+    bounded LRU in front of it. A key is written only once its order is on
+    the ingest queue. The order key is forgotten again when the message ends
+    up a dead letter, or when the stored order is deleted or edited by hand,
+    so the next delivery is applied. (Forgetting clears the LRU of this
+    process only; the app runs one gunicorn worker.)
+    """
+
+    def __init__(self, path, max_entries, retention_days):
+        self.path = path
+        self.max_entries = max_entries
+        self.retention = retention_days * 86400
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self._stats = {'delivery_hits': 0, 'content_hits': 0, 'misses': 0,
+                       'memory_hits': 0, 'table_hits': 0, 'forgotten': 0, 'evictions': 0}
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS webhook_dedup (
+                    key TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    seen_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_webhook_dedup_seen ON webhook_dedup(seen_at)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _bump(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _remember_locally(self, key, digest):
+        with self._lock:
+            self._entries[key] = digest
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _lookup(self, key):
+        with self._lock:
+            digest = self._entries.get(key)
+            if digest is not None:
+                self._entries.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return digest
+        row = self._conn().execute('SELECT digest FROM webhook_dedup WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        self._bump('table_hits')
+        self._remember_locally(key, row[0])
+        return row[0]
+
+    def seen_delivery(self, source, delivery_id):
+        """True if this delivery id was already accepted; counts the hit"""
+        if not delivery_id:
+            return False
+        if self._lookup(f"delivery:{source}:{delivery_id}") is None:
+            return False
+        self._bump('delivery_hits')
+        return True
+
+    def is_unchanged(self, order, digest):
+        """True if `digest` matches the last content accepted for this order; counts the lookup"""
+        if self._lookup(f"order:{order['id']}") == digest:
+            self._bump('content_hits')
+            return True
+        self._bump('misses')
+        return False
+
+    def remember(self, source, order, digest, delivery_id=None):
+        keys = [f"order:{order['id']}"]
+        if delivery_id:
+            keys.append(f"delivery:{source}:{delivery_id}")
+        now = time.time()
+        self._conn().executemany(
+            'INSERT INTO webhook_dedup (key, digest, seen_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET digest = excluded.digest, seen_at = excluded.seen_at',
+            [(key, digest, now) for key in keys]
+        )
+        for key in keys:
+            self._remember_locally(key, digest)
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % WEBHOOK_DEDUP_PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def forget(self, order_ids):
+        """Drop the content keys of orders that were deleted, edited by hand, or whose save was given up on
+
+        Best effort: callers run this after their Postgres commit, so a SQLite
+        failure is logged rather than raised.
+        """
+        keys = [f"order:{order_id}" for order_id in order_ids]
+        if not keys:
+            return
+        try:
+            conn = self._conn()
+            conn.execute('BEGIN')
+            try:
+                # One statement per key; a single IN (...) would overflow SQLite's variable limit on a big clear_all
+                conn.executemany('DELETE FROM webhook_dedup WHERE key = ?', [(key,) for key in keys])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error:
+            log.exception("Failed to forget webhook dedup keys", extra={'keys': len(keys)})
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+            self._stats['forgotten'] += len(keys)
+
+    def prune(self):
+        return self._conn().execute('DELETE FROM webhook_dedup WHERE seen_at < ?',
+                                    (time.time() - self.retention,)).rowcount
+
+    def stats(self):
+        stored = self._conn().execute('SELECT COUNT(*) FROM webhook_dedup').fetchone()[0]
+        with self._lock:
+            counters = dict(self._stats)
+            entries = len(self._entries)
+        deliveries = counters['delivery_hits'] + counters['content_hits'] + counters['misses']
+        duplicates = counters['delivery_hits'] + counters['content_hits']
+        return dict(counters,
+                    duplicate_ratio=round(duplicates / deliveries, 3) if deliveries else None,
+                    entries=entries, max_entries=self.max_entries,
+                    stored_keys=stored, retention_days=self.retention / 86400)
+
+webhook_dedup = WebhookDedup(INGEST_QUEUE_PATH, WEBHOOK_DEDUP_MAX_ENTRIES, WEBHOOK_DEDUP_RETENTION)
+
+def duplicate_delivery():
+    """Acknowledge a redelivery without queueing anything"""
+    return jsonify({"status": "duplicate"}), 200
+
+def enqueue_order(source, order, delivery_id=None):
+    """Queue a normalized order unless it is unchanged since the last delivery; returns a webhook response tuple"""
+    digest = order_digest(order)
+    if webhook_dedup.is_unchanged(order, digest):
+        if delivery_id:
+            webhook_dedup.remember(source, order, digest, delivery_id)
+        return duplicate_delivery()
+    if ingest_queue.depth() >= INGEST_HIGH_WATER:
+        ingest_queue.record_rejected()
+        return jsonify({"status": "busy"}), 429, {'Retry-After': str(INGEST_RETRY_AFTER)}
+    ingest_queue.enqueue(source, order)
+    webhook_dedup.remember(source, order, digest, delivery_id)
+    ingest_worker.notify()
+    return jsonify({"status": "received"}), 200
 
 # --- Webhooks (Public) ---
 @app.route('/webhook/shopify', methods=['POST'])
 def webhook_shopify():
-    order = normalize_shopify_order(request.json)
+    delivery_id = request.headers.get(SHOPIFY_DELIVERY_HEADER)
+    if webhook_dedup.seen_delivery('shopify', delivery_id):
+        return duplicate_delivery()
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"status": "invalid payload"}), 400
+    order = normalize_shopify_order(payload)
     if order:
-        save_order(order)
+        return enqueue_order('shopify', order, delivery_id)
     return jsonify({"status": "received"}), 200
 
 @app.route('/webhook/shiprocket', methods=['POST'])
 def webhook_shiprocket():
-    payload = request.json
-    print("=" * 80)
-    print("SHIPROCKET WEBHOOK RECEIVED:")
-    print(json.dumps(payload, indent=2))
-    print("=" * 80)
-    
-    # Check payment-related fields
-    payment_fields = {
-        'payment_method': payload.get('payment_method'),
-        'cod': payload.get('cod'),
-        'is_cod': payload.get('is_cod'),
-        'payment_gateway': payload.get('payment_gateway'),
-        'payment_mode': payload.get('payment_mode'),
-    }
-    print("PAYMENT FIELDS FOUND:")
-    print(json.dumps(payment_fields, indent=2))
-    print("=" * 80)
-    
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"status": "invalid payload"}), 400
+    # The payload is only serialized when DEBUG logging is on
+    log.debug("Shiprocket webhook received", extra={'payload': payload})
+
     order = normalize_shiprocket_order(payload)
     if order:
-        print(f"NORMALIZED ORDER - Payment Method: {order.get('payment_method')}")
-        save_order(order)
+        log.debug("Shiprocket order normalized", extra={
+            'order_id': order['id'], 'payment_method': order.get('payment_method'),
+            'payment_fields': {k: payload.get(k) for k in ('payment_method', 'cod', 'is_cod',
+                                                           'payment_gateway', 'payment_mode')},
+        })
+        return enqueue_order('shiprocket', order)
     return jsonify({"status": "received"}), 200
 
 # --- Debug (Protected) ---
 @app.route('/debug/seed')
 @basic_auth.required
 def seed_data():
-    save_order({
+    save_orders([{
         "id": "#1001", "customer_name": "Amit Sharma", "phone": "+919876543210",
         "email": "amit.sharma@example.com",
         "address": "123, MG Road, Bangalore",
         "state": "Karnataka",
         "payment_method": "Prepaid",
         "rto_risk": "LOW",
-        "source": "Shopify", "products": json.dumps(["Blue Shirt - M"]), "total": "1299.00",
+        "source": "Shopify", "products": ["Blue Shirt - M"], "total": "1299.00",
         "status": "Pending", "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "notes": "Called once, busy.",
         "delivery_type": "Standard"
-    })
-    save_order({
+    }, {
         "id": "#5521", "customer_name": "Priya Singh", "phone": "+919988776655",
         "email": "priya.singh@example.com",
         "address": "Green Apts, Mumbai",
         "state": "Maharashtra",
         "payment_method": "COD",
         "rto_risk": "MEDIUM",
-        "source": "Shiprocket", "products": json.dumps(["Wireless Earbuds"]), "total": "2499.00",
+        "source": "Shiprocket", "products": ["Wireless Earbuds"], "total": "2499.00",
         "status": "Call Again", "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "notes": "",
         "delivery_type": "Express"
-    })
+    }])
     return redirect(url_for('dashboard'))
 
+@app.route('/debug/webhook_dedup')
+@basic_auth.required
+def webhook_dedup_stats():
+    """Webhook redeliveries recognized by delivery id or unchanged content"""
+    return jsonify(webhook_dedup.stats())
+
+@app.route('/debug/refresher')
+@basic_auth.required
+def refresher_stats():
+    """Dirty-customer backlog and last refresh run"""
+    return jsonify(customer_refresher.stats())
+
+@app.route('/debug/rebuild_customers', methods=['POST'])
+@basic_auth.required
+def rebuild_customers_route():
+    """Recompute every customer's statistics from the orders table"""
+    return jsonify({'success': True, 'rebuilt': rebuild_customer_stats()})
+
+@app.cli.command('rebuild-customers')
+def rebuild_customers_command():
+    """Recompute every customer's statistics from the orders table."""
+    print(f"Rebuilt {rebuild_customer_stats()} customers.")
+
+@app.route('/debug/rebuild_daily_stats', methods=['POST'])
+@basic_auth.required
+def rebuild_daily_stats_route():
+    """Recompute the daily report rollup from the orders table"""
+    with get_db_connection() as conn:
+        rows = rebuild_daily_stats(conn)
+        conn.commit()
+    return jsonify({'success': True, 'rows': rows})
+
+@app.cli.command('rebuild-daily-stats')
+def rebuild_daily_stats_command():
+    """Recompute the daily report rollup from the orders table."""
+    with get_db_connection() as conn:
+        rows = rebuild_daily_stats(conn)
+        conn.commit()
+    print(f"Rebuilt {rows} daily stat rows.")
+
+@app.route('/metrics')
+@basic_auth.required
+def metrics():
+    """Request and query latency histograms of this process, in the Prometheus text format"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/pool')
+@basic_auth.required
+def pool_stats():
+    """Connection pool statistics"""
+    return jsonify(dict(db_pool.stats(), endpoints=db_endpoints.stats()))
+
+@app.route('/debug/queue')
+@basic_auth.required
+def queue_stats():
+    """Ingest queue depth, lag and worker status"""
+    return jsonify(dict(ingest_queue.stats(), worker=ingest_worker.stats()))
+
+@app.route('/debug/counts', methods=['GET', 'POST'])
+@basic_auth.required
+def order_counts():
+    """Maintained per-status totals and count cache stats; POST recounts the totals"""
+    if request.method == 'POST':
+        with get_db_connection() as conn:
+            rebuild_status_counts(conn)
+            conn.commit()
+        filtered_count_cache.clear()
+        facet_cache.clear()
+    return jsonify({'status_counts': get_status_counts(), 'filtered_cache': filtered_count_cache.stats(),
+                    'facet_cache': facet_cache.stats()})
+
+@app.route('/debug/view_cache', methods=['GET', 'POST'])
+@basic_auth.required
+def view_cache_stats():
+    """Status view result cache hit/miss stats and the data version listener; POST empties the cache"""
+    if request.method == 'POST':
+        view_cache.clear()
+    return jsonify({'cache': view_cache.stats(), 'listener': data_version_listener.stats()})
+
+@app.route('/debug/export_cache', methods=['GET', 'POST'])
+@basic_auth.required
+def export_cache_stats():
+    """Export artifact cache and job stats; POST deletes every cached artifact"""
+    if request.method == 'POST':
+        export_cache.clear()
+    return jsonify(dict(export_cache.stats(), runner=export_jobs.stats(), data_version=get_data_version()))
+
 # --- Customer Routes ---
 @app.route('/customers')
 @basic_auth.required
@@ -1234,17 +4102,16 @@ def customers_page():
     
     # Get customer stats
     try:
-        conn = get_db_connection()
-        c = conn.cursor()
-        c.execute('''
-            SELECT 
-                COUNT(*) as total_customers,
-                COUNT(*) FILTER (WHERE total_orders > 1) as repeat_customers,
-                COALESCE(AVG(total_spent), 0) as avg_lifetime_value
-            FROM customers
-        ''')
-        stats = c.fetchone()
-        conn.close()
+        with get_db_connection() as conn:
+            c = conn.cursor()
+            c.execute('''
+                SELECT 
+                    COUNT(*) as total_customers,
+                    COUNT(*) FILTER (WHERE total_orders > 1) as repeat_customers,
+                    COALESCE(AVG(total_spent), 0) as avg_lifetime_value
+                FROM customers
+            ''')
+            stats = c.fetchone()
     except:
         stats = {'total_customers': 0, 'repeat_customers': 0, 'avg_lifetime_value': 0}
     
@@ -1268,13 +4135,67 @@ def get_customer_api(phone):
 @basic_auth.required
 def get_customer_orders(phone):
     """Get all orders for a customer"""
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('SELECT * FROM orders WHERE phone = %s ORDER BY timestamp DESC', (phone,))
-    orders = c.fetchall()
-    conn.close()
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f'SELECT {CUSTOMER_ORDER_COLUMNS} FROM orders WHERE phone = %s ORDER BY created_at DESC', (phone,))
+        orders = c.fetchall()
     return jsonify([dict(order) for order in orders])
 
+def get_order_details(order_id):
+    """The full order row, with products decoded, and its customer's address history and notes"""
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute('SELECT * FROM orders WHERE id = %s', (order_id,))
+        order = c.fetchone()
+        if not order:
+            return None
+        c.execute('''
+            SELECT phone, name, addresses, states, tags, notes, total_orders, confirmed_orders, cancelled_orders, total_spent
+            FROM customers WHERE phone = %s
+        ''', (order['phone'],))
+        customer = c.fetchone()
+    order = dict(order)
+    if customer:
+        customer = dict(customer)
+        for field in ('addresses', 'states', 'tags'):
+            try:
+                customer[field] = orjson.loads(customer[field] or '[]')
+            except orjson.JSONDecodeError:
+                customer[field] = []
+    return {'order': order, 'customer': customer}
+
+@app.route('/api/order/<order_id>')
+@basic_auth.required
+def get_order_api(order_id):
+    """Full order details (notes, address, customer address history) for an expanded list row"""
+    details = get_order_details(order_id)
+    if not details:
+        return jsonify({'error': 'Order not found'}), 404
+    return jsonify(details)
+
+@app.route('/api/order/<order_id>/card')
+@basic_auth.required
+def order_card(order_id):
+    """One dashboard order card as HTML, for inserting an order the live feed reports"""
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f'SELECT {ORDER_LIST_COLUMNS} FROM orders WHERE id = %s', (order_id,))
+        order = c.fetchone()
+    if not order:
+        return jsonify({'error': 'Order not found'}), 404
+    return render_template('_order_card.html', order=order, view=request.args.get('view', order['status']))
+
+@app.route('/viewer/order/<order_id>')
+def viewer_order_api(order_id):
+    """Full order details for the packing viewer"""
+    auth = request.authorization
+    if not auth or not check_viewer_auth(auth.username, auth.password):
+        return Response('Viewer login required', 401, {'WWW-Authenticate': 'Basic realm="Viewer Login"'})
+    details = get_order_details(order_id)
+    if not details:
+        return jsonify({'error': 'Order not found'}), 404
+    return jsonify(details)
+
 @app.route('/api/customer/<phone>/notes', methods=['POST'])
 @basic_auth.required
 def add_customer_note(phone):
@@ -1283,27 +4204,41 @@ def add_customer_note(phone):
     if not note:
         return jsonify({'error': 'Note required'}), 400
     
-    conn = get_db_connection()
-    c = conn.cursor()
+    with get_db_connection() as conn:
+        c = conn.cursor()
     
-    # Get existing notes
-    c.execute('SELECT notes FROM customers WHERE phone = %s', (phone,))
-    customer = c.fetchone()
+        # Get existing notes
+        c.execute('SELECT notes FROM customers WHERE phone = %s', (phone,))
+        customer = c.fetchone()
     
-    if not customer:
-        return jsonify({'error': 'Customer not found'}), 404
+        if not customer:
+            return jsonify({'error': 'Customer not found'}), 404
     
-    # Append new note with timestamp
-    existing_notes = customer['notes'] or ''
-    timestamp = datetime.now(IST).strftime('%Y-%m-%d %H:%M:%S')
-    new_note = f"[{timestamp}] {note}"
-    updated_notes = f"{existing_notes}\n{new_note}" if existing_notes else new_note
+        # Append new note with timestamp
+        existing_notes = customer['notes'] or ''
+        timestamp = datetime.now(IST).strftime('%Y-%m-%d %H:%M:%S')
+        new_note = f"[{timestamp}] {note}"
+        updated_notes = f"{existing_notes}\n{new_note}" if existing_notes else new_note
     
-    c.execute('UPDATE customers SET notes = %s WHERE phone = %s', (updated_notes, phone))
-    conn.commit()
-    conn.close()
+        c.execute('UPDATE customers SET notes = %s WHERE phone = %s', (updated_notes, phone))
+        conn.commit()
     
     return jsonify({'success': True})
 
+@app.route('/api/search')
+@basic_auth.required
+def api_search():
+    """Type-ahead search: ?q=term&type=orders|customers&limit=N, best matches first"""
+    term = (request.args.get('q') or '').strip()
+    kind = request.args.get('type', 'orders')
+    if kind not in SEARCH_TARGETS:
+        return jsonify({'error': f"type must be one of: {', '.join(SEARCH_TARGETS)}"}), 400
+    limit = min(max(request.args.get('limit', SEARCH_SUGGEST_LIMIT, type=int), 1), SEARCH_SUGGEST_MAX)
+    if not term:
+        return jsonify({'query': term, 'type': kind, 'results': []})
+
+    results = search_suggestions(kind, term, limit)
+    return jsonify({'query': term, 'type': kind, 'results': [dict(row) for row in results]})
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,69 @@
+"""Benchmark: money aggregates over TEXT `total` (regex-parsed per row) vs the numeric `amount` column.
+
+Builds a TEMP table of synthetic orders against DATABASE_URL (dropped with the
+session, nothing is written to the real tables) and times the per-customer
+confirmed-spend aggregate both ways.
+
+    python bench_amount_aggregates.py [rows]
+"""
+import sys
+import time
+
+from app import get_db_connection
+
+REGEX_SPENT = '''
+    SELECT phone, COALESCE(SUM(CASE
+        WHEN status = 'Confirmed' AND total IS NOT NULL AND total != ''
+        THEN CAST(NULLIF(REGEXP_REPLACE(total, '[^0-9.]', '', 'g'), '') AS DECIMAL(10,2))
+        ELSE 0
+    END), 0) AS spent
+    FROM bench_orders GROUP BY phone
+'''
+
+AMOUNT_SPENT = '''
+    SELECT phone, COALESCE(SUM(amount) FILTER (WHERE status = 'Confirmed'), 0) AS spent
+    FROM bench_orders GROUP BY phone
+'''
+
+RUNS = 3
+
+
+def best_of(c, query):
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        c.execute(query)
+        c.fetchall()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(rows):
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        try:
+            print(f"Generating {rows} synthetic orders...")
+            c.execute('''
+                CREATE TEMP TABLE bench_orders AS
+                SELECT '+9190' || lpad((g %% 50000)::text, 6, '0') AS phone,
+                       (ARRAY['Pending', 'Confirmed', 'Cancelled', 'Call Again'])[1 + g %% 4] AS status,
+                       '₹' || to_char((g %% 5000) + 99.5, 'FM9,999,990.00') AS total,
+                       ((g %% 5000) + 99.5)::numeric(12,2) AS amount
+                FROM generate_series(1, %s) g
+            ''', (rows,))
+            c.execute('ANALYZE bench_orders')
+
+            regex_time = best_of(c, REGEX_SPENT)
+            amount_time = best_of(c, AMOUNT_SPENT)
+            print(f"REGEXP_REPLACE(total) aggregate : {regex_time * 1000:8.1f} ms")
+            print(f"SUM(amount) aggregate           : {amount_time * 1000:8.1f} ms")
+            print(f"speedup                         : {regex_time / amount_time:8.1f}x")
+
+            c.execute(f'SELECT COUNT(*) AS n FROM ({REGEX_SPENT} EXCEPT {AMOUNT_SPENT}) diff')
+            print(f"customers with differing totals : {c.fetchone()['n']}")
+        finally:
+            conn.rollback()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
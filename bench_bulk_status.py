@@ -0,0 +1,59 @@
+"""Benchmark: confirming N selected orders, one /update_status POST each vs one /bulk_update_status call.
+
+Saves N synthetic Pending orders to DATABASE_URL with save_orders() (so the
+customer and count aggregates stay consistent), confirms them both ways
+through the Flask test client, and deletes them again with /bulk_delete. The
+per-order path follows each redirect back to the dashboard, as the browser
+did before the dashboard posted in the background.
+
+    python bench_bulk_status.py [orders]
+"""
+import os
+import sys
+import time
+import base64
+from datetime import datetime
+
+from app import app, save_orders
+
+USERNAME = os.getenv("BASIC_AUTH_USERNAME", "admin")
+PASSWORD = os.getenv("BASIC_AUTH_PASSWORD", "admin123")
+HEADERS = {'Authorization': 'Basic ' + base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()}
+
+
+def make_orders(n):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return [{
+        "id": f"#BENCH-{i}", "customer_name": f"Bench Customer {i}", "phone": f"+9190000{i % 100:05d}",
+        "email": f"bench{i}@example.com", "address": "1, Bench Street, Pune, 411001", "state": "Maharashtra",
+        "payment_method": "COD" if i % 3 == 0 else "Prepaid", "rto_risk": "LOW", "source": "Shopify",
+        "products": ["Blue Shirt - M (Qty: 1)"], "total": "1299.00", "status": "Pending",
+        "timestamp": now, "notes": "", "delivery_type": "Standard",
+    } for i in range(n)]
+
+
+def run(n):
+    client = app.test_client()
+    order_ids = [order['id'] for order in make_orders(n)]
+    save_orders(make_orders(n))
+    try:
+        start = time.perf_counter()
+        for order_id in order_ids:
+            response = client.post('/update_status', data={'order_id': order_id, 'status': 'Confirmed'},
+                                   headers=dict(HEADERS, Referer='/'), follow_redirects=True)
+            assert response.status_code == 200, response.status_code
+        single = time.perf_counter() - start
+        print(f"{n} x /update_status + dashboard render : {single:7.2f} s")
+
+        client.post('/bulk_update_status', json={'order_ids': order_ids, 'status': 'Pending'}, headers=HEADERS)
+        start = time.perf_counter()
+        response = client.post('/bulk_update_status', json={'order_ids': order_ids, 'status': 'Confirmed'}, headers=HEADERS)
+        bulk = time.perf_counter() - start
+        assert response.get_json()['updated'] == n, response.get_json()
+        print(f"1 x /bulk_update_status ({n} orders)      : {bulk:7.2f} s  ({single / bulk:.0f}x faster)")
+    finally:
+        client.post('/bulk_delete', json={'order_ids': order_ids}, headers=HEADERS)
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
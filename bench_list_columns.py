@@ -0,0 +1,74 @@
+"""Benchmark: bytes read from Postgres per list page, SELECT * vs the projected list columns.
+
+Builds TEMP `orders` and `customers` tables (they shadow the real ones for this
+session only and are dropped on rollback) filled with synthetic rows whose
+notes carry appended WhatsApp messages. It then sizes one dashboard page, one
+packing-viewer list and the customers page both ways. Size is the text-format
+payload of the returned rows, which is what libpq receives apart from
+per-field headers.
+
+    python bench_list_columns.py [rows] [notes_kb]
+"""
+import sys
+
+from app import get_db_connection, ORDER_LIST_COLUMNS, CUSTOMER_LIST_COLUMNS
+
+PAGE_SIZE = 50
+VIEWER_ROWS = 1000
+
+
+def payload_bytes(c, query):
+    c.execute(f'SELECT COALESCE(SUM(octet_length(q::text)), 0) AS n, COUNT(*) AS rows FROM ({query}) q')
+    row = c.fetchone()
+    return row['n'], row['rows']
+
+
+def run(rows, notes_kb):
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        try:
+            print(f"Generating {rows} synthetic orders with ~{notes_kb} KB of notes each...")
+            c.execute('CREATE TEMP TABLE orders (LIKE public.orders INCLUDING DEFAULTS INCLUDING GENERATED)')
+            c.execute('CREATE TEMP TABLE customers (LIKE public.customers INCLUDING DEFAULTS)')
+            c.execute('''
+                INSERT INTO orders (id, customer_name, email, phone, address, source, products, total, amount,
+                                    status, timestamp, created_at, notes, delivery_type, state, payment_method,
+                                    rto_risk, is_packed)
+                SELECT '#' || g, 'Bench Customer ' || g, 'bench' || g || '@example.com', '+9190000' || (g %% 20000),
+                       g || ', Bench Street, Near City Mall, Kothrud, Pune, Maharashtra, 411038', 'Shopify',
+                       '["Blue Shirt - M (Qty: 1)", "Black Jeans - 32 (Qty: 1)"]', '2598.00', 2598,
+                       (ARRAY['Pending', 'Confirmed'])[1 + g %% 2], to_char(now(), 'YYYY-MM-DD HH24:MI:SS'), now(),
+                       repeat('[2024-05-01 10:00:00] WhatsApp: Customer replied CONFIRM, asked for delivery by Friday. ',
+                              (%s * 1024) / 90),
+                       'Standard', 'Maharashtra', 'COD', 'LOW', g %% 4 = 0
+                FROM generate_series(1, %s) g
+            ''', (notes_kb, rows))
+            c.execute('''
+                INSERT INTO customers (phone, name, email, total_orders, confirmed_orders, cancelled_orders,
+                                       total_spent, last_order_date, addresses, states, tags, notes)
+                SELECT phone, MIN(customer_name), MIN(email), COUNT(*), COUNT(*) FILTER (WHERE status = 'Confirmed'), 0,
+                       SUM(amount), now(), json_agg(address)::text, '["Maharashtra"]', '[]', MIN(notes)
+                FROM orders GROUP BY phone
+            ''')
+            c.execute('ANALYZE orders')
+            c.execute('ANALYZE customers')
+
+            pages = [
+                ('dashboard page', "FROM orders WHERE status = 'Pending' ORDER BY order_seq DESC, id DESC LIMIT %d" % PAGE_SIZE,
+                 ORDER_LIST_COLUMNS),
+                (f'viewer list ({VIEWER_ROWS})', "FROM orders WHERE status = 'Confirmed' AND is_packed IS NOT TRUE "
+                 "ORDER BY order_seq DESC, id DESC LIMIT %d" % VIEWER_ROWS, ORDER_LIST_COLUMNS),
+                ('customers page', 'FROM customers ORDER BY last_order_date DESC', CUSTOMER_LIST_COLUMNS),
+            ]
+            for label, rest, columns in pages:
+                before, n = payload_bytes(c, f'SELECT * {rest}')
+                after, _ = payload_bytes(c, f'SELECT {columns} {rest}')
+                print(f"{label:<20}: {n:>6} rows, SELECT * {before / 1024:9.1f} KB -> projected {after / 1024:8.1f} KB "
+                      f"({before / max(after, 1):.1f}x less)")
+        finally:
+            conn.rollback()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 4)
@@ -0,0 +1,74 @@
+"""Benchmark: PDF export time for N orders, the old single-pass FPDF loop vs build_orders_pdf().
+
+Uses synthetic rows (no database needed). The old path is the previous
+/export/pdf body: one FPDF document, clean()/trunc() closures per row, and
+FPDF's string-concatenating output buffer. The new path renders table pages in
+PDF_CHUNK_PAGES chunks (in a process pool when PDF_WORKERS > 1) and joins them.
+
+    python bench_pdf_export.py [rows] [--skip-old]
+"""
+import sys
+import time
+
+from fpdf import FPDF
+
+import app
+from app import build_orders_pdf, PDF_COLUMNS
+
+
+def synthetic_rows(n):
+    for i in range(n):
+        yield (f"#{100000 + i}", f"Bench Customer {i}", f"+9190000{i % 100000:05d}", "Maharashtra",
+               "COD" if i % 3 == 0 else "Prepaid", "Confirmed", "Standard", "1299.00",
+               '["Blue Shirt - M (Qty: 1)", "Black Jeans - 32 (Qty: 1)"]')
+
+
+def old_pdf(n):
+    pdf = FPDF(orientation='L', unit='mm', format='A4')
+    pdf.add_page()
+    pdf.set_font("Arial", 'B', 10)
+    for header, width in PDF_COLUMNS:
+        pdf.cell(width, 10, header, border=1, fill=True, align='C')
+    pdf.ln()
+    pdf.set_font("Arial", size=9)
+    for order_id, name, phone, state, payment, status, delivery, total, products in synthetic_rows(n):
+        def clean(text):
+            return str(text or "").encode('latin-1', 'replace').decode('latin-1')
+
+        def trunc(text, length=25):
+            t = clean(text)
+            return t[:length] + "..." if len(t) > length else t
+
+        products_str = clean(products).replace('[', '').replace(']', '').replace('"', '')
+        h = 8
+        pdf.cell(PDF_COLUMNS[0][1], h, clean(order_id), border=1)
+        pdf.cell(PDF_COLUMNS[1][1], h, trunc(name, 18), border=1)
+        pdf.cell(PDF_COLUMNS[2][1], h, clean(phone), border=1)
+        pdf.cell(PDF_COLUMNS[3][1], h, trunc(state, 12), border=1)
+        pdf.cell(PDF_COLUMNS[4][1], h, clean(payment), border=1)
+        pdf.cell(PDF_COLUMNS[5][1], h, clean(status), border=1)
+        pdf.cell(PDF_COLUMNS[6][1], h, clean(delivery), border=1)
+        pdf.cell(PDF_COLUMNS[7][1], h, clean(total), border=1)
+        pdf.cell(PDF_COLUMNS[8][1], h, trunc(products_str, 45), border=1)
+        pdf.ln()
+    return pdf.output(dest='S').encode('latin-1')
+
+
+def new_pdf(n):
+    summary = [{'dimension': 'status', 'value': 'Confirmed', 'orders': n, 'amount': 1299 * n}]
+    return build_orders_pdf("Benchmark", summary, synthetic_rows(n))
+
+
+def timed(label, build, n):
+    start = time.perf_counter()
+    data = build(n)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28}: {elapsed:7.2f} s, {n / elapsed:8.0f} rows/sec, {len(data) / 1024 / 1024:5.1f} MB")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    rows = int(args[0]) if args else 50000
+    if '--skip-old' not in sys.argv:
+        timed("old single-pass FPDF", old_pdf, rows)
+    timed(f"chunked, {app.PDF_WORKERS} worker(s)", new_pdf, rows)
@@ -0,0 +1,67 @@
+"""Benchmark: orders/sec for the batched order upsert at different batch sizes.
+
+Runs against DATABASE_URL inside a transaction that is rolled back at the end,
+so no benchmark rows are left behind. Customer profile updates are not included;
+this measures the orders upsert only.
+
+    python bench_save_orders.py [total_orders]
+"""
+import sys
+import time
+import json
+from datetime import datetime
+
+from app import get_db_connection, upsert_orders
+
+BATCH_SIZES = [1, 10, 100, 1000]
+
+
+def make_orders(n, prefix):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return [{
+        "id": f"#BENCH-{prefix}-{i}", "customer_name": f"Bench Customer {i}", "phone": f"+9190000{i % 5000:05d}",
+        "email": f"bench{i}@example.com", "address": "1, Bench Street, Pune, 411001", "state": "Maharashtra",
+        "payment_method": "COD" if i % 3 == 0 else "Prepaid", "rto_risk": "MEDIUM", "source": "Shopify",
+        "products": json.dumps(["Blue Shirt - M (Qty: 1)"]), "total": "1299.00", "status": "Pending",
+        "timestamp": now, "notes": "", "delivery_type": "Standard",
+    } for i in range(n)]
+
+
+def legacy_save(c, order):
+    """The old read-then-write path, one order per round trip pair"""
+    c.execute('SELECT notes, delivery_type, state, payment_method, email, rto_risk FROM orders WHERE id = %s', (order['id'],))
+    c.fetchone()
+    c.execute('''
+        INSERT INTO orders (id, customer_name, email, phone, address, source, products, total, status, timestamp, notes, delivery_type, state, payment_method, rto_risk)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (id) DO UPDATE SET customer_name = EXCLUDED.customer_name
+    ''', tuple(order[k] for k in ('id', 'customer_name', 'email', 'phone', 'address', 'source', 'products', 'total',
+                                 'status', 'timestamp', 'notes', 'delivery_type', 'state', 'payment_method', 'rto_risk')))
+
+
+def run(total):
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        try:
+            orders = make_orders(total, 'legacy')
+            start = time.perf_counter()
+            for order in orders:
+                legacy_save(c, order)
+            elapsed = time.perf_counter() - start
+            print(f"legacy read-then-write      : {total / elapsed:10.0f} orders/sec")
+
+            for size in BATCH_SIZES:
+                # Insert pass, then an update pass over the same ids (the redelivery case)
+                orders = make_orders(total, f"b{size}")
+                for label in ('insert', 'update'):
+                    start = time.perf_counter()
+                    for i in range(0, total, size):
+                        upsert_orders(conn, orders[i:i + size])
+                    elapsed = time.perf_counter() - start
+                    print(f"save_orders batch={size:<5} {label}: {total / elapsed:10.0f} orders/sec")
+        finally:
+            conn.rollback()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,86 @@
+"""Benchmark: order search latency, per-column ILIKE vs the indexed search expression.
+
+Builds a TEMP table of synthetic orders against DATABASE_URL (dropped with the
+session) and times the old four-column ILIKE filter, the single-expression
+filter get_orders() now uses, and the ranked type-ahead query. If pg_trgm is
+installed the expression and type-ahead queries are timed again with the GIN
+trigram index in place; otherwise only the fallback path is measured.
+
+    python bench_search.py [rows]
+"""
+import sys
+import time
+
+from app import get_db_connection, ORDER_SEARCH_SQL, search_pattern
+
+TERMS = ['sharma', '98765', 'gmail', 'pune', 'rahl']
+RUNS = 5
+
+LEGACY_FILTER = '''
+    SELECT COUNT(*) FROM bench_orders
+    WHERE customer_name ILIKE %(pattern)s OR phone ILIKE %(pattern)s
+       OR email ILIKE %(pattern)s OR address ILIKE %(pattern)s
+'''
+EXPR_FILTER = f'SELECT COUNT(*) FROM bench_orders WHERE {ORDER_SEARCH_SQL} ILIKE %(pattern)s'
+TYPEAHEAD_ILIKE = f'''
+    SELECT id FROM bench_orders WHERE {ORDER_SEARCH_SQL} ILIKE %(pattern)s
+    ORDER BY (customer_name ILIKE %(prefix)s OR phone ILIKE %(prefix)s) DESC, id DESC LIMIT 10
+'''
+TYPEAHEAD_TRGM = f'''
+    SELECT id FROM bench_orders
+    WHERE {ORDER_SEARCH_SQL} ILIKE %(pattern)s OR %(term)s <%% {ORDER_SEARCH_SQL}
+    ORDER BY word_similarity(%(term)s, {ORDER_SEARCH_SQL}) DESC, id DESC LIMIT 10
+'''
+
+
+def median_ms(c, query):
+    timings = []
+    for term in TERMS:
+        params = {'term': term, 'pattern': search_pattern(term), 'prefix': search_pattern(term, prefix=True)}
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            c.execute(query, params)
+            c.fetchall()
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+def run(rows):
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        try:
+            print(f"Generating {rows} synthetic orders...")
+            c.execute('''
+                CREATE TEMP TABLE bench_orders AS
+                SELECT g AS id,
+                       (ARRAY['Rahul', 'Priya', 'Amit', 'Sneha', 'Vikram'])[1 + g %% 5] || ' ' ||
+                       (ARRAY['Sharma', 'Verma', 'Iyer', 'Reddy', 'Khan', 'Das'])[1 + g %% 6] || ' ' || g AS customer_name,
+                       '+91' || (9000000000 + g::bigint * 7919 %% 999999999)::text AS phone,
+                       'user' || g || (ARRAY['@gmail.com', '@yahoo.in', '@outlook.com'])[1 + g %% 3] AS email,
+                       g || ', Street ' || (g %% 97) || ', ' ||
+                       (ARRAY['Pune', 'Delhi', 'Chennai', 'Kolkata'])[1 + g %% 4] AS address
+                FROM generate_series(1, %s) g
+            ''', (rows,))
+            c.execute('ANALYZE bench_orders')
+
+            print(f"per-column ILIKE (before)   : {median_ms(c, LEGACY_FILTER):8.2f} ms")
+            print(f"expression ILIKE, no index  : {median_ms(c, EXPR_FILTER):8.2f} ms")
+            print(f"type-ahead, ILIKE fallback  : {median_ms(c, TYPEAHEAD_ILIKE):8.2f} ms")
+
+            c.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') AS installed")
+            if not c.fetchone()['installed']:
+                print("pg_trgm is not installed; skipping the trigram index measurements")
+                return
+            start = time.perf_counter()
+            c.execute(f'CREATE INDEX ON bench_orders USING gin ({ORDER_SEARCH_SQL} gin_trgm_ops)')
+            c.execute('ANALYZE bench_orders')
+            print(f"trigram index build         : {(time.perf_counter() - start) * 1000:8.0f} ms")
+            print(f"expression ILIKE, trigram   : {median_ms(c, EXPR_FILTER):8.2f} ms")
+            print(f"type-ahead, trigram ranked  : {median_ms(c, TYPEAHEAD_TRGM):8.2f} ms")
+        finally:
+            conn.rollback()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 500000)
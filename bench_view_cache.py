@@ -0,0 +1,50 @@
+"""Benchmark: dashboard reloads/sec with and without the view result cache.
+
+Requests the given status view through the Flask test client against
+DATABASE_URL, first with the cache disabled (every request runs the count,
+page and customer-enrichment queries), then with it enabled (everything after
+the first request is served from view_cache until an order changes).
+
+    python bench_view_cache.py [requests] [path]
+"""
+import os
+import sys
+import time
+import base64
+
+from app import app, view_cache, data_version_listener
+
+USERNAME = os.getenv("BASIC_AUTH_USERNAME", "admin")
+PASSWORD = os.getenv("BASIC_AUTH_PASSWORD", "admin123")
+HEADERS = {'Authorization': 'Basic ' + base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()}
+
+
+def reloads_per_sec(client, path, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        response = client.get(path, headers=HEADERS)
+        assert response.status_code == 200, response.status_code
+    return n / (time.perf_counter() - start)
+
+
+def run(n, path):
+    client = app.test_client()
+    data_version_listener.current()
+    for _ in range(50):
+        if data_version_listener.version is not None:
+            break
+        time.sleep(0.1)
+
+    max_entries = view_cache.max_entries
+    view_cache.max_entries = 0
+    print(f"{path} uncached : {reloads_per_sec(client, path, n):8.1f} reloads/sec")
+    view_cache.max_entries = max_entries
+    view_cache.clear()
+    view_cache.hits = view_cache.misses = 0
+    print(f"{path} cached   : {reloads_per_sec(client, path, n):8.1f} reloads/sec "
+          f"(hit ratio {view_cache.stats()['hit_ratio']})")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        sys.argv[2] if len(sys.argv) > 2 else '/')
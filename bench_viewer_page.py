@@ -0,0 +1,90 @@
+"""Benchmark: rows/sec loading a 1000-row packing-viewer page, TEXT products + json.loads vs JSONB.
+
+Builds TEMP copies of the orders table against DATABASE_URL (dropped with the
+session) holding the same synthetic rows, once with products as TEXT and once
+as JSONB, and times fetching a viewer page into Python-ready rows:
+
+  TEXT + json.loads loop : the old viewer path, SELECT * then json.loads per row
+  JSONB, stdlib json     : psycopg2 decoding JSONB with json.loads
+  JSONB, orjson          : psycopg2 decoding JSONB with orjson (what app.py registers)
+
+    python bench_viewer_page.py [rows] [runs]
+"""
+import sys
+import json
+import time
+
+import orjson
+from psycopg2.extras import register_default_jsonb
+
+from app import get_db_connection, ORDER_LIST_COLUMNS
+
+PAGE_ROWS = 1000
+PAGE_WHERE = "WHERE status = 'Confirmed' AND is_packed IS NOT TRUE ORDER BY order_seq DESC, id DESC LIMIT %d" % PAGE_ROWS
+
+
+def legacy_page(c):
+    c.execute(f'SELECT * FROM bench_text {PAGE_WHERE}')
+    orders = []
+    for row in c.fetchall():
+        order = dict(row)
+        try:
+            order['products'] = json.loads(order['products'])
+        except:
+            order['products'] = []
+        orders.append(order)
+    return orders
+
+
+def jsonb_page(c):
+    c.execute(f'SELECT {ORDER_LIST_COLUMNS} FROM bench_jsonb {PAGE_WHERE}')
+    return c.fetchall()
+
+
+def rows_per_sec(page, c, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        rows = page(c)
+        timings.append(time.perf_counter() - start)
+    assert len(rows) == PAGE_ROWS and isinstance(rows[0]['products'], list)
+    return PAGE_ROWS / min(timings)
+
+
+def run(rows, runs):
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        try:
+            print(f"Generating {rows} synthetic orders...")
+            c.execute('CREATE TEMP TABLE bench_jsonb (LIKE public.orders INCLUDING DEFAULTS INCLUDING GENERATED)')
+            c.execute('''
+                INSERT INTO bench_jsonb (id, customer_name, email, phone, address, source, products, total, amount,
+                                         status, timestamp, created_at, notes, delivery_type, state, payment_method,
+                                         rto_risk, is_packed)
+                SELECT '#' || g, 'Bench Customer ' || g, 'bench' || g || '@example.com', '+9190000' || (g %% 20000),
+                       g || ', Bench Street, Kothrud, Pune, Maharashtra, 411038', 'Shopify',
+                       (SELECT jsonb_agg(format('Product %%s - Size M (Qty: %%s)', g + i, 1 + i %% 3))
+                        FROM generate_series(1, 1 + g %% 5) i),
+                       '2598.00', 2598, 'Confirmed', to_char(now(), 'YYYY-MM-DD HH24:MI:SS'), now(),
+                       'Customer confirmed on WhatsApp', 'Standard', 'Maharashtra', 'COD', 'LOW', g %% 2 = 0
+                FROM generate_series(1, %s) g
+            ''', (rows,))
+            c.execute('CREATE TEMP TABLE bench_text AS SELECT * FROM bench_jsonb')
+            c.execute('ALTER TABLE bench_text ALTER COLUMN products TYPE TEXT USING products::text')
+            c.execute('CREATE INDEX ON bench_jsonb (order_seq DESC, id DESC)')
+            c.execute('CREATE INDEX ON bench_text (order_seq DESC, id DESC)')
+            c.execute('ANALYZE bench_jsonb')
+            c.execute('ANALYZE bench_text')
+
+            print(f"TEXT + json.loads loop : {rows_per_sec(legacy_page, c, runs):10.0f} rows/sec")
+            register_default_jsonb(c, loads=json.loads)
+            print(f"JSONB, stdlib json     : {rows_per_sec(jsonb_page, c, runs):10.0f} rows/sec")
+            register_default_jsonb(c, loads=orjson.loads)
+            print(f"JSONB, orjson          : {rows_per_sec(jsonb_page, c, runs):10.0f} rows/sec")
+        finally:
+            conn.rollback()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20)
@@ -0,0 +1,74 @@
+"""Benchmark: redelivering N unchanged Shopify orders with and without the webhook dedup layer.
+
+Posts N synthetic orders to /webhook/shopify through the Flask test client
+against DATABASE_URL and drains the ingest queue into Postgres, then sends
+the same N orders again twice, timing webhook + drain each time:
+
+  dedup off : the order keys are forgotten first, so every redelivery is
+              queued and upserted, redoing the customer and count deltas
+  dedup on  : each redelivery is recognized by content hash and acknowledged
+              without queueing anything
+
+The orders are deleted again with /bulk_delete.
+
+    python bench_webhook_dedup.py [orders]
+"""
+import os
+import sys
+import time
+import base64
+
+from app import app, ingest_queue, ingest_worker, webhook_dedup
+
+USERNAME = os.getenv("BASIC_AUTH_USERNAME", "admin")
+PASSWORD = os.getenv("BASIC_AUTH_PASSWORD", "admin123")
+HEADERS = {'Authorization': 'Basic ' + base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()}
+
+
+def make_payloads(n):
+    return [{
+        "name": f"#BENCH-{i}", "customer": {"first_name": "Bench", "last_name": f"Customer {i}",
+                                           "email": f"bench{i}@example.com"},
+        "shipping_address": {"address1": "1, Bench Street", "city": "Pune", "zip": "411001",
+                             "province": "Maharashtra", "phone": f"+9190000{i % 100:05d}"},
+        "line_items": [{"name": "Blue Shirt - M", "quantity": 1}], "total_price": "1299.00",
+        "gateway": "Cash on Delivery (COD)" if i % 3 == 0 else "razorpay", "tags": "",
+    } for i in range(n)]
+
+
+def deliver(client, payloads):
+    """Post every payload and drain the queue; returns (seconds, responses by status)"""
+    start = time.perf_counter()
+    statuses = {}
+    for payload in payloads:
+        response = client.post('/webhook/shopify', json=payload)
+        assert response.status_code == 200, response.status_code
+        status = response.get_json()['status']
+        statuses[status] = statuses.get(status, 0) + 1
+    while ingest_queue.depth():
+        ingest_worker.drain_once()
+    return time.perf_counter() - start, statuses
+
+
+def run(n):
+    client = app.test_client()
+    payloads = make_payloads(n)
+    order_ids = [payload['name'] for payload in payloads]
+    webhook_dedup.forget(order_ids)
+    try:
+        deliver(client, payloads)
+
+        webhook_dedup.forget(order_ids)
+        off, statuses = deliver(client, payloads)
+        print(f"{n} redeliveries, dedup off : {off:7.2f} s  {statuses}")
+
+        on, statuses = deliver(client, payloads)
+        print(f"{n} redeliveries, dedup on  : {on:7.2f} s  {statuses}  ({off / on:.1f}x faster)")
+        print(webhook_dedup.stats())
+    finally:
+        client.post('/bulk_delete', json={'order_ids': order_ids}, headers=HEADERS)
+        webhook_dedup.forget(order_ids)
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,77 @@
+"""Benchmark: Excel export rows/sec and peak RSS, regular vs write-only openpyxl workbook.
+
+Each variant runs in its own process on synthetic order rows (no database
+needed), so peak RSS is measured separately for each. The regular variant is
+the old export: all rows fetched into a list, appended to a normal Workbook,
+saved to memory. The write-only variant is write_orders_xlsx() fed by a
+generator and saved to a temp file, as /export/excel does now.
+
+    python bench_xlsx_export.py [rows]
+"""
+import io
+import sys
+import time
+import resource
+import tempfile
+import multiprocessing
+from decimal import Decimal
+from datetime import datetime, timedelta
+
+import openpyxl
+import pytz
+
+from app import ORDER_EXPORT_HEADER, order_export_row, write_orders_xlsx
+
+START = pytz.utc.localize(datetime(2024, 1, 1))
+
+
+def synthetic_rows(n):
+    for i in range(n):
+        created = START + timedelta(minutes=i)
+        yield {
+            "id": f"#{100000 + i}", "customer_name": f"Bench Customer {i}", "phone": f"+9190000{i % 100000:05d}",
+            "email": f"bench{i}@example.com", "address": f"{i}, Bench Street, Pune, 411001", "state": "Maharashtra",
+            "payment_method": "COD" if i % 3 == 0 else "Prepaid", "source": "Shopify",
+            "products": '["Blue Shirt - M (Qty: 1)", "Black Jeans - 32 (Qty: 1)"]', "total": "2,598.00",
+            "amount": Decimal("2598.00"), "status": "Confirmed", "timestamp": created.strftime("%Y-%m-%d %H:%M:%S"),
+            "created_at": created, "notes": "", "delivery_type": "Standard",
+        }
+
+
+def regular(n):
+    rows = list(synthetic_rows(n))
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(ORDER_EXPORT_HEADER)
+    for row in rows:
+        ws.append(order_export_row(row))
+    output = io.BytesIO()
+    wb.save(output)
+
+
+def write_only(n):
+    with tempfile.TemporaryFile() as output:
+        write_orders_xlsx(synthetic_rows(n), output)
+
+
+def measure(variant, n, results):
+    start = time.perf_counter()
+    variant(n)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KB on Linux
+    results.put((n / elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def run(n):
+    ctx = multiprocessing.get_context('fork')
+    for label, variant in (('regular Workbook', regular), ('write-only + temp file', write_only)):
+        results = ctx.Queue()
+        proc = ctx.Process(target=measure, args=(variant, n, results))
+        proc.start()
+        rate, peak_mb = results.get()
+        proc.join()
+        print(f"{label:<24}: {rate:8.0f} rows/sec, peak RSS {peak_mb:7.1f} MB")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
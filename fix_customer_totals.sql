@@ -7,11 +7,7 @@ ALTER TABLE customers ADD COLUMN IF NOT EXISTS confirmed_value DECIMAL(10,2) DEF
 -- Update total_spent to include ALL orders (not just confirmed)
 UPDATE customers c
 SET total_spent = (
-    SELECT COALESCE(SUM(CASE 
-        WHEN o.total IS NOT NULL AND o.total != '' 
-        THEN CAST(NULLIF(REGEXP_REPLACE(o.total, '[^0-9.]', '', 'g'), '') AS DECIMAL(10,2))
-        ELSE 0 
-    END), 0)
+    SELECT COALESCE(SUM(o.amount), 0)
     FROM orders o
     WHERE o.phone = c.phone
 );
@@ -19,11 +15,7 @@ SET total_spent = (
 -- Update confirmed_value to show only confirmed order value
 UPDATE customers c
 SET confirmed_value = (
-    SELECT COALESCE(SUM(CASE 
-        WHEN o.status = 'Confirmed' AND o.total IS NOT NULL AND o.total != '' 
-        THEN CAST(NULLIF(REGEXP_REPLACE(o.total, '[^0-9.]', '', 'g'), '') AS DECIMAL(10,2))
-        ELSE 0 
-    END), 0)
+    SELECT COALESCE(SUM(o.amount) FILTER (WHERE o.status = 'Confirmed'), 0)
     FROM orders o
     WHERE o.phone = c.phone
 );
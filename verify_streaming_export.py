@@ -0,0 +1,70 @@
+"""Verify that CSV exports stream in constant memory.
+
+Fills a TEMP table named `orders` with synthetic orders on a dedicated
+connection to DATABASE_URL. Because it shadows the real table for that
+session only, the real orders and their aggregates are never touched. The
+script then runs the CSV export pipeline (OrderExport's rows, writer and
+chunking) on that connection while tracking peak Python memory with
+tracemalloc, and rolls back, which drops the table. Peak memory for 1M
+rows should stay in the same range as for 10k rows.
+
+    python verify_streaming_export.py [small_rows] [large_rows]
+"""
+import sys
+import tracemalloc
+
+from app import OrderExport, open_db_connection
+
+MARKER_STATUS = "Verify Export"
+# Allowed growth of the large export's peak over the small one's
+TOLERANCE = 2.0
+
+
+def insert_orders(conn, n):
+    c = conn.cursor()
+    c.execute('CREATE TEMP TABLE orders (LIKE public.orders INCLUDING DEFAULTS INCLUDING GENERATED) ON COMMIT DROP')
+    c.execute('''
+        INSERT INTO orders (id, customer_name, email, phone, address, source, products, total, amount,
+                            status, timestamp, created_at, notes, delivery_type, state, payment_method, rto_risk)
+        SELECT '#VERIFY-' || g, 'Verify Customer ' || g, 'verify' || g || '@example.com', '+9190000' || g,
+               g || ', Verify Street, Pune, 411001', 'Shopify', '["Blue Shirt - M (Qty: 1)"]', '1299.00', 1299,
+               %s, to_char(now(), 'YYYY-MM-DD HH24:MI:SS'), now(), '', 'Standard', 'Maharashtra', 'Prepaid', 'LOW'
+        FROM generate_series(1, %s) g
+    ''', (MARKER_STATUS, n))
+
+
+def export_peak(n):
+    """Export `n` marker rows as CSV; returns (peak bytes, rows seen)"""
+    conn = open_db_connection()
+    try:
+        insert_orders(conn, n)
+        export = OrderExport('csv', {'status': MARKER_STATUS}, conn=conn)
+        tracemalloc.start()
+        lines = 0
+        for chunk in export.writer.chunks(export):
+            lines += chunk.count('\n')
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak, lines - 1
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def verify(small, large):
+    small_peak, small_rows = export_peak(small)
+    print(f"{small_rows:>9} rows: peak {small_peak / 1024 / 1024:7.2f} MB")
+    large_peak, large_rows = export_peak(large)
+    print(f"{large_rows:>9} rows: peak {large_peak / 1024 / 1024:7.2f} MB")
+
+    if small_rows != small or large_rows != large:
+        print(f"\n❌ Verification FAILED: expected {small} and {large} rows in the exports")
+    elif large_peak > small_peak * TOLERANCE:
+        print(f"\n❌ Verification FAILED: peak memory grew {large_peak / small_peak:.1f}x with {large // small}x the rows")
+    else:
+        print(f"\n✅ Verification SUCCESS: peak memory stayed flat ({large_peak / small_peak:.2f}x for {large // small}x the rows)")
+
+
+if __name__ == "__main__":
+    verify(int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+           int(sys.argv[2]) if len(sys.argv) > 2 else 1000000)
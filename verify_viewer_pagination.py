@@ -0,0 +1,53 @@
+import requests
+from requests.auth import HTTPBasicAuth
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+URL = "http://127.0.0.1:5000"
+USERNAME = os.getenv("VIEWER_USERNAME", "viewer")
+PASSWORD = os.getenv("VIEWER_PASSWORD", "viewer123")
+
+def order_key(order):
+    return (order['order_seq'], order['id'])
+
+def test_viewer_pages(view, **filters):
+    print(f"\n--- Testing /viewer/orders view={view} {filters or ''} ---")
+    auth = HTTPBasicAuth(USERNAME, PASSWORD)
+
+    seen = []
+    after = None
+    pages = 0
+    while True:
+        params = dict(filters, view=view)
+        if after:
+            params['after'] = after
+        start = time.perf_counter()
+        response = requests.get(f"{URL}/viewer/orders", params=params, auth=auth)
+        elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code != 200:
+            print(f"FAILED: page {pages + 1} returned {response.status_code}")
+            return
+        page = response.json()
+        pages += 1
+        if pages == 1 or not page['next_cursor']:
+            print(f"Page {pages}: {len(page['orders'])} orders in {elapsed:.0f} ms")
+        seen += page['orders']
+        after = page['next_cursor']
+        if not after:
+            break
+
+    ids = [order['id'] for order in seen]
+    if len(ids) != len(set(ids)):
+        print("FAILED: an order appeared on more than one page")
+    elif [order_key(o) for o in seen] != sorted((order_key(o) for o in seen), reverse=True):
+        print("FAILED: orders are not newest first across pages")
+    else:
+        print(f"SUCCESS: {len(ids)} orders over {pages} pages, no repeats, newest first")
+
+if __name__ == "__main__":
+    test_viewer_pages("confirmed")
+    test_viewer_pages("packed")
+    test_viewer_pages("confirmed", payment="COD", delivery="Standard")
@@ -0,0 +1,93 @@
+"""Verify that WhatsApp CONFIRM/REJECT replies keep the report rollup and status counts exact.
+
+Saves synthetic Pending orders to DATABASE_URL with save_orders(), answers
+them through /api/whatsapp/status_reply (the endpoint whatsapp_server.js
+calls) via the Flask test client, and compares the maintained
+daily_order_stats and order_status_counts with a full recount. The recount
+runs inside a transaction that is rolled back. Afterwards the orders are
+deleted again with /bulk_delete (which takes them back out of the rollups),
+and the customer profiles and refresh queue entries they created are removed
+too. Drift left by older builds also shows up here; run
+`flask rebuild-daily-stats` once before trusting a failure.
+
+    python verify_whatsapp_reports.py [orders]
+"""
+import os
+import sys
+import base64
+from datetime import datetime
+
+from app import app, save_orders, get_db_connection, rebuild_daily_stats, rebuild_status_counts
+
+USERNAME = os.getenv("BASIC_AUTH_USERNAME", "admin")
+PASSWORD = os.getenv("BASIC_AUTH_PASSWORD", "admin123")
+HEADERS = {'Authorization': 'Basic ' + base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()}
+
+
+def make_orders(n):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return [{
+        "id": f"#VERIFY-WA-{i}", "customer_name": f"Verify Customer {i}", "phone": f"+9191111{i:05d}",
+        "email": f"verify{i}@example.com", "address": "1, Verify Street, Pune, 411001", "state": "Maharashtra",
+        "payment_method": "COD", "rto_risk": "LOW", "source": "Shopify",
+        "products": ["Blue Shirt - M (Qty: 1)"], "total": "1299.00", "status": "Pending",
+        "timestamp": now, "notes": "", "delivery_type": "Standard",
+    } for i in range(n)]
+
+
+def aggregates(c):
+    c.execute('SELECT * FROM daily_order_stats ORDER BY day, source, payment_method, delivery_type')
+    daily = [dict(row) for row in c.fetchall()]
+    c.execute('SELECT status, order_count FROM order_status_counts WHERE order_count <> 0 ORDER BY status')
+    return daily, [dict(row) for row in c.fetchall()]
+
+
+def check_against_recount():
+    """True if the maintained aggregates equal a recount from the orders table"""
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        try:
+            maintained = aggregates(c)
+            rebuild_daily_stats(conn)
+            rebuild_status_counts(conn)
+            recounted = aggregates(c)
+        finally:
+            conn.rollback()
+    for name, kept, fresh in zip(('daily_order_stats', 'order_status_counts'), maintained, recounted):
+        if kept != fresh:
+            print(f"FAILED: {name} differs from a recount")
+            return False
+    return True
+
+
+def clean_up(client, orders):
+    """Delete the synthetic orders and everything saving them created"""
+    client.post('/bulk_delete', json={'order_ids': [order['id'] for order in orders]}, headers=HEADERS)
+    phones = [order['phone'] for order in orders]
+    with get_db_connection() as conn:
+        c = conn.cursor()
+        c.execute('DELETE FROM customer_refresh_queue WHERE phone = ANY(%s)', (phones,))
+        c.execute('DELETE FROM customers WHERE phone = ANY(%s)', (phones,))
+        conn.commit()
+
+
+def run(n):
+    client = app.test_client()
+    orders = make_orders(n)
+    try:
+        save_orders(orders)
+        for i, order in enumerate(orders):
+            status = 'Confirmed' if i % 2 == 0 else 'Cancelled'
+            response = client.post('/api/whatsapp/status_reply', headers=HEADERS,
+                                   json={'phone': order['phone'][-10:], 'status': status})
+            if response.status_code != 200 or response.get_json()['id'] != order['id']:
+                print(f"FAILED: reply for {order['id']} returned {response.status_code} {response.get_json()}")
+                return
+        if check_against_recount():
+            print(f"SUCCESS: {n} WhatsApp replies, report rollup and status counts match a recount")
+    finally:
+        clean_up(client, orders)
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -2,7 +2,7 @@ require('dotenv').config();
 const express = require('express');
 const http = require('http');
 const { Server } = require('socket.io');
-const { Pool } = require('pg');
+const { Pool, Client } = require('pg');
 const proxy = require('express-http-proxy');
 const pino = require('pino');
 const QRCode = require('qrcode');
@@ -24,8 +24,14 @@ async function loadBaileys() {
 // Logger Setup
 const logger = pino({ level: 'info' });
 
+// Flask app (app.py) behind this service
+const FLASK_URL = 'http://localhost:5000';
+const FLASK_AUTH = 'Basic ' + Buffer.from(
+    `${process.env.BASIC_AUTH_USERNAME || 'admin'}:${process.env.BASIC_AUTH_PASSWORD || 'admin123'}`
+).toString('base64');
+
 // Proxy Settings (Azure stability)
-app.use('/', proxy('http://localhost:5000', {
+app.use('/', proxy(FLASK_URL, {
     filter: (req) => !req.url.startsWith('/socket.io'),
     proxyReqPathResolver: (req) => req.url,
     limit: '50mb'
@@ -39,6 +45,43 @@ const pool = new Pool({
     ssl: { rejectUnauthorized: false }
 });
 
+// Orders changed outside app.py: advance the data version so the app's
+// cached views and exports are invalidated (see bump_data_version in app.py)
+const BUMP_DATA_VERSION = `
+    WITH bumped AS (UPDATE data_version SET version = version + 1 WHERE name = 'orders' RETURNING version)
+    SELECT pg_notify('data_version', version::text) FROM bumped
+`;
+
+// Live order feed: app.py NOTIFYs compact order events on 'order_events' when a
+// change commits; relay each batch to every dashboard and viewer
+function listenForOrderEvents() {
+    const client = new Client({
+        connectionString: process.env.DATABASE_URL,
+        ssl: { rejectUnauthorized: false }
+    });
+    let retrying = false;
+    const retry = (err) => {
+        if (retrying) return;
+        retrying = true;
+        console.error('Order event listener error:', err.message);
+        client.end().catch(() => {});
+        setTimeout(listenForOrderEvents, 5000);
+    };
+    client.on('notification', (msg) => {
+        try {
+            io.emit('order_events', JSON.parse(msg.payload));
+        } catch (err) {
+            console.error('Bad order event payload:', err.message);
+        }
+    });
+    client.on('error', retry);
+    client.on('end', () => retry(new Error('connection ended')));
+    client.connect()
+        .then(() => client.query('LISTEN order_events'))
+        .then(() => console.log('Listening for order events'))
+        .catch(retry);
+}
+
 // Authentication Persistence Path
 const AUTH_PATH = process.env.WHATSAPP_AUTH_PATH || path.join(__dirname, '.baileys_auth');
 if (!fs.existsSync(AUTH_PATH)) fs.mkdirSync(AUTH_PATH, { recursive: true });
@@ -133,27 +176,28 @@ async function connectToWhatsApp() {
             if (cmd === 'CONFIRM' || cmd === 'REJECT') {
                 const newStatus = cmd === 'CONFIRM' ? 'Confirmed' : 'Cancelled';
                 try {
-                    const query = `
-                        UPDATE orders 
-                        SET status = $1 
-                        WHERE id IN (
-                            SELECT id FROM orders 
-                            WHERE phone LIKE '%' || $2 
-                            ORDER BY length(id) DESC, id DESC 
-                            LIMIT 1
-                        )
-                    `;
-                    const result = await pool.query(query, [newStatus, phone]);
-                    if (result.rowCount > 0) {
+                    // app.py applies the change with the customer, count and report deltas,
+                    // and its order event reaches the dashboards through listenForOrderEvents
+                    const response = await fetch(`${FLASK_URL}/api/whatsapp/status_reply`, {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json', Authorization: FLASK_AUTH },
+                        body: JSON.stringify({ phone, status: newStatus })
+                    });
+                    if (response.ok) {
                         io.emit('log', `Auto-reply from ${phone}: Order ${newStatus}`);
                         await sock.sendMessage(from, { text: `Thank you! Your order has been marked as ${newStatus}. ✅` });
+                    } else if (response.status !== 404) {
+                        throw new Error(`status reply returned ${response.status}`);
                     }
                 } catch (err) {
                     console.error('DB Update Error:', err);
                 }
             } else {
                 // Intelligent Reply to Notes
+                // Note and data version bump commit together on one client
+                let client;
                 try {
+                    client = await pool.connect();
                     const timestamp = new Date().toLocaleString('en-IN', { timeZone: 'Asia/Kolkata' });
                     const noteEntry = `\n[Customer Message @ ${timestamp}]: ${text}`;
                     const query = `
@@ -162,16 +206,22 @@ async function connectToWhatsApp() {
                         WHERE id IN (
                             SELECT id FROM orders 
                             WHERE phone LIKE '%' || $2 
-                            ORDER BY length(id) DESC, id DESC 
+                            ORDER BY order_seq DESC, id DESC 
                             LIMIT 1
                         )
                     `;
-                    const result = await pool.query(query, [noteEntry, phone]);
+                    await client.query('BEGIN');
+                    const result = await client.query(query, [noteEntry, phone]);
+                    if (result.rowCount > 0) await client.query(BUMP_DATA_VERSION);
+                    await client.query('COMMIT');
                     if (result.rowCount > 0) {
                         io.emit('log', `Message from ${phone} appended to notes.`);
                     }
                 } catch (err) {
+                    if (client) await client.query('ROLLBACK').catch(() => {});
                     console.error('Capture Note Error:', err);
+                } finally {
+                    if (client) client.release();
                 }
             }
         }
@@ -251,6 +301,7 @@ io.on('connection', (socket) => {
 
 // Start Baileys
 connectToWhatsApp();
+listenForOrderEvents();
 
 const PORT = process.env.PORT || 8000;
 server.listen(PORT, () => {